@@ -2,91 +2,56 @@
 Rotas da API para administração
 """
 import logging
-from fastapi import APIRouter, HTTPException, Depends, Header, Cookie, Request, Response
+from fastapi import APIRouter, HTTPException, Depends, Header, Cookie, Request, Response, Query
 from fastapi.responses import JSONResponse
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 import secrets
 import hashlib  # Adicionar esta linha
+import math
 
-from ..services import auth_service, ms_graph_service
-from ..models.user import User, AdminUser, LoginRequest, LoginResponse, UserUpdateRequest
+from ..services import auth_service, login_limiter, ms_graph_service, signature_service
+from ..models.user import User, AdminUser, LoginRequest, LoginResponse, UserUpdateRequest, UserBatchSyncRequest
 from .. import db
+from .auth import get_current_user
+from ..config import AUTH_SESSION_LIFETIME
+from ..logging_config import get_logging_stats
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 graph_service = ms_graph_service.MSGraphService()
 
-def get_current_user(session_token: Optional[str] = Cookie(None)):
-    """
-    Obtém o usuário atual a partir do token de sessão.
-    
-    Args:
-        session_token: Token de sessão (cookie)
-        
-    Returns:
-        Informações do usuário
-    """
-    if not session_token:
-        raise HTTPException(
-            status_code=401,
-            detail="Não autenticado"
-        )
+@router.post("/login")
+async def login(request: Request, response: Response, credentials: dict):
+    """Login administrativo"""
+    username = credentials.get("username")
+    password = credentials.get("password")
+    if not isinstance(username, str) or not isinstance(password, str) or not username or not password:
+        raise HTTPException(status_code=400, detail="Usuário e senha são obrigatórios")
     
-    session = auth_service.validate_session(session_token)
-    if not session:
+    # Tentativas em excesso são recusadas antes de qualquer hash ou consulta ao banco
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = login_limiter.acquire(username, client_ip)
+    if retry_after is not None:
         raise HTTPException(
-            status_code=401,
-            detail="Sessão inválida ou expirada"
+            status_code=429,
+            detail="Muitas tentativas de login. Tente novamente mais tarde.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
         )
     
-    return session
-
-@router.post("/login")
-async def login(request: Request, response: Response, credentials: dict):
-    """Login administrativo"""
     try:
-        username = credentials.get("username")
-        password = credentials.get("password")
-        
-        logger.info("Tentativa de login - username: %s", username)
-        
-        # Gerar hash da senha
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        
-        # Verificar credenciais
-        query = """
-            SELECT id, username, role 
-            FROM admin_users 
-            WHERE username = ? 
-              AND password_hash = ? 
-              AND is_active = 1
-        """
+        user = await db.run_in_db_executor(auth_service.verify_credentials, username, password)
         
-        result = db.execute_query(query, (username, password_hash))
-        
-        if result and len(result) > 0:
-            # Gerar token de sessão
-            token = secrets.token_urlsafe(32)
-            expires_at = datetime.now() + timedelta(hours=24)
-            
-            # Inserir sessão no banco
-            insert_query = """
-                INSERT INTO admin_sessions 
-                (user_id, token, expires_at, ip_address, user_agent, created_at)
-                VALUES (?, ?, ?, ?, ?, GETDATE())
-            """
+        if user:
+            login_limiter.record_success(username, client_ip)
             
-            db.execute_non_query(
-                insert_query,
-                (
-                    result[0]["id"],
-                    token,
-                    expires_at,
-                    request.client.host,
-                    request.headers.get("user-agent")
-                )
+            # Gerar token de sessão (gravado em admin_sessions ou assinado, conforme AUTH_SESSION_MODE)
+            token, expires_at = await db.run_in_db_executor(
+                auth_service.create_session,
+                user,
+                client_ip,
+                request.headers.get("user-agent")
             )
             
             # Definir cookie
@@ -96,7 +61,7 @@ async def login(request: Request, response: Response, credentials: dict):
                 httponly=True,
                 samesite="lax",
                 secure=False,  # Uso de False para ambiente de desenvolvimento
-                max_age=86400,
+                max_age=AUTH_SESSION_LIFETIME,
                 path="/",
                 domain=None,
             )
@@ -108,7 +73,7 @@ async def login(request: Request, response: Response, credentials: dict):
                 httponly=False,
                 samesite="lax",
                 secure=False,
-                max_age=86400,
+                max_age=AUTH_SESSION_LIFETIME,
                 path="/"
             )
             
@@ -119,16 +84,16 @@ async def login(request: Request, response: Response, credentials: dict):
                 "redirect": "/admin",
                 "user": {
                     "username": username,
-                    "role": result[0]["role"]
+                    "role": user["role"]
                 }
             }
-            
-        logger.warning("Login falhou - username: %s", username)
-        raise HTTPException(status_code=401, detail="Credenciais inválidas")
-        
     except Exception as e:
         logger.error("Erro no login: %s", str(e))
         raise HTTPException(status_code=500, detail="Erro interno do servidor")
+    
+    login_limiter.record_failure(username, client_ip)
+    logger.warning("Login falhou - username: %s", username)
+    raise HTTPException(status_code=401, detail="Credenciais inválidas")
 
 @router.post("/logout")
 async def logout(response: Response, current_user: Dict[str, Any] = Depends(get_current_user)):
@@ -147,7 +112,7 @@ async def logout(response: Response, current_user: Dict[str, Any] = Depends(get_
         response.delete_cookie(key="session_token")
         
         # Invalida a sessão
-        auth_service.invalidate_session(current_user.get("session_token", ""))
+        await db.run_in_db_executor(auth_service.invalidate_session, current_user.get("session_token", ""))
         
         return {"message": "Logout realizado com sucesso"}
     except Exception as e:
@@ -158,35 +123,23 @@ async def logout(response: Response, current_user: Dict[str, Any] = Depends(get_
         )
 
 @router.get("/users")
-async def get_users(request: Request):
+async def get_users(current_user: Dict[str, Any] = Depends(get_current_user)):
     """Lista todos os usuários cadastrados"""
     try:
-        # Verificar se o usuário está autenticado
-        session_token = request.cookies.get("session_token")
-        if not session_token:
-            raise HTTPException(status_code=401, detail="Não autenticado")
-            
-        session = auth_service.validate_session(session_token)
-        if not session:
-            raise HTTPException(status_code=401, detail="Sessão inválida")
-            
         # Buscar usuários
         query = """
             SELECT u.id, u.email, u.nome_completo, u.cargo, u.setor, 
                    u.empresa, u.created_at, u.updated_at
-            FROM users u
+            FROM [dbo].[users] u
             ORDER BY u.nome_completo
         """
-        users = db.execute_query(query)
+        users = await db.execute_query_async(query)
         
         # Log para debug
         logger.debug(f"Usuários encontrados: {len(users)}")
         
         return users
         
-    except HTTPException as he:
-        logger.warning(f"Erro de autenticação: {str(he)}")
-        raise he
     except Exception as e:
         logger.error(f"Erro ao listar usuários: {str(e)}")
         raise HTTPException(status_code=500, detail="Erro ao listar usuários")
@@ -210,7 +163,7 @@ async def get_user(email: str, current_user: Dict[str, Any] = Depends(get_curren
         WHERE email = ?
         """
         
-        results = db.execute_query(query, (email,))
+        results = await db.execute_query_async(query, (email,))
         
         if results and len(results) > 0:
             return results[0]
@@ -252,7 +205,7 @@ async def update_user(
         WHERE email = ?
         """
         
-        results = db.execute_query(query, (email,))
+        results = await db.execute_query_async(query, (email,))
         
         if not results or len(results) == 0:
             raise HTTPException(
@@ -298,7 +251,8 @@ async def update_user(
         WHERE email = ?
         """
         
-        db.execute_non_query(query, tuple(params))
+        await db.execute_non_query_async(query, tuple(params))
+        await db.run_in_db_executor(signature_service.refresh_rendered_signatures, [email])
         
         return True
     except HTTPException:
@@ -311,22 +265,36 @@ async def update_user(
         )
 
 @router.post("/sync-users", response_model=Dict[str, Any])
-async def sync_users(current_user: Dict[str, Any] = Depends(get_current_user)):
+async def sync_users(
+    mode: str = Query("full"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
     """
     Sincroniza os usuários com o Microsoft 365.
     
     Args:
+        mode: "full" relê todo o diretório; "delta" aplica apenas as alterações
+              desde a última sincronização incremental
         current_user: Usuário atual
         
     Returns:
         Mensagem de sucesso e informações de sincronização
     """
+    if mode not in ("full", "delta"):
+        raise HTTPException(
+            status_code=400,
+            detail="Modo de sincronização inválido. Use 'full' ou 'delta'"
+        )
+    
     try:
-        # Executa a sincronização
-        result = graph_service.sync_users()
+        # Executa a sincronização em massa (um único MERGE no banco)
+        if mode == "delta":
+            stats = await db.run_in_db_executor(graph_service.sync_users_delta)
+        else:
+            stats = await db.run_in_db_executor(graph_service.sync_users_bulk)
         
-        if result:
-            return {"success": True, "message": "Usuários sincronizados com sucesso"}
+        if stats is not None:
+            return {"success": True, "message": "Usuários sincronizados com sucesso", "stats": stats}
         else:
             return {"success": False, "message": "Falha na sincronização de usuários"}
     except Exception as e:
@@ -336,6 +304,43 @@ async def sync_users(current_user: Dict[str, Any] = Depends(get_current_user)):
             detail=f"Erro ao sincronizar usuários: {str(e)}"
         )
 
+@router.post("/sync-users/batch", response_model=Dict[str, Any])
+async def sync_users_batch(
+    request: UserBatchSyncRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Sincroniza uma lista de usuários com o Microsoft 365.
+    
+    As consultas ao Graph são agrupadas em lotes de até 20 e-mails por chamada.
+    
+    Args:
+        request: Lista de e-mails a sincronizar
+        current_user: Usuário atual
+        
+    Returns:
+        Mensagem de sucesso e informações de sincronização
+    """
+    if not request.emails:
+        raise HTTPException(
+            status_code=400,
+            detail="Informe ao menos um e-mail"
+        )
+    
+    try:
+        stats = await db.run_in_db_executor(graph_service.sync_users_by_emails, request.emails)
+        
+        if stats is not None:
+            return {"success": True, "message": "Usuários sincronizados com sucesso", "stats": stats}
+        else:
+            return {"success": False, "message": "Falha na sincronização de usuários"}
+    except Exception as e:
+        logger.error(f"Erro ao sincronizar usuários em lote: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao sincronizar usuários: {str(e)}"
+        )
+
 @router.post("/sync-user/{email}", response_model=Dict[str, Any])
 async def sync_single_user(
     email: str, 
@@ -353,7 +358,7 @@ async def sync_single_user(
     """
     try:
         # Obtém os dados do usuário no Microsoft 365
-        ms_user = graph_service.get_user_by_email(email)
+        ms_user = await db.run_in_db_executor(graph_service.get_user_by_email, email)
         
         if not ms_user:
             raise HTTPException(
@@ -362,26 +367,17 @@ async def sync_single_user(
             )
         
         # Verifica se o usuário já existe no banco
-        existing = db.execute_query("""
+        existing = await db.execute_query_async("""
         SELECT id FROM [dbo].[users]
         WHERE email = ?
         """, (email,))
         
         # Prepara os dados do usuário
-        user_data = {
-            "email": ms_user.get("mail"),
-            "nome_completo": ms_user.get("displayName", ""),
-            "cargo": ms_user.get("jobTitle", ""),
-            "setor": ms_user.get("department", ""),
-            "empresa": ms_user.get("companyName", ""),
-            "telefone": ms_user.get("businessPhones")[0] if ms_user.get("businessPhones") and len(ms_user.get("businessPhones")) > 0 else "",
-            "ramal": "",  # O Microsoft Graph não fornece ramal diretamente
-            "ms_id": ms_user.get("id", "")
-        }
+        user_data = graph_service.map_user_data(ms_user)
         
         if existing and len(existing) > 0:
             # Atualiza o usuário existente
-            db.execute_non_query("""
+            await db.execute_non_query_async("""
             UPDATE [dbo].[users]
             SET nome_completo = ?, cargo = ?, setor = ?, empresa = ?, telefone = ?, ms_id = ?, updated_at = GETDATE()
             WHERE email = ?
@@ -396,7 +392,7 @@ async def sync_single_user(
             ))
         else:
             # Insere novo usuário
-            db.execute_non_query("""
+            await db.execute_non_query_async("""
             INSERT INTO [dbo].[users] (email, nome_completo, cargo, setor, empresa, telefone, ramal, ms_id, created_at, updated_at)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, GETDATE(), GETDATE())
             """, (
@@ -410,6 +406,8 @@ async def sync_single_user(
                 user_data["ms_id"]
             ))
         
+        await db.run_in_db_executor(signature_service.refresh_rendered_signatures, [email, user_data["email"]])
+        
         return {
             "success": True, 
             "message": f"Usuário {email} sincronizado com sucesso",
@@ -424,6 +422,51 @@ async def sync_single_user(
             detail=f"Erro ao sincronizar usuário: {str(e)}"
         )
 
+@router.post("/rendered-signatures/refresh", response_model=Dict[str, Any])
+async def refresh_rendered_signatures(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Rematerializa as assinaturas renderizadas de todos os usuários.
+    
+    Útil após a implantação (carga inicial da tabela rendered_signatures) ou
+    após mudanças no renderizador.
+    
+    Args:
+        current_user: Usuário atual
+        
+    Returns:
+        Quantidade de assinaturas gravadas ou removidas
+    """
+    try:
+        written = await db.run_in_db_executor(signature_service.refresh_rendered_signatures, all_users=True)
+        return {"success": True, "message": "Assinaturas reprocessadas com sucesso", "written": written}
+    except Exception as e:
+        logger.error(f"Erro ao reprocessar assinaturas: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao reprocessar assinaturas: {str(e)}"
+        )
+
+@router.get("/metrics", response_model=Dict[str, Any])
+async def get_metrics(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Obtém métricas internas da aplicação.
+    
+    Args:
+        current_user: Usuário atual
+        
+    Returns:
+        Estatísticas do pool de conexões, do cliente do Microsoft Graph,
+        do cache de assinaturas, das sessões, do limitador de login e dos logs
+    """
+    return {
+        "db_pool": db.get_pool_stats(),
+        "graph": graph_service.client.stats(),
+        "signature_cache": signature_service.get_signature_cache_stats(),
+        "sessions": auth_service.get_session_stats(),
+        "login_limiter": login_limiter.get_stats(),
+        "logging": get_logging_stats()
+    }
+
 @router.get("/admin-users", response_model=List[AdminUser])
 async def get_admin_users(current_user: Dict[str, Any] = Depends(get_current_user)):
     """
@@ -449,7 +492,7 @@ async def get_admin_users(current_user: Dict[str, Any] = Depends(get_current_use
         ORDER BY username
         """
         
-        admin_users = db.execute_query(query)
+        admin_users = await db.execute_query_async(query)
         return admin_users
     except HTTPException:
         raise
@@ -460,6 +503,44 @@ async def get_admin_users(current_user: Dict[str, Any] = Depends(get_current_use
             detail=f"Erro ao obter usuários administrativos: {str(e)}"
         )
 
+@router.post("/admin-users/{user_id}/revoke-sessions", response_model=bool)
+async def revoke_admin_user_sessions(
+    user_id: int,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Revoga todas as sessões de um usuário administrativo.
+    
+    Args:
+        user_id: ID do usuário administrativo
+        current_user: Usuário atual
+        
+    Returns:
+        True se bem sucedido
+    """
+    if current_user.get("role") != "admin":
+        raise HTTPException(
+            status_code=403,
+            detail="Permissão negada"
+        )
+    
+    try:
+        revoked = await db.run_in_db_executor(auth_service.revoke_user_sessions, user_id)
+    except Exception as e:
+        logger.error(f"Erro ao revogar sessões do usuário administrativo {user_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao revogar sessões: {str(e)}"
+        )
+    
+    if not revoked:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Usuário administrativo ID {user_id} não encontrado"
+        )
+    
+    return True
+
 @router.post("/admin-users", response_model=bool)
 async def create_admin_user(
     admin_user: AdminUser,
@@ -491,7 +572,8 @@ async def create_admin_user(
             )
         
         # Cria o usuário administrativo
-        result = auth_service.create_admin_user(
+        result = await db.run_in_db_executor(
+            auth_service.create_admin_user,
             username=admin_user.username,
             password=admin_user.password_hash,  # Será hash pelo serviço
             role=admin_user.role
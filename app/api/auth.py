@@ -0,0 +1,69 @@
+"""
+Contexto de autenticação da requisição, compartilhado pelo middleware,
+pelas dependências das rotas da API e pelas páginas administrativas
+"""
+import logging
+from typing import Dict, Any, Optional
+
+from fastapi import HTTPException, Request
+
+from .. import db
+from ..services import auth_service
+
+logger = logging.getLogger(__name__)
+
+
+async def get_request_session(request: Request) -> Optional[Dict[str, Any]]:
+    """
+    Obtém a sessão do usuário da requisição, validando o token uma única vez.
+
+    O resultado (inclusive a ausência de sessão) fica em request.state, que é
+    compartilhado entre o middleware e a rota; as chamadas seguintes na mesma
+    requisição não validam o token novamente.
+
+    Args:
+        request: Requisição atual
+
+    Returns:
+        Dados da sessão (user_id, username, role, session_token) ou None
+    """
+    state = request.state
+    if getattr(state, "auth_resolved", False):
+        return state.user
+
+    session = None
+    session_token = request.cookies.get("session_token")
+    if session_token:
+        try:
+            session = await db.run_in_db_executor(auth_service.validate_session, session_token)
+        except Exception as e:
+            logger.error(f"Erro ao validar autenticação: {str(e)}")
+
+    state.user = session
+    state.auth_resolved = True
+    return session
+
+
+async def get_current_user(request: Request) -> Dict[str, Any]:
+    """
+    Dependência das rotas autenticadas: obtém o usuário atual a partir do contexto da requisição.
+
+    Args:
+        request: Requisição atual
+
+    Returns:
+        Informações do usuário
+    """
+    session = await get_request_session(request)
+    if not session:
+        if not request.cookies.get("session_token"):
+            raise HTTPException(
+                status_code=401,
+                detail="Não autenticado"
+            )
+        raise HTTPException(
+            status_code=401,
+            detail="Sessão inválida ou expirada"
+        )
+
+    return session
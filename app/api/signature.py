@@ -2,15 +2,30 @@
 Rotas da API para assinaturas
 """
 import logging
-from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import Optional, List
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Dict, Any
 
-from ..services import signature_service
+from .. import db
+from ..config import SIGNATURE_HTTP_MAX_AGE
+from ..services import campaigns, signature_service, template_rules
+from ..services.template_compiler import find_unknown_placeholders
+from .auth import get_current_user
 from ..models.signature import (
     SignatureTemplate, 
+    TemplateSummaryPage,
+    TemplateVersion,
+    TemplateRule,
+    TemplateRuleRequest,
+    Campaign,
+    CampaignRequest,
     TemplateCreateRequest, 
     TemplateUpdateRequest,
-    SignatureAssignRequest
+    TemplateValidateRequest,
+    TemplateValidationResult,
+    SignatureAssignRequest,
+    SignatureBulkAssignRequest,
+    SignatureRenderBatchRequest
 )
 
 logger = logging.getLogger(__name__)
@@ -18,21 +33,39 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.get("/signature", response_model=str)
-async def get_signature(email: str = Query(...)):
+async def get_signature(request: Request, response: Response, email: str = Query(...)):
     """
     Obtém a assinatura HTML para um determinado e-mail.
     
+    A assinatura já vem renderizada do banco (tabela rendered_signatures) e o
+    ETag é o hash do conteúdo; se o cliente enviar If-None-Match com a versão
+    atual, retorna 304 sem corpo.
+    
     Args:
+        request: Requisição HTTP
+        response: Resposta HTTP
         email: E-mail do usuário
         
     Returns:
         HTML da assinatura renderizada
     """
     try:
-        signature_html = signature_service.get_rendered_signature(email)
+        entry = await db.run_in_db_executor(
+            signature_service.get_signature_entry,
+            email,
+            request.headers.get("if-none-match")
+        )
         
-        if signature_html:
-            return signature_html
+        if entry:
+            headers = {
+                "ETag": entry["etag"],
+                "Cache-Control": f"private, max-age={SIGNATURE_HTTP_MAX_AGE}, must-revalidate"
+            }
+            if entry["not_modified"]:
+                return Response(status_code=304, headers=headers)
+            
+            response.headers.update(headers)
+            return entry["html"]
         else:
             # Retorna um HTML padrão se não houver assinatura
             return """
@@ -58,7 +91,7 @@ async def get_templates():
         Lista de templates
     """
     try:
-        templates = signature_service.get_all_templates()
+        templates = await db.run_in_db_executor(signature_service.get_all_templates)
         return templates
     except Exception as e:
         logger.error(f"Erro ao obter templates: {str(e)}")
@@ -67,19 +100,101 @@ async def get_templates():
             detail=f"Erro ao obter templates: {str(e)}"
         )
 
+@router.get("/templates/summary", response_model=TemplateSummaryPage)
+async def get_template_summaries(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Lista os templates sem o HTML, com paginação por cursor.
+    
+    Args:
+        limit: Quantidade máxima de templates por página
+        cursor: Cursor retornado pela página anterior (next_cursor)
+        current_user: Usuário atual
+        
+    Returns:
+        Página com os templates (id, nome, padrão, datas e tamanho) e o próximo cursor
+    """
+    try:
+        return await db.run_in_db_executor(signature_service.list_template_summaries, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Erro ao listar templates: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao listar templates: {str(e)}"
+        )
+
+@router.get("/templates/{template_id}", response_model=SignatureTemplate)
+async def get_template(
+    template_id: int,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Obtém um template de assinatura pelo ID.
+    
+    Args:
+        template_id: ID do template
+        current_user: Usuário atual
+        
+    Returns:
+        Template com o HTML
+    """
+    try:
+        template = await db.run_in_db_executor(signature_service.get_template_by_id, template_id)
+    except Exception as e:
+        logger.error(f"Erro ao obter template {template_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao obter template: {str(e)}"
+        )
+    
+    if not template:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Template ID {template_id} não encontrado"
+        )
+    
+    return template
+
+def _check_placeholders(template_html: str) -> None:
+    """Recusa (422) um template que use variáveis desconhecidas"""
+    unknown = find_unknown_placeholders(template_html)
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"O template contém variáveis desconhecidas: {', '.join(unknown)}"
+        )
+
 @router.post("/templates", response_model=int)
-async def create_template(template: TemplateCreateRequest):
+async def create_template(
+    template: TemplateCreateRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
     """
     Cria um novo template de assinatura.
     
+    Templates com variáveis desconhecidas são recusados (422), como em
+    /templates/validate.
+    
     Args:
         template: Dados do novo template
+        current_user: Usuário atual
         
     Returns:
         ID do template criado
     """
+    _check_placeholders(template.template_html)
+    
     try:
-        template_id = signature_service.save_signature_template(
+        template_id = await db.run_in_db_executor(
+            signature_service.save_signature_template,
             name=template.name,
             html=template.template_html,
             is_default=template.is_default
@@ -93,22 +208,49 @@ async def create_template(template: TemplateCreateRequest):
             detail=f"Erro ao criar template: {str(e)}"
         )
 
+@router.post("/templates/validate", response_model=TemplateValidationResult)
+async def validate_template(
+    template: TemplateValidateRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Verifica se o template usa apenas variáveis conhecidas.
+    
+    Args:
+        template: HTML do template
+        current_user: Usuário atual
+        
+    Returns:
+        Resultado da validação com os placeholders desconhecidos
+    """
+    unknown = find_unknown_placeholders(template.template_html)
+    return {"valid": not unknown, "unknown_placeholders": unknown}
+
 @router.put("/templates/{template_id}", response_model=bool)
-async def update_template(template_id: int, template: TemplateUpdateRequest):
+async def update_template(
+    template_id: int,
+    template: TemplateUpdateRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
     """
     Atualiza um template de assinatura existente.
     
+    Um novo HTML com variáveis desconhecidas é recusado (422).
+    
     Args:
         template_id: ID do template
         template: Dados do template atualizados
+        current_user: Usuário atual
         
     Returns:
         True se bem sucedido
     """
+    if template.template_html is not None:
+        _check_placeholders(template.template_html)
+    
     try:
         # Obtém o template atual
-        templates = signature_service.get_all_templates()
-        current_template = next((t for t in templates if t["id"] == template_id), None)
+        current_template = await db.run_in_db_executor(signature_service.get_template_by_id, template_id)
         
         if not current_template:
             raise HTTPException(
@@ -117,7 +259,8 @@ async def update_template(template_id: int, template: TemplateUpdateRequest):
             )
         
         # Atualiza o template com os novos valores
-        signature_service.save_signature_template(
+        await db.run_in_db_executor(
+            signature_service.save_signature_template,
             name=template.name if template.name is not None else current_template["name"],
             html=template.template_html if template.template_html is not None else current_template["template_html"],
             is_default=template.is_default if template.is_default is not None else current_template["is_default"]
@@ -133,19 +276,386 @@ async def update_template(template_id: int, template: TemplateUpdateRequest):
             detail=f"Erro ao atualizar template: {str(e)}"
         )
 
+@router.get("/templates/{template_id}/versions", response_model=List[TemplateVersion])
+async def get_template_versions(
+    template_id: int,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Obtém o histórico de versões de um template.
+    
+    Args:
+        template_id: ID do template
+        current_user: Usuário atual
+        
+    Returns:
+        Versões do template (sem o HTML), da mais recente para a mais antiga
+    """
+    try:
+        return await db.run_in_db_executor(signature_service.get_template_versions, template_id)
+    except Exception as e:
+        logger.error(f"Erro ao obter versões do template {template_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao obter versões do template: {str(e)}"
+        )
+
+@router.get("/templates/{template_id}/versions/{version_id}", response_model=TemplateVersion)
+async def get_template_version(
+    template_id: int,
+    version_id: int,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Obtém uma versão específica de um template, com o HTML.
+    
+    Args:
+        template_id: ID do template
+        version_id: ID da versão
+        current_user: Usuário atual
+        
+    Returns:
+        Versão do template
+    """
+    try:
+        version = await db.run_in_db_executor(signature_service.get_template_version, template_id, version_id)
+    except Exception as e:
+        logger.error(f"Erro ao obter versão {version_id} do template {template_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao obter versão do template: {str(e)}"
+        )
+    
+    if not version:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Versão {version_id} do template {template_id} não encontrada"
+        )
+    
+    return version
+
+@router.post("/templates/{template_id}/versions/{version_id}/rollback", response_model=bool)
+async def rollback_template(
+    template_id: int,
+    version_id: int,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Restaura uma versão anterior de um template.
+    
+    Args:
+        template_id: ID do template
+        version_id: ID da versão a restaurar
+        current_user: Usuário atual
+        
+    Returns:
+        True se bem sucedido
+    """
+    try:
+        restored = await db.run_in_db_executor(signature_service.rollback_template, template_id, version_id)
+    except Exception as e:
+        logger.error(f"Erro ao restaurar versão {version_id} do template {template_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao restaurar versão do template: {str(e)}"
+        )
+    
+    if not restored:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Versão {version_id} do template {template_id} não encontrada"
+        )
+    
+    return True
+
+@router.get("/template-rules", response_model=List[TemplateRule])
+async def get_template_rules(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Obtém as regras de atribuição de templates, na ordem de avaliação.
+    
+    Args:
+        current_user: Usuário atual
+        
+    Returns:
+        Lista de regras
+    """
+    try:
+        return await db.run_in_db_executor(template_rules.get_rules)
+    except Exception as e:
+        logger.error(f"Erro ao obter regras de template: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao obter regras de template: {str(e)}"
+        )
+
+async def _save_template_rule(rule: TemplateRuleRequest, rule_id: Optional[int] = None) -> Optional[int]:
+    """Valida o template, grava a regra e rematerializa as assinaturas afetadas"""
+    template = await db.run_in_db_executor(signature_service.get_template_by_id, rule.template_id)
+    if not template:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Template ID {rule.template_id} não encontrado"
+        )
+    
+    saved_id = await db.run_in_db_executor(template_rules.save_rule, rule.model_dump(), rule_id)
+    if saved_id is not None:
+        await db.run_in_db_executor(signature_service.refresh_rendered_signatures, rules_changed=True)
+    return saved_id
+
+@router.post("/template-rules", response_model=int)
+async def create_template_rule(
+    rule: TemplateRuleRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Cria uma regra de atribuição de template.
+    
+    Usuários sem assinatura atribuída recebem o template da primeira regra
+    (por prioridade) cujos critérios preenchidos coincidem com seus dados.
+    
+    Args:
+        rule: Dados da regra
+        current_user: Usuário atual
+        
+    Returns:
+        ID da regra criada
+    """
+    try:
+        return await _save_template_rule(rule)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao criar regra de template: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao criar regra de template: {str(e)}"
+        )
+
+@router.put("/template-rules/{rule_id}", response_model=bool)
+async def update_template_rule(
+    rule_id: int,
+    rule: TemplateRuleRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Atualiza uma regra de atribuição de template.
+    
+    Args:
+        rule_id: ID da regra
+        rule: Dados da regra
+        current_user: Usuário atual
+        
+    Returns:
+        True se bem sucedido
+    """
+    try:
+        saved_id = await _save_template_rule(rule, rule_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao atualizar regra de template {rule_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao atualizar regra de template: {str(e)}"
+        )
+    
+    if saved_id is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Regra ID {rule_id} não encontrada"
+        )
+    
+    return True
+
+@router.delete("/template-rules/{rule_id}", response_model=bool)
+async def delete_template_rule(
+    rule_id: int,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Remove uma regra de atribuição de template.
+    
+    Args:
+        rule_id: ID da regra
+        current_user: Usuário atual
+        
+    Returns:
+        True se bem sucedido
+    """
+    try:
+        deleted = await db.run_in_db_executor(template_rules.delete_rule, rule_id)
+        if deleted:
+            await db.run_in_db_executor(signature_service.refresh_rendered_signatures, rules_changed=True)
+    except Exception as e:
+        logger.error(f"Erro ao remover regra de template {rule_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao remover regra de template: {str(e)}"
+        )
+    
+    if not deleted:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Regra ID {rule_id} não encontrada"
+        )
+    
+    return True
+
+@router.get("/campaigns", response_model=List[Campaign])
+async def get_campaigns(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Obtém as campanhas cadastradas.
+    
+    Args:
+        current_user: Usuário atual
+        
+    Returns:
+        Lista de campanhas
+    """
+    try:
+        return await db.run_in_db_executor(campaigns.get_campaigns)
+    except Exception as e:
+        logger.error(f"Erro ao obter campanhas: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao obter campanhas: {str(e)}"
+        )
+
+async def _save_campaign(campaign: CampaignRequest, campaign_id: Optional[int] = None) -> Optional[int]:
+    """Valida a janela, grava a campanha e descarta as assinaturas em cache"""
+    # Horário local sem fuso, como as demais colunas DATETIME do banco
+    data = campaign.model_dump()
+    data["starts_at"] = campaigns.to_local_naive(campaign.starts_at)
+    data["ends_at"] = campaigns.to_local_naive(campaign.ends_at)
+    
+    if data["ends_at"] <= data["starts_at"]:
+        raise HTTPException(
+            status_code=400,
+            detail="O fim da campanha deve ser posterior ao início"
+        )
+    
+    saved_id = await db.run_in_db_executor(campaigns.save_campaign, data, campaign_id)
+    if saved_id is not None:
+        signature_service.clear_signature_cache()
+    return saved_id
+
+@router.post("/campaigns", response_model=int)
+async def create_campaign(
+    campaign: CampaignRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Cria uma campanha.
+    
+    O banner é anexado às assinaturas do público informado entre starts_at
+    (inclusive) e ends_at (exclusive).
+    
+    Args:
+        campaign: Dados da campanha
+        current_user: Usuário atual
+        
+    Returns:
+        ID da campanha criada
+    """
+    try:
+        return await _save_campaign(campaign)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao criar campanha: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao criar campanha: {str(e)}"
+        )
+
+@router.put("/campaigns/{campaign_id}", response_model=bool)
+async def update_campaign(
+    campaign_id: int,
+    campaign: CampaignRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Atualiza uma campanha.
+    
+    Args:
+        campaign_id: ID da campanha
+        campaign: Dados da campanha
+        current_user: Usuário atual
+        
+    Returns:
+        True se bem sucedido
+    """
+    try:
+        saved_id = await _save_campaign(campaign, campaign_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao atualizar campanha {campaign_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao atualizar campanha: {str(e)}"
+        )
+    
+    if saved_id is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Campanha ID {campaign_id} não encontrada"
+        )
+    
+    return True
+
+@router.delete("/campaigns/{campaign_id}", response_model=bool)
+async def delete_campaign(
+    campaign_id: int,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Remove uma campanha.
+    
+    Args:
+        campaign_id: ID da campanha
+        current_user: Usuário atual
+        
+    Returns:
+        True se bem sucedido
+    """
+    try:
+        deleted = await db.run_in_db_executor(campaigns.delete_campaign, campaign_id)
+        if deleted:
+            signature_service.clear_signature_cache()
+    except Exception as e:
+        logger.error(f"Erro ao remover campanha {campaign_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao remover campanha: {str(e)}"
+        )
+    
+    if not deleted:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Campanha ID {campaign_id} não encontrada"
+        )
+    
+    return True
+
 @router.post("/assign", response_model=bool)
-async def assign_signature(assignment: SignatureAssignRequest):
+async def assign_signature(
+    assignment: SignatureAssignRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
     """
     Atribui uma assinatura a um usuário.
     
     Args:
         assignment: Dados da atribuição
+        current_user: Usuário atual
         
     Returns:
         True se bem sucedido
     """
     try:
-        result = signature_service.assign_signature_to_user(
+        result = await db.run_in_db_executor(
+            signature_service.assign_signature_to_user,
             user_email=assignment.user_email,
             template_id=assignment.template_id,
             custom_html=assignment.custom_html
@@ -165,6 +675,58 @@ async def assign_signature(assignment: SignatureAssignRequest):
             detail=f"Erro ao atribuir assinatura: {str(e)}"
         )
 
+@router.post("/assign/bulk", response_model=Dict[str, Any])
+async def bulk_assign_signature(
+    assignment: SignatureBulkAssignRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Atribui um template a vários usuários de uma só vez.
+    
+    Os usuários são filtrados por lista de e-mails, por setor e/ou empresa,
+    ou todos (all_users). A atribuição é feita com uma única instrução no banco.
+    
+    Args:
+        assignment: ID do template e filtro de usuários
+        current_user: Usuário atual
+        
+    Returns:
+        Contagens de assinaturas inseridas, atualizadas e inalteradas
+    """
+    by_attributes = assignment.setor is not None or assignment.empresa is not None
+    filters = [assignment.emails is not None, by_attributes, assignment.all_users]
+    if sum(filters) != 1:
+        raise HTTPException(
+            status_code=400,
+            detail="Informe apenas um filtro: lista de e-mails, setor/empresa ou todos os usuários"
+        )
+    
+    try:
+        stats = await db.run_in_db_executor(
+            signature_service.bulk_assign_signatures,
+            template_id=assignment.template_id,
+            emails=assignment.emails,
+            setor=assignment.setor,
+            empresa=assignment.empresa,
+            all_users=assignment.all_users
+        )
+        
+        if stats is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Template ID {assignment.template_id} não encontrado"
+            )
+        
+        return {"success": True, "message": "Assinaturas atribuídas com sucesso", "stats": stats}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao atribuir assinaturas em massa: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao atribuir assinaturas: {str(e)}"
+        )
+
 @router.get("/preview", response_model=str)
 async def preview_signature(template_id: int, email: str = Query(...)):
     """
@@ -179,8 +741,7 @@ async def preview_signature(template_id: int, email: str = Query(...)):
     """
     try:
         # Obtém o template
-        templates = signature_service.get_all_templates()
-        template = next((t for t in templates if t["id"] == template_id), None)
+        template = await db.run_in_db_executor(signature_service.get_template_by_id, template_id)
         
         if not template:
             raise HTTPException(
@@ -189,7 +750,7 @@ async def preview_signature(template_id: int, email: str = Query(...)):
             )
         
         # Obtém os dados do usuário
-        user_data = signature_service.get_user_data(email)
+        user_data = await db.run_in_db_executor(signature_service.get_user_data, email)
         
         if not user_data:
             raise HTTPException(
@@ -198,7 +759,11 @@ async def preview_signature(template_id: int, email: str = Query(...)):
             )
         
         # Renderiza a assinatura
-        signature_html = signature_service.render_signature(template["template_html"], user_data)
+        signature_html = signature_service.render_signature(
+            template["template_html"],
+            user_data,
+            signature_service.template_cache_key(template["id"], template.get("current_version_id"), template["updated_at"])
+        )
         
         return signature_html
     except HTTPException:
@@ -209,3 +774,56 @@ async def preview_signature(template_id: int, email: str = Query(...)):
             status_code=500,
             detail=f"Erro ao gerar preview de assinatura: {str(e)}"
         )
+
+@router.post("/render-batch")
+async def render_batch(
+    request: SignatureRenderBatchRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Renderiza um template para vários usuários de uma só vez.
+    
+    Os usuários são carregados com uma única consulta (pela lista de e-mails
+    ou pelo setor) e o template é compilado uma vez. A resposta é enviada em
+    NDJSON, uma linha por usuário: {"email", "html"} ou {"email", "html": null, "error"}.
+    
+    Args:
+        request: ID do template e lista de e-mails ou setor
+        current_user: Usuário atual
+        
+    Returns:
+        Stream NDJSON com as assinaturas renderizadas
+    """
+    if (request.emails is None) == (request.setor is None):
+        raise HTTPException(
+            status_code=400,
+            detail="Informe a lista de e-mails ou o setor (apenas um dos dois)"
+        )
+    
+    try:
+        template = await db.run_in_db_executor(signature_service.get_template_by_id, request.template_id)
+        
+        if not template:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Template ID {request.template_id} não encontrado"
+            )
+        
+        users = await db.run_in_db_executor(
+            signature_service.get_users_for_render,
+            emails=request.emails,
+            setor=request.setor
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao renderizar assinaturas em lote: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao renderizar assinaturas em lote: {str(e)}"
+        )
+    
+    return StreamingResponse(
+        signature_service.iter_rendered_batch(template, users),
+        media_type="application/x-ndjson"
+    )
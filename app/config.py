@@ -12,6 +12,16 @@ TENANT_ID = os.getenv("TENANT_ID")
 CLIENT_ID = os.getenv("CLIENT_ID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 
+# Cliente HTTP do Microsoft Graph
+GRAPH_HTTP_POOL_SIZE = int(os.getenv("GRAPH_HTTP_POOL_SIZE", "10"))  # conexões keep-alive mantidas por host
+GRAPH_HTTP_CONNECT_TIMEOUT = float(os.getenv("GRAPH_HTTP_CONNECT_TIMEOUT", "5"))
+GRAPH_HTTP_READ_TIMEOUT = float(os.getenv("GRAPH_HTTP_READ_TIMEOUT", "60"))
+GRAPH_TOKEN_REFRESH_MARGIN = int(os.getenv("GRAPH_TOKEN_REFRESH_MARGIN", "300"))  # segundos antes da expiração para renovar o token
+GRAPH_MAX_CONCURRENCY = int(os.getenv("GRAPH_MAX_CONCURRENCY", "4"))  # requisições simultâneas ao Graph
+GRAPH_MAX_RETRIES = int(os.getenv("GRAPH_MAX_RETRIES", "5"))
+GRAPH_BACKOFF_BASE = float(os.getenv("GRAPH_BACKOFF_BASE", "1"))  # segundos
+GRAPH_BACKOFF_MAX = float(os.getenv("GRAPH_BACKOFF_MAX", "60"))  # segundos
+
 # Configurações do banco de dados
 DB_SERVER = os.getenv("DB_SERVER")
 DB_NAME = os.getenv("DB_NAME")
@@ -21,6 +31,70 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 # String de conexão com o SQL Server
 DB_CONNECTION_STRING = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={DB_SERVER};DATABASE={DB_NAME};UID={DB_USER};PWD={DB_PASSWORD}"
 
+# Pool de conexões com o banco de dados
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "10"))  # segundos aguardando uma conexão livre
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))  # segundos ociosa antes de ser reciclada
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))  # idade máxima de uma conexão
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))  # ociosidade que exige SELECT 1 no checkout
+
+# Threads dedicadas ao acesso assíncrono ao banco (por padrão, uma por conexão do pool)
+DB_EXECUTOR_MAX_WORKERS = int(os.getenv("DB_EXECUTOR_MAX_WORKERS", str(DB_POOL_MAX_SIZE)))
+
+# Cache de assinaturas renderizadas (por processo)
+SIGNATURE_CACHE_MAX_SIZE = int(os.getenv("SIGNATURE_CACHE_MAX_SIZE", "10000"))
+SIGNATURE_CACHE_TTL = float(os.getenv("SIGNATURE_CACHE_TTL", "300"))  # segundos
+
+# Cache HTTP do endpoint /api/signature (o cliente sempre revalida com If-None-Match)
+SIGNATURE_HTTP_MAX_AGE = int(os.getenv("SIGNATURE_HTTP_MAX_AGE", "0"))  # segundos
+
+# Regras de atribuição de templates e campanhas (índices em memória por processo)
+TEMPLATE_RULES_REFRESH_INTERVAL = float(os.getenv("TEMPLATE_RULES_REFRESH_INTERVAL", "30"))  # segundos entre verificações de alterações
+CAMPAIGN_REFRESH_INTERVAL = float(os.getenv("CAMPAIGN_REFRESH_INTERVAL", "30"))  # segundos entre verificações de alterações
+
+# Sessões da área administrativa
+AUTH_SESSION_CACHE_MAX_SIZE = int(os.getenv("AUTH_SESSION_CACHE_MAX_SIZE", "1000"))
+AUTH_SESSION_CACHE_TTL = float(os.getenv("AUTH_SESSION_CACHE_TTL", "300"))  # segundos (limitado ao expires_at da sessão)
+AUTH_SESSION_SWEEP_INTERVAL = float(os.getenv("AUTH_SESSION_SWEEP_INTERVAL", "600"))  # segundos entre limpezas de admin_sessions
+AUTH_SESSION_SWEEP_BATCH_SIZE = int(os.getenv("AUTH_SESSION_SWEEP_BATCH_SIZE", "1000"))  # linhas removidas por DELETE
+AUTH_SESSION_LIFETIME = int(os.getenv("AUTH_SESSION_LIFETIME", "86400"))  # segundos de validade de uma sessão
+
+# Modo das sessões: "database" (tabela admin_sessions) ou "signed" (tokens HMAC
+# verificados em memória; exige AUTH_TOKEN_SECRET igual em todos os workers)
+AUTH_SESSION_MODE = os.getenv("AUTH_SESSION_MODE", "database").strip().lower()
+AUTH_TOKEN_SECRET = os.getenv("AUTH_TOKEN_SECRET")
+AUTH_REVOCATION_REFRESH_INTERVAL = float(os.getenv("AUTH_REVOCATION_REFRESH_INTERVAL", "30"))  # segundos entre recargas da lista de revogação
+
+# Limite de tentativas de login (por processo)
+LOGIN_USER_RATE = float(os.getenv("LOGIN_USER_RATE", "0.1"))  # tentativas repostas por segundo, por usuário
+LOGIN_USER_BURST = int(os.getenv("LOGIN_USER_BURST", "5"))
+LOGIN_IP_RATE = float(os.getenv("LOGIN_IP_RATE", "0.5"))  # tentativas repostas por segundo, por IP
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "20"))
+LOGIN_LOCKOUT_THRESHOLD = int(os.getenv("LOGIN_LOCKOUT_THRESHOLD", "5"))  # falhas seguidas de um usuário até o primeiro bloqueio
+LOGIN_IP_LOCKOUT_THRESHOLD = int(os.getenv("LOGIN_IP_LOCKOUT_THRESHOLD", "20"))  # falhas seguidas de um IP (vários usuários podem compartilhar o IP)
+LOGIN_LOCKOUT_BASE = float(os.getenv("LOGIN_LOCKOUT_BASE", "30"))  # segundos do primeiro bloqueio (dobra a cada nova falha)
+LOGIN_LOCKOUT_MAX = float(os.getenv("LOGIN_LOCKOUT_MAX", "900"))  # segundos
+# Teto do bloqueio por usuário: qualquer um que conheça o nome de usuário pode provocá-lo
+LOGIN_USER_LOCKOUT_MAX = float(os.getenv("LOGIN_USER_LOCKOUT_MAX", "120"))  # segundos
+LOGIN_FAILURE_WINDOW = float(os.getenv("LOGIN_FAILURE_WINDOW", "900"))  # segundos sem falhas até a contagem recomeçar
+LOGIN_LIMITER_MAX_KEYS = int(os.getenv("LOGIN_LIMITER_MAX_KEYS", "10000"))  # usuários e IPs monitorados em memória (cada tipo)
+
+# Logs (gravados por uma thread própria a partir de uma fila, sem bloquear as requisições)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("LOG_FILE", "addin_db.log")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").strip().lower()  # "text" ou "json" (uma linha JSON por registro)
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # tamanho do arquivo antes da rotação
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))  # arquivos rotacionados mantidos
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # registros pendentes antes de descartar
+# Limites por logger para mensagens abaixo de WARNING: "logger:registros_por_segundo,..."
+LOG_RATE_LIMITS = os.getenv(
+    "LOG_RATE_LIMITS",
+    "app.services.auth_service:5,app.api.admin:5,app.services.login_limiter:5"
+)
+# Amostragem por logger para mensagens abaixo de WARNING: "logger:fração,..." (ex.: app.services.signature_service:0.1)
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
 # Configurações do servidor
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8010"))
@@ -1,37 +1,337 @@
 """
 Módulo para conexão com o banco de dados SQL Server
 """
+import asyncio
+import functools
 import logging
+import threading
+import time
 import pyodbc
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Callable, TypeVar
 
-from .config import DB_CONNECTION_STRING
-
-# Configuração de logs
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename='addin_db.log'
+from .config import (
+    DB_CONNECTION_STRING,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_ACQUIRE_TIMEOUT,
+    DB_POOL_IDLE_TIMEOUT,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_HEALTH_CHECK_INTERVAL,
+    DB_EXECUTOR_MAX_WORKERS
 )
+
 logger = logging.getLogger(__name__)
 
+
+class PoolTimeoutError(pyodbc.OperationalError):
+    """Nenhuma conexão ficou disponível no pool dentro do tempo limite"""
+
+
+class _PooledConnection:
+    """Conexão física mantida pelo pool, com os instantes usados para reciclagem"""
+
+    __slots__ = ("connection", "created_at", "last_used_at")
+
+    def __init__(self, connection: "pyodbc.Connection"):
+        now = time.monotonic()
+        self.connection = connection
+        self.created_at = now
+        self.last_used_at = now
+
+
+class ConnectionPool:
+    """
+    Pool limitado de conexões pyodbc reutilizáveis.
+
+    As conexões ociosas ficam em uma pilha (LIFO), de modo que as mais usadas
+    permanecem quentes e as demais envelhecem até serem recicladas. No checkout,
+    conexões ociosas há mais de `health_check_interval` segundos são validadas
+    com um SELECT 1 antes de serem entregues.
+    """
+
+    def __init__(
+        self,
+        connection_string: str,
+        min_size: int = 2,
+        max_size: int = 20,
+        acquire_timeout: float = 10.0,
+        idle_timeout: float = 300.0,
+        max_lifetime: float = 3600.0,
+        health_check_interval: float = 30.0
+    ):
+        self.connection_string = connection_string
+        self.max_size = max(1, max_size)
+        self.min_size = max(0, min(min_size, self.max_size))
+        self.acquire_timeout = acquire_timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "recycled_idle": 0,
+            "recycled_lifetime": 0,
+            "discarded": 0
+        }
+
+    def _connect(self) -> _PooledConnection:
+        conn = pyodbc.connect(self.connection_string)
+        with self._cond:
+            self._stats["created"] += 1
+        return _PooledConnection(conn)
+
+    def _close(self, pooled: _PooledConnection) -> None:
+        try:
+            pooled.connection.close()
+        except pyodbc.Error as e:
+            logger.debug(f"Erro ao fechar conexão do pool: {str(e)}")
+        with self._cond:
+            self._stats["closed"] += 1
+
+    def _collect_stale_locked(self, now: float) -> List[_PooledConnection]:
+        """Retira do pool as conexões ociosas que passaram do tempo limite (requer o lock)"""
+        stale = []
+        # As mais antigas ficam à esquerda da pilha
+        while self._idle and self._size > self.min_size:
+            oldest = self._idle[0]
+            if now - oldest.last_used_at > self.idle_timeout:
+                self._stats["recycled_idle"] += 1
+            elif now - oldest.created_at > self.max_lifetime:
+                self._stats["recycled_lifetime"] += 1
+            else:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            stale.append(oldest)
+        return stale
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        try:
+            cursor = pooled.connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error as e:
+            logger.warning(f"Conexão do pool falhou na verificação de saúde: {str(e)}")
+            return False
+
+    def acquire(self) -> _PooledConnection:
+        """
+        Obtém uma conexão do pool, abrindo uma nova se houver capacidade.
+
+        Returns:
+            Conexão do pool
+
+        Raises:
+            PoolTimeoutError: Se nenhuma conexão ficar livre dentro do tempo limite
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            pooled = None
+            create = False
+            with self._cond:
+                if self._closed:
+                    raise pyodbc.OperationalError("Pool de conexões encerrado")
+
+                waited = False
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Tempo esgotado aguardando conexão do pool ({self.max_size} em uso)"
+                        )
+                    if not waited:
+                        self._stats["waits"] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+
+                stale = self._collect_stale_locked(time.monotonic())
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+                self._stats["checkouts"] += 1
+
+            for conn in stale:
+                self._close(conn)
+
+            if create:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            now = time.monotonic()
+            if now - pooled.created_at > self.max_lifetime:
+                with self._cond:
+                    self._stats["recycled_lifetime"] += 1
+                self._discard(pooled, count=False)
+                continue
+
+            if now - pooled.last_used_at <= self.health_check_interval or self._is_healthy(pooled):
+                return pooled
+
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            self._discard(pooled, count=False)
+
+    def _discard(self, pooled: _PooledConnection, count: bool = True) -> None:
+        with self._cond:
+            self._size -= 1
+            if count:
+                self._stats["discarded"] += 1
+            self._cond.notify()
+        self._close(pooled)
+
+    def release(self, pooled: _PooledConnection, discard: bool = False) -> None:
+        """
+        Devolve uma conexão ao pool.
+
+        Qualquer transação pendente é desfeita para que a próxima requisição
+        receba a conexão em estado limpo. Conexões com erro são descartadas.
+
+        Args:
+            pooled: Conexão obtida com acquire()
+            discard: Se True, fecha a conexão em vez de devolvê-la
+        """
+        if not discard:
+            try:
+                pooled.connection.rollback()
+            except pyodbc.Error:
+                discard = True
+
+        if discard:
+            self._discard(pooled)
+            return
+
+        pooled.last_used_at = time.monotonic()
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+            else:
+                self._idle.append(pooled)
+                pooled = None
+            self._cond.notify()
+        if pooled is not None:
+            self._close(pooled)
+
+    def warm_up(self) -> None:
+        """Abre conexões até atingir o tamanho mínimo do pool"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                pooled = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(pooled)
+                self._cond.notify()
+
+    def close(self) -> None:
+        """Fecha todas as conexões ociosas e impede novos checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close(pooled)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retorna as estatísticas do pool.
+
+        Returns:
+            Dicionário com tamanho atual, conexões em uso e contadores acumulados
+        """
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                **self._stats
+            }
+
+
+_pool = ConnectionPool(
+    DB_CONNECTION_STRING,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+    idle_timeout=DB_POOL_IDLE_TIMEOUT,
+    max_lifetime=DB_POOL_MAX_LIFETIME,
+    health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL
+)
+
+# Executor dedicado: chamadas bloqueantes do pyodbc rodam fora do event loop,
+# limitadas ao número de conexões para que as threads não disputem o pool
+_executor = ThreadPoolExecutor(max_workers=max(1, DB_EXECUTOR_MAX_WORKERS), thread_name_prefix="db")
+
+T = TypeVar("T")
+
+def init_pool() -> None:
+    """Pré-abre as conexões mínimas do pool (chamado na inicialização da aplicação)"""
+    try:
+        _pool.warm_up()
+    except pyodbc.Error as e:
+        logger.error(f"Erro ao inicializar o pool de conexões: {str(e)}")
+
+def close_pool() -> None:
+    """Fecha as conexões do pool e o executor assíncrono (chamado no encerramento da aplicação)"""
+    _executor.shutdown(wait=True)
+    _pool.close()
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Retorna as estatísticas do pool de conexões"""
+    return _pool.stats()
+
 @contextmanager
 def get_db_connection():
     """
     Gerenciador de contexto para conexão com o banco de dados.
-    Garante que a conexão seja fechada após o uso, mesmo em caso de erro.
+    Empresta uma conexão do pool e a devolve após o uso, mesmo em caso de erro.
     """
-    conn = None
     try:
-        conn = pyodbc.connect(DB_CONNECTION_STRING)
-        yield conn
+        pooled = _pool.acquire()
+    except pyodbc.Error as e:
+        logger.error(f"Erro ao conectar ao banco de dados: {str(e)}")
+        raise
+
+    try:
+        yield pooled.connection
     except pyodbc.Error as e:
         logger.error(f"Erro ao conectar ao banco de dados: {str(e)}")
         raise
     finally:
-        if conn:
-            conn.close()
+        _pool.release(pooled)
 
 def execute_query(query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
     """
@@ -100,3 +400,48 @@ def execute_non_query(query: str, params: Optional[tuple] = None) -> int:
         if params:
             logger.error(f"Params: {params}")
         raise
+
+
+async def run_in_db_executor(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Executa uma função bloqueante de acesso ao banco no executor dedicado.
+
+    Útil para funções de serviço que fazem várias consultas em sequência:
+    todas rodam em uma única ida ao executor, sem bloquear o event loop.
+
+    Args:
+        func: Função síncrona a ser executada
+        *args: Argumentos posicionais da função
+        **kwargs: Argumentos nomeados da função
+
+    Returns:
+        Resultado da função
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+async def execute_query_async(query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+    """
+    Versão assíncrona de execute_query, executada no executor dedicado.
+
+    Args:
+        query: Consulta SQL a ser executada
+        params: Parâmetros para a consulta (opcional)
+
+    Returns:
+        Lista de dicionários com os resultados da consulta
+    """
+    return await run_in_db_executor(execute_query, query, params)
+
+async def execute_non_query_async(query: str, params: Optional[tuple] = None) -> int:
+    """
+    Versão assíncrona de execute_non_query, executada no executor dedicado.
+
+    Args:
+        query: Instrução SQL a ser executada
+        params: Parâmetros para a instrução (opcional)
+
+    Returns:
+        Número de linhas afetadas
+    """
+    return await run_in_db_executor(execute_non_query, query, params)
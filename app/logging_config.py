@@ -0,0 +1,201 @@
+"""
+Configuração de logs da aplicação: gravação assíncrona via fila, rotação por
+tamanho, saída opcional em JSON e limites/amostragem por logger
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from .config import (
+    LOG_LEVEL,
+    LOG_FILE,
+    LOG_FORMAT,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_QUEUE_SIZE,
+    LOG_RATE_LIMITS,
+    LOG_SAMPLE_RATES
+)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Formata cada registro como uma linha JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limita as mensagens de um logger a `rate` registros por segundo (token bucket).
+
+    Registros de nível WARNING ou superior sempre passam (bloqueios de login,
+    revogações e falhas de autenticação são eventos de segurança e não podem
+    ser descartados). O primeiro registro aceito após um descarte informa
+    quantas mensagens foram suprimidas.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        super().__init__()
+        self.rate = rate
+        self.capacity = max(1.0, burst if burst is not None else rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._suppressed = 0
+        self._lock = threading.Lock()
+        self.total_suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens < 1:
+                self._suppressed += 1
+                self.total_suppressed += 1
+                return False
+            self._tokens -= 1
+            suppressed, self._suppressed = self._suppressed, 0
+
+        if suppressed:
+            record.msg = f"{record.getMessage()} [{suppressed} mensagens suprimidas]"
+            record.args = None
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Mantém apenas uma fração das mensagens abaixo de WARNING de um logger"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self.total_suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or random.random() < self.rate:
+            return True
+        self.total_suppressed += 1
+        return False
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (e conta) registros quando a fila está cheia, sem bloquear"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[_DroppingQueueHandler] = None
+_filters: Dict[str, logging.Filter] = {}
+_setup_lock = threading.Lock()
+
+
+def _parse_per_logger(spec: str) -> Dict[str, float]:
+    """Interpreta "logger:valor,logger:valor" (entradas inválidas são ignoradas)"""
+    values = {}
+    for item in spec.split(","):
+        name, _, value = item.strip().rpartition(":")
+        if not name:
+            continue
+        try:
+            values[name] = float(value)
+        except ValueError:
+            continue
+    return values
+
+
+def setup_logging() -> None:
+    """
+    Configura o logging da aplicação (chamada uma vez, na inicialização).
+
+    Os registros são apenas enfileirados pela thread que os emite; uma thread
+    do QueueListener formata e grava no arquivo com rotação por tamanho.
+    """
+    global _listener, _queue_handler
+    with _setup_lock:
+        if _queue_handler is not None:
+            return
+
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE,
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT,
+            encoding="utf-8",
+            delay=True
+        )
+        file_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+        _queue_handler = _DroppingQueueHandler(queue.Queue(maxsize=max(1, LOG_QUEUE_SIZE)))
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, file_handler, respect_handler_level=True)
+
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(_queue_handler)
+
+        for name, rate in _parse_per_logger(LOG_RATE_LIMITS).items():
+            _filters[f"rate:{name}"] = RateLimitFilter(rate)
+            logging.getLogger(name).addFilter(_filters[f"rate:{name}"])
+        for name, rate in _parse_per_logger(LOG_SAMPLE_RATES).items():
+            _filters[f"sample:{name}"] = SampleFilter(rate)
+            logging.getLogger(name).addFilter(_filters[f"sample:{name}"])
+
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Grava os registros pendentes e encerra a thread de logs (registrada em atexit)"""
+    global _listener
+    with _setup_lock:
+        listener, _listener = _listener, None
+        if _queue_handler is not None:
+            logging.getLogger().removeHandler(_queue_handler)
+    if listener is not None:
+        listener.stop()
+
+
+def get_logging_stats() -> Dict[str, Any]:
+    """
+    Retorna as estatísticas do logging.
+
+    Returns:
+        Registros pendentes e descartados na fila e mensagens suprimidas por filtro
+    """
+    handler = _queue_handler
+    return {
+        "format": LOG_FORMAT,
+        "queued": handler.queue.qsize() if handler is not None else 0,
+        "dropped": handler.dropped if handler is not None else 0,
+        "suppressed": {key: log_filter.total_suppressed for key, log_filter in _filters.items()}
+    }
@@ -1,6 +1,7 @@
 """
 Arquivo principal da aplicação FastAPI
 """
+import asyncio
 import logging
 from fastapi import FastAPI, Request, Response, Cookie
 from fastapi.staticfiles import StaticFiles
@@ -12,22 +13,49 @@ from pathlib import Path
 from .api import signature, admin
 from . import db  # Certifique-se de importar seu módulo de acesso ao banco
 import hashlib
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 from .api import signature, admin
+from .api.auth import get_request_session
 from .config import BASE_URL
-from .services import auth_service
+from .logging_config import setup_logging
+from .services import auth_service, campaigns, signature_service, template_rules
 
-# Configuração de logs
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename='addin.log'
-)
+# Configuração de logs (fila + thread de gravação; ver app/logging_config.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicializa e libera os recursos compartilhados da aplicação"""
+    db.init_pool()
+    try:
+        template_rules.load_rules()
+        campaigns.load_campaigns()
+    except Exception as e:
+        # Os índices são carregados na primeira resolução de assinatura
+        logger.error(f"Erro ao carregar as regras de template e campanhas: {str(e)}")
+    tasks = [
+        asyncio.create_task(auth_service.run_session_sweeper()),
+        asyncio.create_task(template_rules.run_rules_refresher()),
+        asyncio.create_task(campaigns.run_campaign_refresher(on_change=signature_service.clear_signature_cache))
+    ]
+    if auth_service.SIGNED_SESSIONS:
+        try:
+            auth_service.load_revocations()
+        except Exception as e:
+            # A lista é carregada na primeira validação de token assinado
+            logger.error(f"Erro ao carregar a lista de revogação de sessões: {str(e)}")
+        tasks.append(asyncio.create_task(auth_service.run_revocation_refresher()))
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    db.close_pool()
+
 # Cria a aplicação FastAPI
-app = FastAPI(title="Outlook Signature Add-in")
+app = FastAPI(title="Outlook Signature Add-in", lifespan=lifespan)
 
 # Configura o CORS
 app.add_middleware(
@@ -36,6 +64,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # Configura arquivos estáticos
@@ -49,27 +78,9 @@ app.include_router(signature.router, prefix="/api", tags=["signature"])
 app.include_router(signature.router, prefix="/api/signatures", tags=["signatures"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
-def is_authenticated(request: Request) -> bool:
-    session_token = request.cookies.get("session_token")
-    
-    # Log detalhado da verificação
-    if session_token:
-        logger.debug(f"Verificando autenticação para {request.url.path}, token encontrado: {session_token[:10]}...")
-    else:
-        logger.warning(f"Verificando autenticação para {request.url.path}, token não encontrado")
-        return False
-    
-    try:    
-        session = auth_service.validate_session(session_token)
-        if session:
-            logger.info(f"Sessão válida para usuário: {session.get('username')}, rota: {request.url.path}")
-            return True
-        
-        logger.warning(f"Sessão inválida ou expirada para rota: {request.url.path}")
-        return False
-    except Exception as e:
-        logger.error(f"Erro ao validar autenticação: {str(e)}")
-        return False
+async def is_authenticated(request: Request) -> bool:
+    """Indica se a requisição tem uma sessão válida (validada uma única vez por requisição)"""
+    return await get_request_session(request) is not None
 
 # Adicionar middleware de autenticação para rotas da API admin
 @app.middleware("http")
@@ -78,26 +89,18 @@ async def auth_middleware(request: Request, call_next):
     if request.url.path.startswith("/api/admin/"):
         # Excluir a rota de login da verificação
         if request.url.path != "/api/admin/login":
-            session_token = request.cookies.get("session_token")
-            logger.debug(f"Token recebido: {session_token[:10] if session_token else None}")
-            
-            if not session_token:
-                logger.warning("Token não encontrado no request")
+            if not request.cookies.get("session_token"):
                 return JSONResponse(
                     status_code=401,
                     content={"detail": "Não autenticado"}
                 )
-                
-            session = auth_service.validate_session(session_token)
-            if not session:
-                logger.warning(f"Sessão inválida para token: {session_token[:10] if session_token else None}")
+            
+            # A sessão fica em request.state e é reaproveitada por get_current_user
+            if not await get_request_session(request):
                 return JSONResponse(
                     status_code=401,
                     content={"detail": "Sessão inválida ou expirada"}
                 )
-            
-            # Adicionar informações da sessão ao request
-            request.state.user = session
 
     response = await call_next(request)
     return response
@@ -121,14 +124,9 @@ async def admin_panel(request: Request):
     """
     Página principal da área administrativa.
     """
-    session_token = request.cookies.get("session_token")
-    logger.debug(f"Verificando auth para /admin, token: {session_token[:10] if session_token else None}")
-    
-    if not is_authenticated(request):
-        logger.warning("Não autenticado, redirecionando para /admin/login")
+    if not await is_authenticated(request):
         return RedirectResponse(url="/admin/login", status_code=303)
     
-    logger.info("Usuário autenticado, carregando página admin")
     return templates.TemplateResponse("admin/index.html", {"request": request, "base_url": BASE_URL})
 
 @app.get("/admin/login")
@@ -150,8 +148,7 @@ async def admin_login_get(request: Request):
 @app.get("/admin/users")
 async def admin_users(request: Request):
     """Página de gerenciamento de usuários"""
-    if not is_authenticated(request):
-        logger.warning("Acesso não autorizado a /admin/users")
+    if not await is_authenticated(request):
         return RedirectResponse(url="/admin/login", status_code=303)
         
     return templates.TemplateResponse(
@@ -164,7 +161,7 @@ async def admin_signatures(request: Request):
     """
     Página de gerenciamento de templates de assinatura.
     """
-    if not is_authenticated(request):
+    if not await is_authenticated(request):
         return RedirectResponse(url="/admin/login", status_code=303)
     return templates.TemplateResponse("admin/signatures.html", {"request": request, "base_url": BASE_URL})
 
@@ -214,8 +211,7 @@ async def debug_cookies(request: Request):
     session_valid = False
     
     if "session_token" in cookies:
-        session = auth_service.validate_session(cookies["session_token"])
-        session_valid = session is not None
+        session_valid = await is_authenticated(request)
     
     return {
         "cookies": {k: v[:10] + "..." if k == "session_token" and v else v for k, v in cookies.items()},
@@ -239,7 +235,7 @@ async def debug_auth(request: Request):
     session_error = None
     if session_token:
         try:
-            session = auth_service.validate_session(session_token)
+            session = await get_request_session(request)
             if session:
                 session_info = {
                     "user_id": session.get("user_id"),
@@ -250,7 +246,7 @@ async def debug_auth(request: Request):
             session_error = str(e)
     
     # Verificar sessões ativas no serviço de autenticação
-    active_sessions_count = len(auth_service.active_sessions) if hasattr(auth_service, 'active_sessions') else 0
+    active_sessions_count = auth_service.get_cached_session_count()
     
     return {
         "timestamp": datetime.now().isoformat(),
@@ -12,15 +12,97 @@ class SignatureTemplate(BaseModel):
     name: str
     template_html: str
     is_default: bool = False
+    current_version_id: Optional[int] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
 
+class TemplateVersion(BaseModel):
+    """Modelo para versão imutável de um template"""
+    id: int
+    template_id: int
+    content_hash: str
+    template_html: Optional[str] = None  # Presente apenas na consulta de uma versão específica
+    size: Optional[int] = None
+    is_current: Optional[bool] = None
+    created_at: Optional[datetime] = None
+
+
+class TemplateSummary(BaseModel):
+    """Modelo para listagem de templates (sem o HTML)"""
+    id: int
+    name: str
+    is_default: bool = False
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    size: int = Field(0, title="Tamanho do HTML em bytes")
+
+
+class TemplateSummaryPage(BaseModel):
+    """Modelo para uma página da listagem de templates"""
+    items: List[TemplateSummary]
+    next_cursor: Optional[str] = None
+
+
+class TemplateRule(BaseModel):
+    """Modelo para regra de atribuição de template (critérios nulos não restringem)"""
+    id: Optional[int] = None
+    priority: int = 100
+    template_id: int
+    email_domain: Optional[str] = None
+    empresa: Optional[str] = None
+    setor: Optional[str] = None
+    cargo: Optional[str] = None
+    is_active: bool = True
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class TemplateRuleRequest(BaseModel):
+    """Modelo para requisição de criação/atualização de regra de template"""
+    priority: int = 100
+    template_id: int
+    email_domain: Optional[str] = None
+    empresa: Optional[str] = None
+    setor: Optional[str] = None
+    cargo: Optional[str] = None
+    is_active: bool = True
+
+
+class Campaign(BaseModel):
+    """Modelo para campanha (banner anexado às assinaturas durante um período)"""
+    id: Optional[int] = None
+    name: str
+    banner_html: str
+    starts_at: datetime
+    ends_at: datetime
+    email_domain: Optional[str] = None
+    empresa: Optional[str] = None
+    setor: Optional[str] = None
+    priority: int = 100
+    is_active: bool = True
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class CampaignRequest(BaseModel):
+    """Modelo para requisição de criação/atualização de campanha"""
+    name: str
+    banner_html: str
+    starts_at: datetime
+    ends_at: datetime
+    email_domain: Optional[str] = None
+    empresa: Optional[str] = None
+    setor: Optional[str] = None
+    priority: int = 100
+    is_active: bool = True
+
+
 class SignatureAssignment(BaseModel):
     """Modelo para atribuição de assinatura a um usuário"""
     id: Optional[int] = None
     user_email: EmailStr
-    signature_html: str
+    signature_html: Optional[str] = None  # Apenas HTML personalizado; None usa o template
     template_id: int
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
@@ -50,6 +132,17 @@ class TemplateUpdateRequest(BaseModel):
     is_default: Optional[bool] = None
 
 
+class TemplateValidateRequest(BaseModel):
+    """Modelo para requisição de validação de template"""
+    template_html: str
+
+
+class TemplateValidationResult(BaseModel):
+    """Modelo para resultado da validação de template"""
+    valid: bool
+    unknown_placeholders: List[str] = []
+
+
 class SignatureAssignRequest(BaseModel):
     """Modelo para requisição de atribuição de assinatura"""
     user_email: EmailStr
@@ -57,6 +150,22 @@ class SignatureAssignRequest(BaseModel):
     custom_html: Optional[str] = None
 
 
+class SignatureBulkAssignRequest(BaseModel):
+    """Modelo para requisição de atribuição em massa (setor e/ou empresa, lista de e-mails ou todos)"""
+    template_id: int
+    setor: Optional[str] = None
+    empresa: Optional[str] = None
+    emails: Optional[List[EmailStr]] = None
+    all_users: bool = False
+
+
+class SignatureRenderBatchRequest(BaseModel):
+    """Modelo para requisição de renderização em lote (por lista de e-mails ou por setor)"""
+    template_id: int
+    emails: Optional[List[EmailStr]] = None
+    setor: Optional[str] = None
+
+
 class SignaturePreviewRequest(BaseModel):
     """Modelo para requisição de preview de assinatura"""
     template_id: int
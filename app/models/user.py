@@ -42,6 +42,11 @@ class UserUpdateRequest(BaseModel):
     ramal: Optional[str] = None
 
 
+class UserBatchSyncRequest(BaseModel):
+    """Modelo para requisição de sincronização de vários usuários"""
+    emails: List[EmailStr]
+
+
 class LoginRequest(BaseModel):
     """Modelo para requisição de login"""
     username: str
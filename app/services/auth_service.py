@@ -1,76 +1,364 @@
 """
 Serviço para autenticação da área administrativa
 """
+import asyncio
+import base64
+import binascii
+import hmac
+import json
 import logging
 import secrets
 import hashlib
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
 from .. import db
-from ..config import AUTH_ENABLED
+from ..config import (
+    AUTH_SESSION_CACHE_MAX_SIZE,
+    AUTH_SESSION_CACHE_TTL,
+    AUTH_SESSION_SWEEP_INTERVAL,
+    AUTH_SESSION_SWEEP_BATCH_SIZE,
+    AUTH_SESSION_LIFETIME,
+    AUTH_SESSION_MODE,
+    AUTH_TOKEN_SECRET,
+    AUTH_REVOCATION_REFRESH_INTERVAL
+)
+from .cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
-# Dicionário para armazenar sessões ativas
-# Na produção, seria melhor usar Redis ou outra solução de cache
-active_sessions = {}
+# Sessões assinadas só são usadas com um segredo configurado
+SIGNED_SESSIONS = AUTH_SESSION_MODE == "signed" and bool(AUTH_TOKEN_SECRET)
+if AUTH_SESSION_MODE == "signed" and not AUTH_TOKEN_SECRET:
+    logger.error("AUTH_SESSION_MODE=signed sem AUTH_TOKEN_SECRET; usando sessões no banco")
 
-def authenticate_user(username: str, password: str) -> Optional[str]:
+# Sessões validadas recentemente (por processo). Cada entrada expira no
+# expires_at da sessão ou após AUTH_SESSION_CACHE_TTL, o que vier antes, para
+# que um logout feito em outro processo seja percebido em tempo limitado.
+_session_cache = TTLCache(maxsize=AUTH_SESSION_CACHE_MAX_SIZE, ttl=AUTH_SESSION_CACHE_TTL)
+
+# Removem, em lotes, as sessões e os tokens revogados já expirados
+_DELETE_EXPIRED_SQL = (
     """
-    Autentica um usuário administrativo.
-    
+    DELETE TOP (?) FROM [dbo].[admin_sessions]
+    WHERE [expires_at] <= GETDATE()
+    """,
+    """
+    DELETE TOP (?) FROM [dbo].[admin_revoked_tokens]
+    WHERE [expires_at] <= GETDATE()
+    """
+)
+
+_REVOKED_USERS_SQL = """
+SELECT id, session_epoch, is_active
+FROM [dbo].[admin_users]
+WHERE session_epoch > 0 OR is_active = 0
+"""
+
+_REVOKED_TOKENS_SQL = """
+SELECT token_id
+FROM [dbo].[admin_revoked_tokens]
+WHERE expires_at > GETDATE()
+"""
+
+_sweep_lock = threading.Lock()
+_sweep_stats = {
+    "sweeps": 0,
+    "sweep_errors": 0,
+    "rows_deleted": 0,
+    "last_sweep_at": None,
+    "last_sweep_deleted": 0
+}
+
+
+def _cache_session(token: str, session: Dict[str, Any]) -> None:
+    """Armazena a sessão no cache até o seu expires_at (limitado ao TTL do cache)"""
+    remaining = (session["expires_at"] - datetime.now()).total_seconds()
+    _session_cache.set(token, session, ttl=min(AUTH_SESSION_CACHE_TTL, remaining))
+
+
+class RevocationList:
+    """
+    Lista de revogação das sessões assinadas.
+
+    Um token é recusado se o usuário estiver inativo, se a época do token for
+    menor que a época atual do usuário (revogação de todas as sessões) ou se o
+    identificador do token tiver sido revogado (logout).
+    """
+
+    __slots__ = ("user_epochs", "inactive_users", "token_ids", "loaded_at")
+
+    def __init__(self, users: List[Dict[str, Any]], token_ids: List[str]):
+        self.user_epochs = {row["id"]: row["session_epoch"] for row in users}
+        self.inactive_users = {row["id"] for row in users if not row["is_active"]}
+        self.token_ids = set(token_ids)
+        self.loaded_at = datetime.now()
+
+    def is_revoked(self, claims: Dict[str, Any]) -> bool:
+        user_id = claims["uid"]
+        return (
+            user_id in self.inactive_users
+            or claims["epoch"] < self.user_epochs.get(user_id, 0)
+            or claims["jti"] in self.token_ids
+        )
+
+
+_revocations: Optional[RevocationList] = None
+_revocations_lock = threading.Lock()
+_revocation_stats = {"refreshes": 0, "refresh_errors": 0}
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _signature(payload: str) -> str:
+    digest = hmac.new(AUTH_TOKEN_SECRET.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+def _sign_token(user: Dict[str, Any], expires_at: datetime) -> str:
+    """
+    Gera um token de sessão assinado.
+
+    O token é "<payload>.<assinatura>", com o payload em JSON (base64url)
+    contendo id, nome e papel do usuário, época de revogação, expiração e
+    um identificador aleatório usado no logout.
+    """
+    claims = {
+        "uid": user["id"],
+        "usr": user["username"],
+        "role": user["role"],
+        "epoch": user.get("session_epoch") or 0,
+        "exp": int(expires_at.timestamp()),
+        "jti": secrets.token_urlsafe(16)
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_signature(payload)}"
+
+def _decode_signed_token(token: str) -> Optional[Dict[str, Any]]:
+    """Confere assinatura e expiração de um token assinado e retorna seus dados"""
+    payload, _, signature = token.partition(".")
+    if not hmac.compare_digest(signature.encode("utf-8"), _signature(payload).encode("ascii")):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except (binascii.Error, ValueError):
+        return None
+    if claims.get("exp", 0) <= time.time():
+        return None
+    return claims
+
+def is_signed_token(token: str) -> bool:
+    """Indica se o token deve ser verificado como token assinado (tokens opacos não têm ".")"""
+    return SIGNED_SESSIONS and "." in token
+
+def load_revocations() -> RevocationList:
+    """
+    Recarrega do banco a lista de revogação das sessões assinadas.
+
+    Returns:
+        Lista carregada
+    """
+    global _revocations
+    try:
+        revocations = RevocationList(
+            db.execute_query(_REVOKED_USERS_SQL),
+            [row["token_id"] for row in db.execute_query(_REVOKED_TOKENS_SQL)]
+        )
+    except Exception:
+        with _revocations_lock:
+            _revocation_stats["refresh_errors"] += 1
+        raise
+    with _revocations_lock:
+        _revocations = revocations
+        _revocation_stats["refreshes"] += 1
+    return revocations
+
+def _get_revocations() -> RevocationList:
+    """Retorna a lista de revogação atual, carregando-a na primeira chamada"""
+    revocations = _revocations
+    if revocations is None:
+        revocations = load_revocations()
+    return revocations
+
+async def run_revocation_refresher(interval: float = AUTH_REVOCATION_REFRESH_INTERVAL) -> None:
+    """
+    Laço de recarga periódica da lista de revogação (iniciado no lifespan
+    quando as sessões assinadas estão habilitadas).
+
+    Uma revogação feita em outro processo passa a valer aqui em até `interval`
+    segundos; em caso de erro, a última lista carregada continua em uso.
+
+    Args:
+        interval: Segundos entre duas recargas
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await db.run_in_db_executor(load_revocations)
+        except Exception as e:
+            logger.error(f"Erro ao recarregar a lista de revogação de sessões: {str(e)}")
+
+def verify_credentials(username: str, password: str) -> Optional[Dict[str, Any]]:
+    """
+    Confere usuário e senha de um administrador ativo.
+
     Args:
         username: Nome de usuário
         password: Senha
-        
+
     Returns:
-        Token de sessão ou None se a autenticação falhar
+        Usuário (id, username, role, session_epoch) ou None se as credenciais forem inválidas
     """
-    if not AUTH_ENABLED:
-        # Se a autenticação estiver desabilitada, retorna um token fixo
-        return "admin_no_auth"
-    
-    try:
-        # Hash da senha para comparação com o banco
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
-        
-        # Consulta o usuário no banco
-        query = """
-        SELECT id, username, role FROM [dbo].[admin_users]
-        WHERE username = ? AND password_hash = ? AND is_active = 1
-        """
-        
-        results = db.execute_query(query, (username, hashed_password))
-        
-        if results and len(results) > 0:
-            # Gera um token de sessão
-            session_token = secrets.token_urlsafe(32)
-            
-            # Armazena a sessão
-            active_sessions[session_token] = {
-                "user_id": results[0]["id"],
-                "username": results[0]["username"],
-                "role": results[0]["role"],
-                "expires_at": datetime.now() + timedelta(hours=24)
-            }
-            
-            return session_token
-        else:
-            logger.warning(f"Tentativa de login falhou para usuário: {username}")
-            return None
-    except Exception as e:
-        logger.error(f"Erro durante autenticação para usuário {username}: {str(e)}")
-        return None
+    password_hash = hashlib.sha256(password.encode()).hexdigest()
+    result = db.execute_query("""
+        SELECT id, username, role, session_epoch 
+        FROM [dbo].[admin_users] 
+        WHERE username = ? 
+          AND password_hash = ? 
+          AND is_active = 1
+    """, (username, password_hash))
+    return result[0] if result else None
+
+def create_session(user: Dict[str, Any], ip_address: Optional[str] = None, user_agent: Optional[str] = None) -> Tuple[str, datetime]:
+    """
+    Cria uma sessão para um usuário administrativo já autenticado.
+
+    No modo assinado o token é verificado em memória e nada é gravado; no modo
+    padrão a sessão é gravada em admin_sessions.
+
+    Args:
+        user: Usuário (id, username, role e session_epoch)
+        ip_address: IP de origem do login
+        user_agent: User-Agent do navegador
+
+    Returns:
+        Token de sessão e data de expiração
+    """
+    expires_at = datetime.now() + timedelta(seconds=AUTH_SESSION_LIFETIME)
+    if SIGNED_SESSIONS:
+        return _sign_token(user, expires_at), expires_at
+
+    token = secrets.token_urlsafe(32)
+    db.execute_non_query("""
+        INSERT INTO [dbo].[admin_sessions] 
+        (user_id, token, expires_at, ip_address, user_agent, created_at)
+        VALUES (?, ?, ?, ?, ?, GETDATE())
+    """, (user["id"], token, expires_at, ip_address, user_agent))
+    return token, expires_at
+
+def revoke_user_sessions(user_id: int) -> bool:
+    """
+    Revoga todas as sessões de um usuário administrativo.
+
+    Incrementa a época de revogação (invalida os tokens assinados já emitidos)
+    e remove as sessões gravadas em admin_sessions.
+
+    Args:
+        user_id: ID do usuário administrativo
+
+    Returns:
+        True se o usuário existe
+    """
+    updated = db.execute_non_query("""
+    UPDATE [dbo].[admin_users]
+    SET session_epoch = session_epoch + 1, updated_at = GETDATE()
+    WHERE id = ?
+    """, (user_id,))
+    if not updated:
+        return False
+
+    db.execute_non_query("DELETE FROM [dbo].[admin_sessions] WHERE user_id = ?", (user_id,))
+    _session_cache.invalidate_where(lambda token, session: session["user_id"] == user_id)
+    if SIGNED_SESSIONS:
+        load_revocations()
+    return True
+
+def cleanup_expired_sessions(batch_size: int = AUTH_SESSION_SWEEP_BATCH_SIZE) -> int:
+    """
+    Remove do banco, em lotes, as sessões e os tokens revogados já expirados.
+
+    Cada lote é um DELETE TOP (batch_size) confirmado separadamente, para não
+    manter bloqueios longos na tabela admin_sessions.
 
-def cleanup_expired_sessions():
-    """Remove sessões expiradas do banco"""
+    Args:
+        batch_size: Quantidade máxima de linhas removidas por instrução
+
+    Returns:
+        Número de linhas removidas
+    """
+    total = 0
     try:
-        db.execute_non_query(
-            "DELETE FROM admin_sessions WHERE expires_at <= GETDATE()"
-        )
+        for query in _DELETE_EXPIRED_SQL:
+            while True:
+                deleted = db.execute_non_query(query, (batch_size,))
+                total += deleted
+                if deleted < batch_size:
+                    break
     except Exception as e:
         logger.error("Erro ao limpar sessões expiradas: %s", str(e))
+        with _sweep_lock:
+            _sweep_stats["sweep_errors"] += 1
+
+    with _sweep_lock:
+        _sweep_stats["sweeps"] += 1
+        _sweep_stats["rows_deleted"] += total
+        _sweep_stats["last_sweep_at"] = datetime.now().isoformat()
+        _sweep_stats["last_sweep_deleted"] = total
+    return total
+
+async def run_session_sweeper(interval: float = AUTH_SESSION_SWEEP_INTERVAL) -> None:
+    """
+    Laço de limpeza periódica das sessões (iniciado no lifespan da aplicação).
+
+    A cada intervalo descarta as entradas expiradas do cache e remove do banco
+    as sessões expiradas. Termina quando a tarefa é cancelada.
+
+    Args:
+        interval: Segundos entre duas limpezas
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            cleanup_sessions()
+            deleted = await db.run_in_db_executor(cleanup_expired_sessions)
+            if deleted:
+                logger.info(f"{deleted} sessões expiradas removidas do banco")
+        except Exception as e:
+            logger.error(f"Erro na limpeza periódica de sessões: {str(e)}")
+
+def get_session_stats() -> Dict[str, Any]:
+    """
+    Retorna as métricas das sessões.
+
+    Returns:
+        Estatísticas do cache de sessões e das limpezas de admin_sessions
+    """
+    with _sweep_lock:
+        sweeps = dict(_sweep_stats)
+    with _revocations_lock:
+        revocations = _revocations
+        signed = {"enabled": SIGNED_SESSIONS, "refresh_interval": AUTH_REVOCATION_REFRESH_INTERVAL, **_revocation_stats}
+    if revocations is not None:
+        signed.update({
+            "revoked_tokens": len(revocations.token_ids),
+            "revoked_users": len(set(revocations.user_epochs) | revocations.inactive_users),
+            "last_refresh_at": revocations.loaded_at.isoformat()
+        })
+    return {
+        "mode": "signed" if SIGNED_SESSIONS else "database",
+        "cache": _session_cache.stats(),
+        "sweeper": {"interval": AUTH_SESSION_SWEEP_INTERVAL, **sweeps},
+        "signed": signed
+    }
+
+def get_cached_session_count() -> int:
+    """Quantidade de sessões mantidas no cache deste processo"""
+    return len(_session_cache)
 
 def validate_session(token: str) -> Optional[Dict[str, Any]]:
     """Valida um token de sessão"""
@@ -79,13 +367,26 @@ def validate_session(token: str) -> Optional[Dict[str, Any]]:
         return None
         
     try:
+        # Tokens assinados são verificados em memória, sem consultar o banco
+        if is_signed_token(token):
+            claims = _decode_signed_token(token)
+            if claims is None or _get_revocations().is_revoked(claims):
+                logger.warning(f"Token assinado inválido, expirado ou revogado: {token[:10]}...")
+                return None
+            return {
+                "user_id": claims["uid"],
+                "username": claims["usr"],
+                "role": claims["role"],
+                "session_token": token
+            }
+        
         # Primeiro, verifica se a sessão está no cache local
-        if token in active_sessions and active_sessions[token]["expires_at"] > datetime.now():
-            logger.info(f"Sessão válida encontrada no cache para usuário: {active_sessions[token]['username']}")
+        cached = _session_cache.get(token)
+        if cached is not None:
             return {
-                "user_id": active_sessions[token]["user_id"],
-                "username": active_sessions[token]["username"],
-                "role": active_sessions[token]["role"],
+                "user_id": cached["user_id"],
+                "username": cached["username"],
+                "role": cached["role"],
                 "session_token": token
             }
             
@@ -94,8 +395,8 @@ def validate_session(token: str) -> Optional[Dict[str, Any]]:
         
         query = """
             SELECT au.id, au.username, au.role, s.expires_at, s.token
-            FROM admin_sessions s
-            JOIN admin_users au ON s.user_id = au.id
+            FROM [dbo].[admin_sessions] s
+            JOIN [dbo].[admin_users] au ON s.user_id = au.id
             WHERE s.token = ?
               AND s.expires_at > GETDATE()
               AND au.is_active = 1
@@ -105,12 +406,12 @@ def validate_session(token: str) -> Optional[Dict[str, Any]]:
         
         if result and len(result) > 0:
             # Armazenar a sessão no cache
-            active_sessions[token] = {
+            _cache_session(token, {
                 "user_id": result[0]["id"],
                 "username": result[0]["username"],
                 "role": result[0]["role"],
                 "expires_at": result[0]["expires_at"]
-            }
+            })
             
             session_data = {
                 "user_id": result[0]["id"],
@@ -118,7 +419,7 @@ def validate_session(token: str) -> Optional[Dict[str, Any]]:
                 "role": result[0]["role"],
                 "session_token": result[0]["token"]
             }
-            logger.info(f"Sessão válida encontrada no banco para usuário: {result[0]['username']}")
+            logger.debug(f"Sessão válida encontrada no banco para usuário: {result[0]['username']}")
             return session_data
             
         logger.warning(f"Sessão inválida ou expirada - token: {token[:10]}...")
@@ -130,9 +431,25 @@ def validate_session(token: str) -> Optional[Dict[str, Any]]:
 
 def invalidate_session(token: str) -> bool:
     """Invalida uma sessão (logout)"""
+    _session_cache.delete(token)
     try:
+        if is_signed_token(token):
+            # O identificador do token entra na lista de revogação até a sua expiração
+            claims = _decode_signed_token(token)
+            if claims is None:
+                return True
+            db.execute_non_query("""
+            IF NOT EXISTS (SELECT 1 FROM [dbo].[admin_revoked_tokens] WHERE token_id = ?)
+                INSERT INTO [dbo].[admin_revoked_tokens] (token_id, user_id, expires_at, created_at)
+                VALUES (?, ?, ?, GETDATE())
+            """, (claims["jti"], claims["jti"], claims["uid"], datetime.fromtimestamp(claims["exp"])))
+            with _revocations_lock:
+                if _revocations is not None:
+                    _revocations.token_ids.add(claims["jti"])
+            return True
+        
         db.execute_non_query(
-            "DELETE FROM admin_sessions WHERE token = ?",
+            "DELETE FROM [dbo].[admin_sessions] WHERE token = ?",
             (token,)
         )
         return True
@@ -180,26 +497,9 @@ def create_admin_user(username: str, password: str, role: str = "admin") -> bool
 
 def cleanup_sessions() -> int:
     """
-    Limpa sessões expiradas.
+    Descarta do cache as sessões expiradas.
     
     Returns:
         Número de sessões removidas
     """
-    if not AUTH_ENABLED:
-        return 0
-    
-    count = 0
-    # Lista para armazenar tokens a serem removidos
-    to_remove = []
-    
-    # Identifica sessões expiradas
-    for token, session in active_sessions.items():
-        if session["expires_at"] < datetime.now():
-            to_remove.append(token)
-    
-    # Remove sessões expiradas
-    for token in to_remove:
-        del active_sessions[token]
-        count += 1
-    
-    return count
+    return _session_cache.purge_expired()
@@ -0,0 +1,159 @@
+"""
+Cache em memória com limite de tamanho (LRU) e expiração por tempo (TTL)
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+
+class TTLCache:
+    """
+    Cache LRU thread-safe com expiração por entrada.
+
+    Cada entrada expira após `ttl` segundos (ou após o TTL informado em set()),
+    e as menos usadas são descartadas quando o cache atinge `maxsize`.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0
+        }
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Obtém um valor do cache.
+
+        Args:
+            key: Chave da entrada
+            default: Valor retornado se a entrada não existir ou tiver expirado
+
+        Returns:
+            Valor armazenado ou `default`
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Armazena um valor no cache.
+
+        Args:
+            key: Chave da entrada
+            value: Valor a armazenar
+            ttl: Tempo de vida em segundos (padrão: TTL do cache)
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            self.delete(key)
+            return
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def delete(self, key: Hashable) -> bool:
+        """
+        Remove uma entrada do cache.
+
+        Returns:
+            True se a entrada existia
+        """
+        with self._lock:
+            if self._data.pop(key, None) is None:
+                return False
+            self._stats["invalidations"] += 1
+            return True
+
+    def delete_many(self, keys: Iterable[Hashable]) -> int:
+        """
+        Remove várias entradas do cache.
+
+        Returns:
+            Quantidade de entradas removidas
+        """
+        removed = 0
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    removed += 1
+            self._stats["invalidations"] += removed
+        return removed
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """
+        Remove as entradas para as quais `predicate(chave, valor)` é verdadeiro.
+
+        Returns:
+            Quantidade de entradas removidas
+        """
+        with self._lock:
+            keys = [key for key, (value, _) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+            self._stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        """Remove todas as entradas do cache"""
+        with self._lock:
+            self._stats["invalidations"] += len(self._data)
+            self._data.clear()
+
+    def purge_expired(self) -> int:
+        """
+        Remove as entradas já expiradas.
+
+        Returns:
+            Quantidade de entradas removidas
+        """
+        now = time.monotonic()
+        with self._lock:
+            keys = [key for key, (_, expires_at) in self._data.items() if expires_at <= now]
+            for key in keys:
+                del self._data[key]
+            self._stats["expirations"] += len(keys)
+        return len(keys)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retorna as estatísticas do cache.
+
+        Returns:
+            Dicionário com tamanho atual e contadores de acertos, falhas e descartes
+        """
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                **self._stats
+            }
@@ -0,0 +1,312 @@
+"""
+Campanhas: banners anexados às assinaturas durante um período, por público
+"""
+import asyncio
+import bisect
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from .. import db
+from ..config import CAMPAIGN_REFRESH_INTERVAL
+from .template_rules import normalize_value, user_criteria
+
+logger = logging.getLogger(__name__)
+
+# Critérios de público aceitos nas campanhas (nulos não restringem)
+AUDIENCE_CRITERIA = ("email_domain", "empresa", "setor")
+
+_CAMPAIGNS_SQL = """
+SELECT id, name, banner_html, starts_at, ends_at, email_domain, empresa, setor, priority
+FROM [dbo].[signature_campaigns]
+WHERE is_active = 1 AND ends_at > GETDATE()
+ORDER BY priority ASC, id ASC
+"""
+
+# Versão das campanhas cadastradas: qualquer inclusão, remoção ou alteração
+# muda a contagem ou a data da última alteração
+_CAMPAIGNS_VERSION_SQL = """
+SELECT COUNT(*) AS campaign_count, MAX(updated_at) AS updated_at
+FROM [dbo].[signature_campaigns]
+"""
+
+
+def to_local_naive(value: datetime) -> datetime:
+    """
+    Converte uma data para o horário local do servidor, sem fuso.
+
+    O índice compara as janelas com datetime.now() (horário local sem fuso),
+    e as colunas DATETIME do banco também não guardam o fuso.
+
+    Args:
+        value: Data com ou sem fuso (sem fuso é tratada como horário local)
+
+    Returns:
+        Data local sem fuso
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+class Campaign:
+    """Campanha compilada: janela [starts_at, ends_at) e filtros de público"""
+
+    __slots__ = ("id", "name", "banner_html", "starts_at", "ends_at", "conditions", "version")
+
+    def __init__(self, row: Dict[str, Any]):
+        self.id = row["id"]
+        self.name = row["name"]
+        self.banner_html = row["banner_html"]
+        self.starts_at = row["starts_at"]
+        self.ends_at = row["ends_at"]
+        self.conditions = {
+            name: normalize_value(row[name]) for name in AUDIENCE_CRITERIA if normalize_value(row[name]) is not None
+        }
+        # Identifica o conteúdo do banner (faz parte do ETag das assinaturas)
+        self.version = f"{self.id}:{hashlib.sha256(self.banner_html.encode('utf-8')).hexdigest()[:16]}"
+
+    def matches(self, criteria: Dict[str, Optional[str]]) -> bool:
+        return all(criteria.get(name) == value for name, value in self.conditions.items())
+
+
+class CampaignIndex:
+    """
+    Índice de intervalos das campanhas.
+
+    Os inícios e fins de todas as campanhas dividem o tempo em segmentos; para
+    cada segmento é pré-calculada a lista de campanhas ativas, de modo que a
+    consulta em um instante é uma busca binária.
+    """
+
+    def __init__(self, campaigns: List[Campaign], version: Optional[Tuple] = None):
+        self.campaigns = campaigns
+        self.version = version
+        self.boundaries = sorted({c.starts_at for c in campaigns} | {c.ends_at for c in campaigns})
+        self.segments = [
+            [c for c in campaigns if c.starts_at <= start < c.ends_at]
+            for start in self.boundaries
+        ]
+
+    def active_at(self, now: datetime) -> List[Campaign]:
+        """Campanhas ativas no instante informado, em ordem de prioridade"""
+        position = bisect.bisect_right(self.boundaries, now) - 1
+        return self.segments[position] if position >= 0 else []
+
+    def next_boundary(self, now: datetime) -> Optional[datetime]:
+        """Próximo instante em que alguma campanha começa ou termina"""
+        position = bisect.bisect_right(self.boundaries, now)
+        return self.boundaries[position] if position < len(self.boundaries) else None
+
+
+_index: Optional[CampaignIndex] = None
+_index_lock = threading.Lock()
+
+
+def _campaigns_version() -> Tuple:
+    """Lê a versão atual das campanhas no banco"""
+    row = db.execute_query(_CAMPAIGNS_VERSION_SQL)[0]
+    return (row["campaign_count"], row["updated_at"])
+
+
+def load_campaigns(version: Optional[Tuple] = None) -> CampaignIndex:
+    """
+    Carrega as campanhas ativas (ainda não encerradas) e recompila o índice.
+
+    Deve ser chamada na inicialização e após qualquer alteração nas campanhas.
+
+    Args:
+        version: Versão já lida com _campaigns_version (lida aqui se omitida)
+
+    Returns:
+        Índice compilado
+    """
+    global _index
+    # A versão é lida antes das campanhas: uma alteração entre as duas leituras
+    # apenas provoca mais uma recarga na próxima verificação
+    if version is None:
+        version = _campaigns_version()
+    rows = db.execute_query(_CAMPAIGNS_SQL)
+    index = CampaignIndex([Campaign(row) for row in rows], version)
+    with _index_lock:
+        _index = index
+    logger.info(f"{len(index.campaigns)} campanhas carregadas")
+    return index
+
+
+def get_campaign_index() -> CampaignIndex:
+    """
+    Retorna o índice atual, carregando-o na primeira chamada.
+
+    Se o carregamento falhar, as assinaturas seguem sem banners (um índice
+    vazio é usado e o carregamento é tentado novamente na próxima chamada).
+    """
+    index = _index
+    if index is None:
+        with _index_lock:
+            index = _index
+        if index is None:
+            try:
+                index = load_campaigns()
+            except Exception as e:
+                logger.error(f"Erro ao carregar campanhas: {str(e)}")
+                return CampaignIndex([])
+    return index
+
+
+def reload_if_changed() -> bool:
+    """
+    Recompila o índice se as campanhas mudaram (inclusive por outro processo)
+    desde o último carregamento.
+
+    Returns:
+        True se o índice foi recarregado
+    """
+    version = _campaigns_version()
+    index = _index
+    if index is not None and index.version == version:
+        return False
+    load_campaigns(version)
+    return True
+
+
+async def run_campaign_refresher(
+    interval: float = CAMPAIGN_REFRESH_INTERVAL,
+    on_change: Optional[Callable[[], None]] = None
+) -> None:
+    """
+    Laço de verificação periódica das campanhas (iniciado no lifespan).
+
+    Uma alteração feita em outro processo passa a valer aqui em até `interval`
+    segundos; em caso de erro, o último índice carregado continua em uso.
+
+    Args:
+        interval: Segundos entre duas verificações
+        on_change: Chamada após cada recarga (ex.: descartar as assinaturas em
+                   cache, que já incluem os banners)
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await db.run_in_db_executor(reload_if_changed) and on_change is not None:
+                on_change()
+        except Exception as e:
+            logger.error(f"Erro ao recarregar as campanhas: {str(e)}")
+
+
+def active_campaigns(email: str, user_data: Optional[Dict[str, Any]], now: datetime) -> List[Campaign]:
+    """
+    Obtém, sem consultar o banco, as campanhas que se aplicam a um usuário.
+
+    Args:
+        email: E-mail do usuário
+        user_data: Dados do usuário (ao menos setor e empresa) ou None
+        now: Instante de referência
+
+    Returns:
+        Campanhas ativas para o público do usuário, em ordem de prioridade
+    """
+    candidates = get_campaign_index().active_at(now)
+    if not candidates:
+        return []
+    criteria = user_criteria(email, user_data)
+    return [campaign for campaign in candidates if campaign.matches(criteria)]
+
+
+def seconds_until_next_boundary(now: datetime) -> Optional[float]:
+    """
+    Segundos até a próxima mudança no conjunto de campanhas ativas.
+
+    Args:
+        now: Instante de referência
+
+    Returns:
+        Segundos até o próximo início ou fim de campanha, ou None se não houver
+    """
+    boundary = get_campaign_index().next_boundary(now)
+    if boundary is None:
+        return None
+    return max(0.0, (boundary - now).total_seconds())
+
+
+def get_campaigns() -> List[Dict[str, Any]]:
+    """
+    Obtém todas as campanhas cadastradas, das mais recentes para as mais antigas.
+
+    Returns:
+        Lista de campanhas
+    """
+    return db.execute_query("""
+    SELECT * FROM [dbo].[signature_campaigns]
+    ORDER BY starts_at DESC, id DESC
+    """)
+
+
+def save_campaign(campaign: Dict[str, Any], campaign_id: Optional[int] = None) -> Optional[int]:
+    """
+    Cria ou atualiza uma campanha e recompila o índice.
+
+    Args:
+        campaign: Campos da campanha (name, banner_html, starts_at, ends_at,
+                  email_domain, empresa, setor, priority, is_active)
+        campaign_id: ID da campanha a atualizar (None para criar)
+
+    Returns:
+        ID da campanha, ou None se a campanha a atualizar não existir
+    """
+    params = (
+        campaign["name"],
+        campaign["banner_html"],
+        campaign["starts_at"],
+        campaign["ends_at"],
+        campaign.get("email_domain"),
+        campaign.get("empresa"),
+        campaign.get("setor"),
+        campaign.get("priority", 100),
+        1 if campaign.get("is_active", True) else 0
+    )
+
+    if campaign_id is None:
+        with db.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+            INSERT INTO [dbo].[signature_campaigns]
+                (name, banner_html, starts_at, ends_at, email_domain, empresa, setor, priority, is_active, created_at, updated_at)
+            OUTPUT inserted.id
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, GETDATE(), GETDATE())
+            """, params)
+            campaign_id = cursor.fetchone()[0]
+            conn.commit()
+    else:
+        updated = db.execute_non_query("""
+        UPDATE [dbo].[signature_campaigns]
+        SET name = ?, banner_html = ?, starts_at = ?, ends_at = ?, email_domain = ?, empresa = ?, setor = ?,
+            priority = ?, is_active = ?, updated_at = GETDATE()
+        WHERE id = ?
+        """, (*params, campaign_id))
+        if not updated:
+            return None
+
+    load_campaigns()
+    return campaign_id
+
+
+def delete_campaign(campaign_id: int) -> bool:
+    """
+    Remove uma campanha e recompila o índice.
+
+    Args:
+        campaign_id: ID da campanha
+
+    Returns:
+        True se a campanha existia
+    """
+    deleted = db.execute_non_query("""
+    DELETE FROM [dbo].[signature_campaigns]
+    WHERE id = ?
+    """, (campaign_id,))
+    if deleted:
+        load_campaigns()
+    return bool(deleted)
@@ -0,0 +1,284 @@
+"""
+Cliente HTTP para a Microsoft Graph API com controle de concorrência e de throttling
+"""
+import logging
+import random
+import threading
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, List, Optional, Callable, Iterable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# Status que indicam falha transitória do Graph
+THROTTLED_STATUS = {429, 503}
+TRANSIENT_STATUS = {500, 502, 503, 504, 429}
+
+# Métodos que podem ser repetidos com segurança após timeout ou erro 5xx
+IDEMPOTENT_METHODS = {"GET", "DELETE"}
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class GraphRequestError(Exception):
+    """Falha definitiva em uma requisição ao Microsoft Graph"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Converte o cabeçalho Retry-After em segundos de espera.
+
+    Args:
+        value: Valor do cabeçalho (segundos ou data HTTP)
+
+    Returns:
+        Segundos a aguardar ou None se o valor for ausente/inválido
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class GraphClient:
+    """
+    Cliente do Microsoft Graph com concorrência limitada e repetição automática.
+
+    - No máximo `max_concurrency` requisições ficam em andamento ao mesmo tempo
+      (o limite vale para todas as threads que compartilham o cliente).
+    - Respostas 429/503 respeitam o Retry-After; demais falhas transitórias usam
+      backoff exponencial com jitter.
+    - Toda requisição tem timeout de conexão e de leitura.
+    """
+
+    def __init__(
+        self,
+        token_provider: Callable[[], Optional[str]],
+        base_url: str = "https://graph.microsoft.com/v1.0",
+        pool_size: int = 10,
+        timeout: tuple = (5.0, 60.0),
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0
+    ):
+        self.token_provider = token_provider
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # Sessão HTTP compartilhada: mantém conexões TLS keep-alive com o Graph
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(pool_size, self.max_concurrency))
+        self.session.mount("https://", adapter)
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "throttled": 0,
+            "server_errors": 0,
+            "timeouts": 0,
+            "connection_errors": 0,
+            "failures": 0,
+            "retry_wait_seconds": 0.0
+        }
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _backoff(self, attempt: int) -> float:
+        """Backoff exponencial com jitter completo"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _wait(self, seconds: float) -> None:
+        self._count("retries")
+        self._count("retry_wait_seconds", seconds)
+        time.sleep(seconds)
+
+    def request(self, method: str, endpoint: str, data: Any = None, retry_unsafe: bool = False) -> Dict[str, Any]:
+        """
+        Faz uma requisição ao Graph, repetindo-a em caso de throttling ou falha transitória.
+
+        Args:
+            method: Método HTTP (GET, POST, PATCH, DELETE)
+            endpoint: Endpoint da API ou URL absoluta (ex.: @odata.nextLink)
+            data: Corpo JSON (opcional)
+            retry_unsafe: Permite repetir POST/PATCH após timeout ou erro 5xx
+                          (ex.: $batch contendo apenas GETs)
+
+        Returns:
+            Corpo da resposta (vazio se não houver conteúdo)
+
+        Raises:
+            GraphRequestError: Se a requisição falhar definitivamente
+        """
+        method = method.upper()
+        url = endpoint if endpoint.startswith("https://") else f"{self.base_url}/{endpoint}"
+        can_retry_transient = retry_unsafe or method in IDEMPOTENT_METHODS
+
+        attempt = 0
+        while True:
+            token = self.token_provider()
+            if not token:
+                self._count("failures")
+                raise GraphRequestError("Não foi possível obter token de acesso para o Microsoft Graph")
+
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json"
+            }
+
+            try:
+                with self._slots:
+                    self._count("requests")
+                    response = self.session.request(
+                        method,
+                        url,
+                        headers=headers,
+                        json=data if method in ("POST", "PATCH") else None,
+                        timeout=self.timeout
+                    )
+            except requests.exceptions.Timeout as e:
+                self._count("timeouts")
+                if can_retry_transient and attempt < self.max_retries:
+                    self._wait(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                self._count("failures")
+                raise GraphRequestError(f"Timeout na requisição para {url}: {str(e)}")
+            except requests.exceptions.ConnectionError as e:
+                self._count("connection_errors")
+                if can_retry_transient and attempt < self.max_retries:
+                    self._wait(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                self._count("failures")
+                raise GraphRequestError(f"Erro de conexão com {url}: {str(e)}")
+            except requests.exceptions.RequestException as e:
+                self._count("failures")
+                raise GraphRequestError(f"Erro na requisição para {url}: {str(e)}")
+
+            status = response.status_code
+            if status in TRANSIENT_STATUS:
+                if status in THROTTLED_STATUS:
+                    self._count("throttled")
+                else:
+                    self._count("server_errors")
+
+                retryable = status in THROTTLED_STATUS or can_retry_transient
+                if retryable and attempt < self.max_retries:
+                    delay = parse_retry_after(response.headers.get("Retry-After"))
+                    if delay is None:
+                        delay = self._backoff(attempt)
+                    logger.warning(f"Graph respondeu {status} para {url}; nova tentativa em {delay:.1f}s")
+                    self._wait(delay)
+                    attempt += 1
+                    continue
+
+            if status >= 400:
+                self._count("failures")
+                raise GraphRequestError(
+                    f"Erro {status} na requisição para {url}: {response.text[:500]}",
+                    status_code=status
+                )
+
+            # Retornar os dados da resposta se houver
+            if response.content:
+                return response.json()
+            return {}
+
+    def batch(self, sub_requests: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Executa uma chamada JSON $batch, repetindo as sub-requisições com throttling.
+
+        Args:
+            sub_requests: Sub-requisições no formato do $batch (cada uma com "id")
+
+        Returns:
+            Dicionário id -> sub-resposta
+
+        Raises:
+            GraphRequestError: Se a chamada $batch falhar definitivamente
+        """
+        pending = list(sub_requests)
+        responses: Dict[str, Dict[str, Any]] = {}
+
+        attempt = 0
+        while pending:
+            result = self.request("POST", "$batch", {"requests": pending}, retry_unsafe=True)
+
+            throttled = []
+            delay = 0.0
+            by_id = {item["id"]: item for item in pending}
+            for item in result.get("responses", []):
+                item_id = item.get("id")
+                status = item.get("status")
+                if status in THROTTLED_STATUS and item_id in by_id and attempt < self.max_retries:
+                    self._count("throttled")
+                    throttled.append(by_id[item_id])
+                    retry_after = parse_retry_after((item.get("headers") or {}).get("Retry-After"))
+                    delay = max(delay, retry_after if retry_after is not None else self._backoff(attempt))
+                else:
+                    responses[item_id] = item
+
+            if not throttled:
+                break
+
+            logger.warning(f"{len(throttled)} sub-requisições do $batch sofreram throttling; nova tentativa em {delay:.1f}s")
+            self._wait(delay)
+            pending = throttled
+            attempt += 1
+
+        return responses
+
+    def map_concurrent(self, func: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """
+        Aplica `func` aos itens em paralelo, respeitando o limite de concorrência.
+
+        Args:
+            func: Função a aplicar (normalmente faz chamadas ao Graph)
+            items: Itens de entrada
+
+        Returns:
+            Resultados na mesma ordem dos itens
+        """
+        items = list(items)
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items)), thread_name_prefix="graph") as executor:
+            return list(executor.map(func, items))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retorna os contadores do cliente.
+
+        Returns:
+            Dicionário com requisições, repetições, throttling e falhas
+        """
+        with self._stats_lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                **self._stats
+            }
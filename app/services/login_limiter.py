@@ -0,0 +1,290 @@
+"""
+Limitador de tentativas de login da área administrativa (token bucket por
+usuário e por IP, com bloqueio exponencial após falhas seguidas)
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from ..config import (
+    LOGIN_USER_RATE,
+    LOGIN_USER_BURST,
+    LOGIN_IP_RATE,
+    LOGIN_IP_BURST,
+    LOGIN_LOCKOUT_THRESHOLD,
+    LOGIN_IP_LOCKOUT_THRESHOLD,
+    LOGIN_LOCKOUT_BASE,
+    LOGIN_LOCKOUT_MAX,
+    LOGIN_USER_LOCKOUT_MAX,
+    LOGIN_FAILURE_WINDOW,
+    LOGIN_LIMITER_MAX_KEYS
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _Bucket:
+    """Estado de uma chave: fichas disponíveis, falhas seguidas (e a última) e fim do bloqueio"""
+
+    __slots__ = ("tokens", "updated_at", "failures", "last_failure_at", "locked_until")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated_at = now
+        self.failures = 0
+        self.last_failure_at = 0.0
+        self.locked_until = 0.0
+
+
+class LoginLimiter:
+    """
+    Limitador de tentativas de login, mantido em memória (por processo).
+
+    Cada tentativa consome uma ficha do usuário e uma do IP; as fichas são
+    repostas continuamente até a capacidade (burst). A partir do limite de
+    falhas seguidas (do usuário ou do IP) a chave fica bloqueada por
+    `lockout_base` segundos, dobrando a cada nova falha até `lockout_max`
+    (ou `user_lockout_max`, para o usuário). A contagem de falhas recomeça
+    após `failure_window` segundos sem falhas.
+
+    Usuários e IPs ficam em mapas separados, cada um limitado a `max_keys`
+    chaves. Acima do limite é descartada a chave menos usada que não guarda
+    informação: primeiro as ociosas (fichas cheias, sem falhas), depois as
+    demais sem falhas. Chaves bloqueadas ou com falhas recentes nunca são
+    descartadas, para que trocar de nome de usuário a cada tentativa não
+    apague bloqueios; enquanto só houver chaves assim o mapa excede
+    `max_keys` (o excesso é limitado pelas fichas do IP, e as chaves voltam a
+    ser descartáveis quando o bloqueio e `failure_window` expiram).
+
+    O bloqueio por usuário pode ser provocado por qualquer pessoa que conheça
+    o nome de usuário (inclusive a partir de vários IPs). Por isso o seu teto
+    é menor: ele apenas atrasa a adivinhação da senha (junto com as fichas
+    do usuário), enquanto o bloqueio longo fica com o IP de origem.
+    """
+
+    def __init__(
+        self,
+        user_rate: float,
+        user_burst: int,
+        ip_rate: float,
+        ip_burst: int,
+        user_lockout_threshold: int,
+        ip_lockout_threshold: int,
+        lockout_base: float,
+        lockout_max: float,
+        user_lockout_max: float,
+        failure_window: float,
+        max_keys: int
+    ):
+        # Por tipo de chave: (fichas repostas por segundo, capacidade, falhas até o bloqueio, bloqueio máximo)
+        self._limits = {
+            "user": (user_rate, float(max(1, user_burst)), max(1, user_lockout_threshold), min(lockout_max, user_lockout_max)),
+            "ip": (ip_rate, float(max(1, ip_burst)), max(1, ip_lockout_threshold), lockout_max)
+        }
+        self.lockout_base = lockout_base
+        self.lockout_max = lockout_max
+        self.failure_window = failure_window
+        self.max_keys = max(1, max_keys)
+        self._buckets: Dict[str, "OrderedDict[Hashable, _Bucket]"] = {kind: OrderedDict() for kind in self._limits}
+        self._lock = threading.Lock()
+        self._stats = {
+            "allowed": 0,
+            "throttled": 0,
+            "locked_out": 0,
+            "failures": 0,
+            "lockouts": 0,
+            "successes": 0,
+            "evictions": 0,
+            "overflows": 0
+        }
+
+    @staticmethod
+    def _keys(username: str, ip: str):
+        return (("user", username.strip().casefold()), ("ip", ip))
+
+    def _has_failures(self, bucket: _Bucket, now: float) -> bool:
+        """Indica se a chave tem falhas ainda dentro de `failure_window`"""
+        return bucket.failures > 0 and now - bucket.last_failure_at <= self.failure_window
+
+    def _evict_locked(self, kind: str, now: float) -> None:
+        """
+        Descarta a chave menos usada que pode ser esquecida (ver a docstring da
+        classe); não descarta nada se todas estiverem bloqueadas ou com falhas.
+        """
+        rate, capacity, _, _ = self._limits[kind]
+        buckets = self._buckets[kind]
+        candidate = None
+        for key, bucket in buckets.items():
+            if bucket.locked_until > now or self._has_failures(bucket, now):
+                continue
+            if bucket.tokens + (now - bucket.updated_at) * rate >= capacity:
+                # Ociosa: equivale a uma chave nova
+                candidate = key
+                break
+            if candidate is None:
+                candidate = key
+
+        if candidate is None:
+            self._stats["overflows"] += 1
+            return
+        del buckets[candidate]
+        self._stats["evictions"] += 1
+
+    def _bucket_locked(self, key: Hashable, now: float) -> _Bucket:
+        """Obtém (ou cria) o estado da chave, repondo as fichas desde o último acesso"""
+        kind = key[0]
+        rate, capacity, _, _ = self._limits[kind]
+        buckets = self._buckets[kind]
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= self.max_keys:
+                self._evict_locked(kind, now)
+            bucket = _Bucket(capacity, now)
+            buckets[key] = bucket
+        else:
+            bucket.tokens = min(capacity, bucket.tokens + (now - bucket.updated_at) * rate)
+            bucket.updated_at = now
+            buckets.move_to_end(key)
+        return bucket
+
+    def acquire(self, username: str, ip: str) -> Optional[float]:
+        """
+        Registra uma tentativa de login, se permitida.
+
+        Args:
+            username: Nome de usuário informado
+            ip: IP de origem
+
+        Returns:
+            None se a tentativa pode prosseguir, ou os segundos a aguardar
+        """
+        now = time.monotonic()
+        user_key, ip_key = self._keys(username, ip)
+        with self._lock:
+            # Um IP bloqueado não chega a criar estado para o usuário informado
+            ip_bucket = self._bucket_locked(ip_key, now)
+            if ip_bucket.locked_until > now:
+                self._stats["locked_out"] += 1
+                return ip_bucket.locked_until - now
+
+            buckets = [self._bucket_locked(user_key, now), ip_bucket]
+            locked_until = max(bucket.locked_until for bucket in buckets)
+            if locked_until > now:
+                self._stats["locked_out"] += 1
+                return locked_until - now
+
+            wait = 0.0
+            for key, bucket in zip((user_key, ip_key), buckets):
+                if bucket.tokens < 1:
+                    rate = self._limits[key[0]][0]
+                    wait = max(wait, (1 - bucket.tokens) / rate if rate > 0 else self.lockout_max)
+            if wait > 0:
+                self._stats["throttled"] += 1
+                return wait
+
+            for bucket in buckets:
+                bucket.tokens -= 1
+            self._stats["allowed"] += 1
+            return None
+
+    def record_failure(self, username: str, ip: str) -> None:
+        """
+        Registra credenciais inválidas, bloqueando as chaves que atingirem o limite de falhas.
+
+        Falhas mais antigas que `failure_window` (sem outra falha desde então)
+        não contam: a sequência recomeça do zero.
+
+        Args:
+            username: Nome de usuário informado
+            ip: IP de origem
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._stats["failures"] += 1
+            for key in self._keys(username, ip):
+                bucket = self._bucket_locked(key, now)
+                if now - bucket.last_failure_at > self.failure_window:
+                    bucket.failures = 0
+                bucket.failures += 1
+                bucket.last_failure_at = now
+                _, _, threshold, lockout_max = self._limits[key[0]]
+                excess = bucket.failures - threshold
+                if excess >= 0:
+                    duration = min(lockout_max, self.lockout_base * (2 ** min(excess, 32)))
+                    bucket.locked_until = now + duration
+                    self._stats["lockouts"] += 1
+                    logger.warning(f"Login bloqueado por {duration:.0f}s após {bucket.failures} falhas ({key[0]}: {key[1]})")
+
+    def record_success(self, username: str, ip: str) -> None:
+        """
+        Registra um login bem sucedido, zerando as falhas do usuário.
+
+        As falhas do IP não são zeradas: com uma conta válida qualquer, um
+        atacante poderia limpar o bloqueio do seu IP e seguir tentando outros
+        usuários. Elas expiram após `failure_window`.
+
+        Args:
+            username: Nome de usuário informado
+            ip: IP de origem
+        """
+        user_key, _ = self._keys(username, ip)
+        with self._lock:
+            self._stats["successes"] += 1
+            bucket = self._buckets["user"].get(user_key)
+            if bucket is not None:
+                bucket.failures = 0
+                bucket.locked_until = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retorna as estatísticas do limitador.
+
+        Returns:
+            Dicionário com chaves monitoradas, bloqueios ativos e contadores
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "tracked_keys": {kind: len(buckets) for kind, buckets in self._buckets.items()},
+                "active_lockouts": sum(
+                    1 for buckets in self._buckets.values() for bucket in buckets.values() if bucket.locked_until > now
+                ),
+                **self._stats
+            }
+
+
+_limiter = LoginLimiter(
+    user_rate=LOGIN_USER_RATE,
+    user_burst=LOGIN_USER_BURST,
+    ip_rate=LOGIN_IP_RATE,
+    ip_burst=LOGIN_IP_BURST,
+    user_lockout_threshold=LOGIN_LOCKOUT_THRESHOLD,
+    ip_lockout_threshold=LOGIN_IP_LOCKOUT_THRESHOLD,
+    lockout_base=LOGIN_LOCKOUT_BASE,
+    lockout_max=LOGIN_LOCKOUT_MAX,
+    user_lockout_max=LOGIN_USER_LOCKOUT_MAX,
+    failure_window=LOGIN_FAILURE_WINDOW,
+    max_keys=LOGIN_LIMITER_MAX_KEYS
+)
+
+
+def acquire(username: str, ip: str) -> Optional[float]:
+    """Registra uma tentativa de login; retorna os segundos a aguardar se ela deve ser recusada"""
+    return _limiter.acquire(username, ip)
+
+
+def record_failure(username: str, ip: str) -> None:
+    """Registra uma tentativa com credenciais inválidas"""
+    _limiter.record_failure(username, ip)
+
+
+def record_success(username: str, ip: str) -> None:
+    """Registra um login bem sucedido"""
+    _limiter.record_success(username, ip)
+
+
+def get_stats() -> Dict[str, Any]:
+    """Retorna as estatísticas do limitador de login"""
+    return _limiter.stats()
@@ -1,15 +1,236 @@
 """
 Serviço para comunicação com a Microsoft Graph API
 """
+import json
 import logging
-import requests
+import threading
+import time
+from urllib.parse import quote
 import msal
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterator
 
-from ..config import TENANT_ID, CLIENT_ID, CLIENT_SECRET
+from . import signature_service
+from .graph_client import GraphClient, GraphRequestError
+from ..config import (
+    TENANT_ID,
+    CLIENT_ID,
+    CLIENT_SECRET,
+    GRAPH_HTTP_POOL_SIZE,
+    GRAPH_HTTP_CONNECT_TIMEOUT,
+    GRAPH_HTTP_READ_TIMEOUT,
+    GRAPH_TOKEN_REFRESH_MARGIN,
+    GRAPH_MAX_CONCURRENCY,
+    GRAPH_MAX_RETRIES,
+    GRAPH_BACKOFF_BASE,
+    GRAPH_BACKOFF_MAX
+)
 
 logger = logging.getLogger(__name__)
 
+# Campos do usuário lidos do Microsoft Graph
+USER_SELECT_FIELDS = "id,displayName,mail,jobTitle,department,companyName,businessPhones"
+
+# Tamanho máximo de página aceito pelo endpoint /users
+MAX_PAGE_SIZE = 999
+
+# Limite de sub-requisições por chamada JSON $batch
+MAX_BATCH_SIZE = 20
+
+# Nome do registro em graph_sync_state que guarda o deltaLink de users/delta
+USERS_DELTA_STATE = "users_delta"
+
+# Tabela temporária usada para preparar o lote de usuários da sincronização em massa.
+# Tabelas temporárias herdam a collation do tempdb; as colunas de texto usam a
+# do banco atual para que as junções com [users] não gerem conflito de collation.
+_STAGING_TABLE_SQL = """
+DROP TABLE IF EXISTS #users_sync;
+CREATE TABLE #users_sync (
+    seq INT IDENTITY(1,1) NOT NULL,
+    email NVARCHAR(255) COLLATE DATABASE_DEFAULT NOT NULL,
+    nome_completo NVARCHAR(255) COLLATE DATABASE_DEFAULT NOT NULL,
+    cargo NVARCHAR(100) COLLATE DATABASE_DEFAULT NULL,
+    setor NVARCHAR(100) COLLATE DATABASE_DEFAULT NULL,
+    empresa NVARCHAR(100) COLLATE DATABASE_DEFAULT NULL,
+    telefone NVARCHAR(50) COLLATE DATABASE_DEFAULT NULL,
+    ramal NVARCHAR(20) COLLATE DATABASE_DEFAULT NULL,
+    ms_id NVARCHAR(100) COLLATE DATABASE_DEFAULT NULL
+);
+"""
+
+_STAGING_INSERT_SQL = """
+INSERT INTO #users_sync (email, nome_completo, cargo, setor, empresa, telefone, ramal, ms_id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Contas removidas ou desabilitadas recebidas de users/delta
+_REMOVED_TABLE_SQL = """
+DROP TABLE IF EXISTS #users_removed;
+CREATE TABLE #users_removed (ms_id NVARCHAR(100) COLLATE DATABASE_DEFAULT NOT NULL);
+"""
+
+_DELETE_REMOVED_SQL = """
+DELETE u
+OUTPUT deleted.[email]
+FROM [dbo].[users] u
+WHERE u.[ms_id] IN (SELECT ms_id FROM #users_removed);
+"""
+
+_SAVE_DELTA_LINK_SQL = """
+MERGE [dbo].[graph_sync_state] WITH (HOLDLOCK) AS target
+USING (SELECT ? AS name, ? AS delta_link) AS source
+ON target.[name] = source.name
+WHEN MATCHED THEN
+    UPDATE SET [delta_link] = source.delta_link, [updated_at] = GETDATE()
+WHEN NOT MATCHED THEN
+    INSERT ([name], [delta_link], [updated_at]) VALUES (source.name, source.delta_link, GETDATE());
+"""
+
+# Upsert em conjunto: atualiza apenas as linhas que realmente mudaram e
+# devolve as contagens de inseridos, atualizados e total do lote, seguidas
+# dos e-mails alterados. Se o mesmo
+# e-mail aparecer mais de uma vez, vale a última ocorrência recebida.
+_MERGE_USERS_SQL = """
+SET NOCOUNT ON;
+DECLARE @changes TABLE ([action] NVARCHAR(10), email NVARCHAR(255));
+
+MERGE [dbo].[users] WITH (HOLDLOCK) AS target
+USING (
+    SELECT email, nome_completo, cargo, setor, empresa, telefone, ramal, ms_id
+    FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY email ORDER BY seq DESC) AS rn
+        FROM #users_sync
+    ) AS staged
+    WHERE rn = 1
+) AS source
+ON target.[email] = source.email
+WHEN MATCHED AND EXISTS (
+    SELECT source.nome_completo, source.cargo, source.setor, source.empresa, source.telefone, source.ms_id
+    EXCEPT
+    SELECT target.[nome_completo], target.[cargo], target.[setor], target.[empresa], target.[telefone], target.[ms_id]
+) THEN
+    UPDATE SET
+        [nome_completo] = source.nome_completo,
+        [cargo] = source.cargo,
+        [setor] = source.setor,
+        [empresa] = source.empresa,
+        [telefone] = source.telefone,
+        [ms_id] = source.ms_id,
+        [updated_at] = GETDATE()
+WHEN NOT MATCHED BY TARGET THEN
+    INSERT ([email], [nome_completo], [cargo], [setor], [empresa], [telefone], [ramal], [ms_id], [created_at], [updated_at])
+    VALUES (source.email, source.nome_completo, source.cargo, source.setor, source.empresa, source.telefone, source.ramal, source.ms_id, GETDATE(), GETDATE())
+OUTPUT $action, inserted.[email] INTO @changes;
+
+SELECT
+    ISNULL(SUM(CASE WHEN [action] = 'INSERT' THEN 1 ELSE 0 END), 0) AS inserted,
+    ISNULL(SUM(CASE WHEN [action] = 'UPDATE' THEN 1 ELSE 0 END), 0) AS updated,
+    (SELECT COUNT(DISTINCT email) FROM #users_sync) AS total
+FROM @changes;
+
+SELECT email FROM @changes;
+"""
+
+# Propriedades do Graph aplicadas pela sincronização incremental e suas colunas em users
+DELTA_PROPERTY_COLUMNS = {
+    "displayName": "nome_completo",
+    "jobTitle": "cargo",
+    "department": "setor",
+    "companyName": "empresa",
+    "businessPhones": "telefone"
+}
+
+# Alterações recebidas de users/delta, uma linha por ms_id. Em atualizações o
+# Graph envia apenas as propriedades alteradas: as colunas has_* indicam quais
+# vieram no payload, e só essas são gravadas (um valor nulo recebido limpa a coluna).
+_DELTA_TABLE_SQL = """
+DROP TABLE IF EXISTS #users_delta;
+CREATE TABLE #users_delta (
+    ms_id NVARCHAR(100) COLLATE DATABASE_DEFAULT NOT NULL PRIMARY KEY,
+    email NVARCHAR(255) COLLATE DATABASE_DEFAULT NULL,
+    nome_completo NVARCHAR(255) COLLATE DATABASE_DEFAULT NULL,
+    cargo NVARCHAR(100) COLLATE DATABASE_DEFAULT NULL,
+    setor NVARCHAR(100) COLLATE DATABASE_DEFAULT NULL,
+    empresa NVARCHAR(100) COLLATE DATABASE_DEFAULT NULL,
+    telefone NVARCHAR(50) COLLATE DATABASE_DEFAULT NULL,
+    has_nome_completo BIT NOT NULL,
+    has_cargo BIT NOT NULL,
+    has_setor BIT NOT NULL,
+    has_empresa BIT NOT NULL,
+    has_telefone BIT NOT NULL
+);
+"""
+
+_DELTA_INSERT_SQL = """
+INSERT INTO #users_delta (
+    ms_id, email, nome_completo, cargo, setor, empresa, telefone,
+    has_nome_completo, has_cargo, has_setor, has_empresa, has_telefone
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Aplica #users_delta em três passos, na mesma transação:
+#   1. vincula pelo e-mail os usuários ainda sem o ms_id recebido;
+#   2. atualiza pelo ms_id apenas as propriedades presentes no payload
+#      (o e-mail só muda quando um novo e-mail é recebido);
+#   3. insere os usuários novos que têm e-mail.
+# Devolve as contagens (inseridos, atualizados, total) e os e-mails afetados,
+# incluindo o e-mail anterior de quem mudou de endereço.
+_MERGE_DELTA_USERS_SQL = """
+SET NOCOUNT ON;
+DECLARE @changes TABLE ([action] NVARCHAR(10), email NVARCHAR(255), old_email NVARCHAR(255) NULL);
+
+UPDATE u
+SET u.[ms_id] = s.ms_id
+FROM [dbo].[users] u
+JOIN #users_delta s ON s.email = u.[email]
+WHERE ISNULL(u.[ms_id], '') <> s.ms_id
+  AND NOT EXISTS (SELECT 1 FROM [dbo].[users] x WHERE x.[ms_id] = s.ms_id);
+
+UPDATE u
+SET
+    u.[email] = n.email,
+    u.[nome_completo] = n.nome_completo,
+    u.[cargo] = n.cargo,
+    u.[setor] = n.setor,
+    u.[empresa] = n.empresa,
+    u.[telefone] = n.telefone,
+    u.[updated_at] = GETDATE()
+OUTPUT 'UPDATE', inserted.[email], deleted.[email] INTO @changes
+FROM [dbo].[users] u
+JOIN #users_delta s ON s.ms_id = u.[ms_id]
+CROSS APPLY (
+    SELECT
+        ISNULL(s.email, u.[email]) AS email,
+        CASE WHEN s.has_nome_completo = 1 THEN ISNULL(s.nome_completo, '') ELSE u.[nome_completo] END AS nome_completo,
+        CASE WHEN s.has_cargo = 1 THEN s.cargo ELSE u.[cargo] END AS cargo,
+        CASE WHEN s.has_setor = 1 THEN s.setor ELSE u.[setor] END AS setor,
+        CASE WHEN s.has_empresa = 1 THEN s.empresa ELSE u.[empresa] END AS empresa,
+        CASE WHEN s.has_telefone = 1 THEN s.telefone ELSE u.[telefone] END AS telefone
+) n
+WHERE EXISTS (
+    SELECT n.email, n.nome_completo, n.cargo, n.setor, n.empresa, n.telefone
+    EXCEPT
+    SELECT u.[email], u.[nome_completo], u.[cargo], u.[setor], u.[empresa], u.[telefone]
+);
+
+INSERT INTO [dbo].[users] ([email], [nome_completo], [cargo], [setor], [empresa], [telefone], [ramal], [ms_id], [created_at], [updated_at])
+OUTPUT 'INSERT', inserted.[email], NULL INTO @changes
+SELECT s.email, ISNULL(s.nome_completo, ''), s.cargo, s.setor, s.empresa, s.telefone, '', s.ms_id, GETDATE(), GETDATE()
+FROM #users_delta s
+WHERE s.email IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM [dbo].[users] u WHERE u.[ms_id] = s.ms_id OR u.[email] = s.email);
+
+SELECT
+    ISNULL(SUM(CASE WHEN [action] = 'INSERT' THEN 1 ELSE 0 END), 0) AS inserted,
+    ISNULL(SUM(CASE WHEN [action] = 'UPDATE' THEN 1 ELSE 0 END), 0) AS updated,
+    (SELECT COUNT(*) FROM #users_delta) AS total
+FROM @changes;
+
+SELECT email FROM @changes
+UNION
+SELECT old_email FROM @changes WHERE old_email IS NOT NULL;
+"""
+
 class MSGraphService:
     """
     Classe para comunicação com a Microsoft Graph API
@@ -22,89 +243,153 @@ class MSGraphService:
         self.authority = f"https://login.microsoftonline.com/{self.tenant_id}"
         self.scope = ["https://graph.microsoft.com/.default"]
         self.endpoint = "https://graph.microsoft.com/v1.0"
+        self.token_refresh_margin = GRAPH_TOKEN_REFRESH_MARGIN
+
+        # Aplicação MSAL criada sob demanda (a criação consulta o authority)
+        # e reaproveitada para usar seu cache de tokens em memória
+        self._msal_app = None
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+
+        # Cliente HTTP com sessão keep-alive, concorrência limitada e repetição automática
+        self.client = GraphClient(
+            token_provider=self._get_token,
+            base_url=self.endpoint,
+            pool_size=GRAPH_HTTP_POOL_SIZE,
+            timeout=(GRAPH_HTTP_CONNECT_TIMEOUT, GRAPH_HTTP_READ_TIMEOUT),
+            max_concurrency=GRAPH_MAX_CONCURRENCY,
+            max_retries=GRAPH_MAX_RETRIES,
+            backoff_base=GRAPH_BACKOFF_BASE,
+            backoff_max=GRAPH_BACKOFF_MAX
+        )
+
+    def _get_msal_app(self) -> msal.ConfidentialClientApplication:
+        """
+        Retorna a aplicação confidencial MSAL desta instância, criando-a na primeira chamada.
+        """
+        if self._msal_app is None:
+            self._msal_app = msal.ConfidentialClientApplication(
+                client_id=self.client_id,
+                client_credential=self.client_secret,
+                authority=self.authority
+            )
+        return self._msal_app
 
     def _get_token(self) -> Optional[str]:
         """
         Obtém um token de acesso para a API do Microsoft Graph.
         
+        O token fica em memória e é renovado antes de expirar
+        (GRAPH_TOKEN_REFRESH_MARGIN segundos de antecedência).
+        
         Returns:
             Token de acesso ou None se ocorrer algum erro
         """
-        try:
-            # Criar uma aplicação confidencial
-            app = msal.ConfidentialClientApplication(
-                client_id=self.client_id,
-                client_credential=self.client_secret,
-                authority=self.authority
-            )
-            
-            # Adquirir token para a aplicação (não para um usuário)
-            result = app.acquire_token_for_client(scopes=self.scope)
+        with self._token_lock:
+            if self._token and time.monotonic() < self._token_expires_at - self.token_refresh_margin:
+                return self._token
             
-            if "access_token" in result:
-                return result["access_token"]
-            else:
-                logger.error(f"Falha ao obter token: {result.get('error')}")
-                logger.error(f"Descrição: {result.get('error_description')}")
+            try:
+                # Adquirir token para a aplicação (não para um usuário);
+                # o MSAL responde do seu cache enquanto o token ainda é válido
+                result = self._get_msal_app().acquire_token_for_client(scopes=self.scope)
+                
+                if "access_token" in result:
+                    self._token = result["access_token"]
+                    self._token_expires_at = time.monotonic() + int(result.get("expires_in", 0))
+                    return self._token
+                else:
+                    logger.error(f"Falha ao obter token: {result.get('error')}")
+                    logger.error(f"Descrição: {result.get('error_description')}")
+                    return None
+            except Exception as e:
+                logger.error(f"Erro ao obter token de acesso: {str(e)}")
                 return None
-        except Exception as e:
-            logger.error(f"Erro ao obter token de acesso: {str(e)}")
-            return None
 
     def _make_request(self, method: str, endpoint: str, data: Any = None) -> Optional[Dict[str, Any]]:
         """
         Faz uma requisição para a API do Microsoft Graph.
         
+        Throttling e falhas transitórias são repetidos pelo GraphClient; aqui
+        só chegam as falhas definitivas.
+        
         Args:
             method: Método HTTP (GET, POST, etc.)
-            endpoint: Endpoint da API
+            endpoint: Endpoint da API ou URL absoluta (ex.: @odata.nextLink)
             data: Dados a serem enviados (opcional)
             
         Returns:
             Resposta da API ou None se ocorrer algum erro
         """
-        token = self._get_token()
-        if not token:
+        if method.upper() not in ("GET", "POST", "PATCH", "DELETE"):
+            logger.error(f"Método HTTP não suportado: {method}")
             return None
         
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
+        try:
+            return self.client.request(method, endpoint, data)
+        except GraphRequestError as e:
+            logger.error(str(e))
+            return None
+
+    def iter_user_pages(self, filter_query: Optional[str] = None, page_size: int = MAX_PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Percorre os usuários do Microsoft 365 página por página, seguindo @odata.nextLink.
         
-        url = f"{self.endpoint}/{endpoint}"
+        Apenas uma página é mantida em memória por vez.
         
-        try:
-            if method.upper() == "GET":
-                response = requests.get(url, headers=headers)
-            elif method.upper() == "POST":
-                response = requests.post(url, headers=headers, json=data)
-            elif method.upper() == "PATCH":
-                response = requests.patch(url, headers=headers, json=data)
-            elif method.upper() == "DELETE":
-                response = requests.delete(url, headers=headers)
-            else:
-                logger.error(f"Método HTTP não suportado: {method}")
-                return None
+        Args:
+            filter_query: Consulta de filtro (opcional)
+            page_size: Quantidade de usuários por página (máximo 999)
             
-            # Verificar se a resposta foi bem-sucedida
-            response.raise_for_status()
+        Yields:
+            Lista de usuários de cada página
             
-            # Retornar os dados da resposta se houver
-            if response.content:
-                return response.json()
-            else:
-                return {}
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erro na requisição para {url}: {str(e)}")
-            if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Resposta: {e.response.text}")
-            return None
+        Raises:
+            GraphRequestError: Se alguma página não puder ser obtida
+        """
+        params = []
+        
+        if filter_query:
+            params.append(f"$filter={filter_query}")
+        
+        params.append(f"$top={max(1, min(page_size, MAX_PAGE_SIZE))}")
+        params.append(f"$select={USER_SELECT_FIELDS}")
+        
+        next_url = f"users?{'&'.join(params)}"
+        page_number = 0
+        
+        while next_url:
+            try:
+                response = self.client.request("GET", next_url)
+            except GraphRequestError as e:
+                raise GraphRequestError(f"Falha ao obter a página {page_number + 1} de usuários: {str(e)}", e.status_code)
+            
+            page_number += 1
+            yield response.get("value", [])
+            
+            next_url = response.get("@odata.nextLink")
+
+    def iter_users(self, filter_query: Optional[str] = None, page_size: int = MAX_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+        """
+        Percorre todos os usuários do Microsoft 365 como um fluxo contínuo.
+        
+        Args:
+            filter_query: Consulta de filtro (opcional)
+            page_size: Quantidade de usuários por página
+            
+        Yields:
+            Usuário do Microsoft Graph
+        """
+        for page in self.iter_user_pages(filter_query, page_size):
+            yield from page
 
     def get_users(self, filter_query: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
         """
         Obtém a lista de usuários do Microsoft 365.
         
+        Segue a paginação do Graph até atingir o limite solicitado.
+        
         Args:
             filter_query: Consulta de filtro (opcional)
             limit: Limite de resultados
@@ -113,24 +398,12 @@ class MSGraphService:
             Lista de usuários
         """
         try:
-            endpoint = "users"
-            params = []
-            
-            if filter_query:
-                params.append(f"$filter={filter_query}")
-            
-            params.append(f"$top={limit}")
-            params.append("$select=id,displayName,mail,jobTitle,department,companyName,businessPhones")
-            
-            query_string = "&".join(params)
-            endpoint = f"{endpoint}?{query_string}"
-            
-            response = self._make_request("GET", endpoint)
-            
-            if response and "value" in response:
-                return response["value"]
-            else:
-                return []
+            users = []
+            for user in self.iter_users(filter_query, page_size=limit):
+                users.append(user)
+                if len(users) >= limit:
+                    break
+            return users
         except Exception as e:
             logger.error(f"Erro ao obter usuários: {str(e)}")
             return []
@@ -158,6 +431,478 @@ class MSGraphService:
             logger.error(f"Erro ao buscar usuário por e-mail {email}: {str(e)}")
             return None
 
+    def _lookup_email_chunk(self, chunk: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Consulta até 20 e-mails em uma única chamada $batch.
+        
+        Args:
+            chunk: E-mails a consultar
+            
+        Returns:
+            Dicionário e-mail -> usuário do Graph (None se não encontrado ou se a consulta falhar)
+        """
+        results = {email: None for email in chunk}
+        sub_requests = []
+        for index, email in enumerate(chunk):
+            filter_query = quote(f"mail eq '{email.replace(chr(39), chr(39) * 2)}'")
+            sub_requests.append({
+                "id": str(index),
+                "method": "GET",
+                "url": f"/users?$filter={filter_query}&$select={USER_SELECT_FIELDS}"
+            })
+        
+        try:
+            responses = self.client.batch(sub_requests)
+        except GraphRequestError as e:
+            logger.error(f"Falha na chamada $batch para {len(chunk)} e-mails: {str(e)}")
+            return results
+        
+        for item_id, item in responses.items():
+            try:
+                email = chunk[int(item_id)]
+            except (TypeError, ValueError, IndexError):
+                continue
+            
+            if item.get("status") != 200:
+                logger.warning(f"Consulta em lote falhou para {email}: status {item.get('status')}")
+                continue
+            
+            users = (item.get("body") or {}).get("value", [])
+            if users:
+                results[email] = users[0]
+        
+        return results
+
+    def get_users_by_emails(self, emails: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Obtém vários usuários pelo e-mail usando chamadas JSON $batch.
+        
+        Cada chamada ao Graph carrega até 20 consultas filtradas por e-mail; as
+        chamadas são feitas em paralelo dentro do limite de concorrência do
+        GraphClient, e as respostas são separadas de volta por e-mail.
+        
+        Args:
+            emails: Lista de e-mails
+            
+        Returns:
+            Dicionário e-mail -> usuário do Graph (None se não encontrado ou se a consulta falhar)
+        """
+        # Remove duplicados mantendo a ordem (comparação sem diferenciar maiúsculas)
+        unique_emails = list({email.lower(): email for email in emails if email}.values())
+        chunks = [unique_emails[start:start + MAX_BATCH_SIZE] for start in range(0, len(unique_emails), MAX_BATCH_SIZE)]
+        
+        results = {}
+        for chunk_results in self.client.map_concurrent(self._lookup_email_chunk, chunks):
+            results.update(chunk_results)
+        return results
+
+    @staticmethod
+    def map_user_data(user: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Converte um usuário do Microsoft Graph para as colunas da tabela users.
+        
+        Args:
+            user: Usuário retornado pelo Microsoft Graph
+            
+        Returns:
+            Dicionário com os dados do usuário no formato do banco
+        """
+        return {
+            "email": user.get("mail"),
+            "nome_completo": user.get("displayName", ""),
+            "cargo": user.get("jobTitle", ""),
+            "setor": user.get("department", ""),
+            "empresa": user.get("companyName", ""),
+            "telefone": user.get("businessPhones")[0] if user.get("businessPhones") and len(user.get("businessPhones")) > 0 else "",
+            "ramal": "",  # O Microsoft Graph não fornece ramal diretamente
+            "ms_id": user.get("id", "")
+        }
+
+    @staticmethod
+    def map_user_changes(user: Dict[str, Any]) -> tuple:
+        """
+        Converte um usuário recebido de users/delta em uma linha de #users_delta.
+        
+        Apenas as propriedades presentes no payload são marcadas para gravação;
+        as ausentes mantêm o valor atual no banco.
+        
+        Args:
+            user: Usuário (possivelmente parcial) retornado por users/delta
+            
+        Returns:
+            Tupla na ordem das colunas de #users_delta
+        """
+        values = {}
+        for prop, column in DELTA_PROPERTY_COLUMNS.items():
+            if prop not in user:
+                continue
+            value = user[prop]
+            if prop == "businessPhones":
+                value = value[0] if value else None
+            values[column] = value
+        
+        columns = list(DELTA_PROPERTY_COLUMNS.values())
+        return (
+            user["id"],
+            user.get("mail") or None,
+            *(values.get(column) for column in columns),
+            *(1 if column in values else 0 for column in columns)
+        )
+
+    def _lookup_id_chunk(self, chunk: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Obtém até 20 usuários pelo id em uma única chamada $batch.
+        
+        Args:
+            chunk: Ids (ms_id) a consultar
+            
+        Returns:
+            Dicionário id -> usuário do Graph (None se não encontrado ou se a consulta falhar)
+        """
+        results = {user_id: None for user_id in chunk}
+        sub_requests = [
+            {
+                "id": str(index),
+                "method": "GET",
+                "url": f"/users/{quote(user_id)}?$select={USER_SELECT_FIELDS}"
+            }
+            for index, user_id in enumerate(chunk)
+        ]
+        
+        try:
+            responses = self.client.batch(sub_requests)
+        except GraphRequestError as e:
+            logger.error(f"Falha na chamada $batch para {len(chunk)} ids: {str(e)}")
+            return results
+        
+        for item_id, item in responses.items():
+            try:
+                user_id = chunk[int(item_id)]
+            except (TypeError, ValueError, IndexError):
+                continue
+            
+            if item.get("status") == 200:
+                results[user_id] = item.get("body")
+            else:
+                logger.warning(f"Consulta em lote falhou para o id {user_id}: status {item.get('status')}")
+        
+        return results
+
+    def get_users_by_ids(self, user_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Obtém vários usuários completos pelo id usando chamadas JSON $batch.
+        
+        Args:
+            user_ids: Ids (ms_id) dos usuários
+            
+        Returns:
+            Dicionário id -> usuário do Graph (None se não encontrado ou se a consulta falhar)
+        """
+        unique_ids = list(dict.fromkeys(user_id for user_id in user_ids if user_id))
+        chunks = [unique_ids[start:start + MAX_BATCH_SIZE] for start in range(0, len(unique_ids), MAX_BATCH_SIZE)]
+        
+        results = {}
+        for chunk_results in self.client.map_concurrent(self._lookup_id_chunk, chunks):
+            results.update(chunk_results)
+        return results
+
+    def _to_staging_rows(self, users: List[Dict[str, Any]]) -> List[tuple]:
+        """
+        Converte uma página de usuários do Graph em linhas para a tabela temporária.
+        
+        Args:
+            users: Usuários retornados pelo Microsoft Graph
+            
+        Returns:
+            Lista de tuplas na ordem das colunas de #users_sync
+        """
+        rows = []
+        for user in users:
+            # Só sincroniza usuários com e-mail
+            if not user.get("mail"):
+                continue
+            user_data = self.map_user_data(user)
+            rows.append((
+                user_data["email"],
+                user_data["nome_completo"] or "",
+                user_data["cargo"],
+                user_data["setor"],
+                user_data["empresa"],
+                user_data["telefone"],
+                user_data["ramal"],
+                user_data["ms_id"]
+            ))
+        return rows
+
+    @staticmethod
+    def _merge_staged_users(cursor) -> tuple:
+        """
+        Aplica o conteúdo de #users_sync na tabela users com um único MERGE.
+        
+        Args:
+            cursor: Cursor da conexão onde a tabela temporária foi preenchida
+            
+        Returns:
+            Tupla (inseridos, atualizados, total do lote, e-mails alterados)
+        """
+        cursor.execute(_MERGE_USERS_SQL)
+        inserted, updated, total = cursor.fetchone()
+        cursor.nextset()
+        changed_emails = [row[0] for row in cursor.fetchall()]
+        cursor.execute("DROP TABLE IF EXISTS #users_sync")
+        return inserted, updated, total, changed_emails
+
+    def sync_users_bulk(self) -> Optional[Dict[str, int]]:
+        """
+        Sincroniza todos os usuários do Microsoft 365 em uma única operação em conjunto.
+        
+        Os usuários são lidos do Graph página por página e enviados para uma
+        tabela temporária (fast_executemany); o lote completo é então aplicado
+        com um único MERGE dentro de uma transação.
+        
+        Returns:
+            Contagens de usuários inseridos, atualizados e inalterados,
+            ou None se a sincronização falhar
+        """
+        from .. import db
+        
+        try:
+            with db.get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(_STAGING_TABLE_SQL)
+                cursor.fast_executemany = True
+                
+                # Cada página do Graph é enviada para a tabela temporária assim que chega
+                staged = 0
+                for page in self.iter_user_pages():
+                    rows = self._to_staging_rows(page)
+                    if rows:
+                        cursor.executemany(_STAGING_INSERT_SQL, rows)
+                        staged += len(rows)
+                
+                if staged == 0:
+                    logger.warning("Nenhum usuário com e-mail encontrado no Microsoft 365")
+                    return None
+                
+                inserted, updated, total, changed_emails = self._merge_staged_users(cursor)
+                conn.commit()
+            
+            signature_service.refresh_rendered_signatures(changed_emails)
+            
+            stats = {
+                "inserted": inserted,
+                "updated": updated,
+                "unchanged": total - inserted - updated,
+                "total": total
+            }
+            logger.info(f"Sincronização em massa concluída: {stats}")
+            return stats
+        except Exception as e:
+            logger.error(f"Erro na sincronização em massa de usuários: {str(e)}")
+            return None
+
+    def sync_users_by_emails(self, emails: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Sincroniza uma lista de usuários consultando o Graph em lotes ($batch).
+        
+        Os usuários encontrados são aplicados com o mesmo MERGE da sincronização em massa.
+        
+        Args:
+            emails: Lista de e-mails a sincronizar
+            
+        Returns:
+            Contagens de inseridos, atualizados e inalterados e a lista de
+            e-mails não encontrados, ou None se a sincronização falhar
+        """
+        from .. import db
+        
+        try:
+            found = self.get_users_by_emails(emails)
+            not_found = [email for email, user in found.items() if user is None]
+            rows = self._to_staging_rows([user for user in found.values() if user is not None])
+            
+            inserted = updated = total = 0
+            changed_emails = []
+            if rows:
+                with db.get_db_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(_STAGING_TABLE_SQL)
+                    cursor.fast_executemany = True
+                    cursor.executemany(_STAGING_INSERT_SQL, rows)
+                    inserted, updated, total, changed_emails = self._merge_staged_users(cursor)
+                    conn.commit()
+            
+            signature_service.refresh_rendered_signatures(changed_emails)
+            
+            stats = {
+                "inserted": inserted,
+                "updated": updated,
+                "unchanged": total - inserted - updated,
+                "total": total,
+                "not_found": not_found
+            }
+            logger.info(f"Sincronização em lote de {len(found)} e-mails concluída: {stats}")
+            return stats
+        except Exception as e:
+            logger.error(f"Erro na sincronização em lote de usuários: {str(e)}")
+            return None
+
+    def iter_user_delta_pages(self, delta_link: Optional[str] = None) -> Iterator[tuple]:
+        """
+        Percorre as alterações de usuários via users/delta, página por página.
+        
+        Sem deltaLink, a primeira rodada retorna o diretório completo e serve
+        como ponto de partida para as rodadas incrementais seguintes.
+        
+        Args:
+            delta_link: @odata.deltaLink salvo na rodada anterior (opcional)
+            
+        Yields:
+            Tupla (usuários da página, deltaLink final ou None nas páginas intermediárias)
+            
+        Raises:
+            GraphRequestError: Se alguma página não puder ser obtida
+        """
+        next_url = delta_link or f"users/delta?$select={USER_SELECT_FIELDS},accountEnabled"
+        page_number = 0
+        
+        while next_url:
+            try:
+                response = self.client.request("GET", next_url)
+            except GraphRequestError as e:
+                raise GraphRequestError(f"Falha ao obter a página {page_number + 1} de users/delta: {str(e)}", e.status_code)
+            
+            page_number += 1
+            yield response.get("value", []), response.get("@odata.deltaLink")
+            
+            next_url = response.get("@odata.nextLink")
+
+    def _apply_delta_round(self, delta_link: Optional[str]) -> Dict[str, int]:
+        """
+        Executa uma rodada de users/delta e aplica as alterações em uma transação.
+        
+        Args:
+            delta_link: deltaLink da rodada anterior (None para a rodada inicial)
+            
+        Returns:
+            Contagens de usuários inseridos, atualizados, inalterados e removidos
+        """
+        from .. import db
+        
+        # As alterações são consolidadas por id: um mesmo usuário pode vir em
+        # mais de uma página, cada vez com parte das propriedades
+        changes: Dict[str, Dict[str, Any]] = {}
+        removed = set()
+        new_delta_link = None
+        for page, page_delta_link in self.iter_user_delta_pages(delta_link):
+            for user in page:
+                user_id = user.get("id")
+                if not user_id:
+                    continue
+                if "@removed" in user or user.get("accountEnabled") is False:
+                    changes.pop(user_id, None)
+                    removed.add(user_id)
+                else:
+                    removed.discard(user_id)
+                    changes.setdefault(user_id, {}).update(user)
+            
+            if page_delta_link:
+                new_delta_link = page_delta_link
+        
+        if not new_delta_link:
+            raise GraphRequestError("Resposta de users/delta sem @odata.deltaLink")
+        
+        # Payloads parciais sem "mail" só podem ser aplicados a usuários já
+        # vinculados ao ms_id; os demais são buscados por completo no Graph
+        partial_ids = [user_id for user_id, user in changes.items() if "mail" not in user]
+        if partial_ids:
+            known_ids = {
+                row["ms_id"] for row in db.execute_query("""
+                SELECT ms_id FROM [dbo].[users]
+                WHERE ms_id IN (SELECT value FROM OPENJSON(?))
+                """, (json.dumps(partial_ids),))
+            }
+            unknown_ids = [user_id for user_id in partial_ids if user_id not in known_ids]
+            for user_id, full_user in self.get_users_by_ids(unknown_ids).items():
+                if full_user:
+                    changes[user_id].update(full_user)
+        
+        with db.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(_DELTA_TABLE_SQL)
+            cursor.execute(_REMOVED_TABLE_SQL)
+            cursor.fast_executemany = True
+            
+            # Contas sem e-mail só são gravadas se já existirem (atualização pelo ms_id)
+            rows = [self.map_user_changes(user) for user in changes.values()]
+            if rows:
+                cursor.executemany(_DELTA_INSERT_SQL, rows)
+            if removed:
+                cursor.executemany("INSERT INTO #users_removed (ms_id) VALUES (?)", [(user_id,) for user_id in removed])
+            
+            cursor.execute(_MERGE_DELTA_USERS_SQL)
+            inserted, updated, total = cursor.fetchone()
+            cursor.nextset()
+            changed_emails = [row[0] for row in cursor.fetchall()]
+            cursor.execute("DROP TABLE IF EXISTS #users_delta")
+            
+            cursor.execute(_DELETE_REMOVED_SQL)
+            removed_emails = [row[0] for row in cursor.fetchall()]
+            removed_count = len(removed_emails)
+            cursor.execute("DROP TABLE IF EXISTS #users_removed")
+            
+            cursor.execute(_SAVE_DELTA_LINK_SQL, (USERS_DELTA_STATE, new_delta_link))
+            conn.commit()
+        
+        signature_service.refresh_rendered_signatures(changed_emails + removed_emails)
+        
+        return {
+            "inserted": inserted,
+            "updated": updated,
+            "unchanged": total - inserted - updated,
+            "removed": removed_count,
+            "total": total
+        }
+
+    def sync_users_delta(self) -> Optional[Dict[str, int]]:
+        """
+        Sincroniza apenas os usuários alterados desde a última rodada (users/delta).
+        
+        Usuários novos são inseridos e, nos alterados, apenas as propriedades
+        presentes no payload parcial do Graph são gravadas (pelo ms_id); contas
+        removidas (@removed) ou desabilitadas são excluídas da tabela users.
+        O novo deltaLink é gravado na mesma transação, de modo que uma rodada
+        interrompida é repetida por completo na próxima execução.
+        Se o Graph descartar o deltaLink salvo (410 Gone), a rodada recomeça do zero.
+        
+        Returns:
+            Contagens de usuários inseridos, atualizados, inalterados e removidos,
+            ou None se a sincronização falhar
+        """
+        from .. import db
+        
+        try:
+            saved = db.execute_query("""
+            SELECT delta_link FROM [dbo].[graph_sync_state]
+            WHERE name = ?
+            """, (USERS_DELTA_STATE,))
+            delta_link = saved[0]["delta_link"] if saved else None
+            
+            try:
+                stats = self._apply_delta_round(delta_link)
+            except GraphRequestError as e:
+                if e.status_code != 410 or not delta_link:
+                    raise
+                logger.warning("deltaLink de usuários expirado; reiniciando a sincronização incremental")
+                delta_link = None
+                stats = self._apply_delta_round(None)
+            
+            logger.info(f"Sincronização incremental concluída ({'inicial' if not delta_link else 'delta'}): {stats}")
+            return stats
+        except Exception as e:
+            logger.error(f"Erro na sincronização incremental de usuários: {str(e)}")
+            return None
+
     def sync_users(self) -> bool:
         """
         Sincroniza todos os usuários do Microsoft 365 com o banco de dados local.
@@ -168,17 +913,12 @@ class MSGraphService:
         from .. import db
         
         try:
-            # Obtém todos os usuários do Microsoft 365
-            users = self.get_users(limit=999)
-            
-            if not users:
-                logger.warning("Nenhum usuário encontrado no Microsoft 365")
-                return False
-            
             # Contador de usuários sincronizados
             count = 0
+            synced_emails = []
             
-            for user in users:
+            # Percorre todos os usuários do Microsoft 365 sem carregar o diretório inteiro em memória
+            for user in self.iter_users():
                 # Só sincroniza usuários com e-mail
                 if not user.get("mail"):
                     continue
@@ -190,16 +930,7 @@ class MSGraphService:
                 """, (user.get("mail"),))
                 
                 # Prepara os dados do usuário
-                user_data = {
-                    "email": user.get("mail"),
-                    "nome_completo": user.get("displayName", ""),
-                    "cargo": user.get("jobTitle", ""),
-                    "setor": user.get("department", ""),
-                    "empresa": user.get("companyName", ""),
-                    "telefone": user.get("businessPhones")[0] if user.get("businessPhones") and len(user.get("businessPhones")) > 0 else "",
-                    "ramal": "",  # O Microsoft Graph não fornece ramal diretamente
-                    "ms_id": user.get("id", "")
-                }
+                user_data = self.map_user_data(user)
                 
                 if existing and len(existing) > 0:
                     # Atualiza o usuário existente
@@ -232,8 +963,16 @@ class MSGraphService:
                         user_data["ms_id"]
                     ))
                 
+                synced_emails.append(user_data["email"])
                 count += 1
             
+            if count == 0:
+                logger.warning("Nenhum usuário encontrado no Microsoft 365")
+                return False
+            
+            # Rematerializa as assinaturas de uma vez, em lotes
+            signature_service.refresh_rendered_signatures(synced_emails)
+            
             logger.info(f"{count} usuários sincronizados com sucesso")
             return True
         except Exception as e:
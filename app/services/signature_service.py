@@ -1,13 +1,72 @@
 """
 Serviço para gerenciar assinaturas de e-mail
 """
+import base64
+import binascii
+import hashlib
+import json
 import logging
-from typing import Dict, Any, Optional, List
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Hashable, Iterable, Iterator, Union
 
 from .. import db
+from ..config import SIGNATURE_CACHE_MAX_SIZE, SIGNATURE_CACHE_TTL
+from . import campaigns, template_rules
+from .cache import TTLCache
+from .template_compiler import get_compiled_template, find_unknown_placeholders
 
 logger = logging.getLogger(__name__)
 
+# Cache das assinaturas renderizadas, por e-mail (em minúsculas). Cada entrada
+# guarda o HTML, o ETag e o template de origem para permitir invalidação precisa.
+_rendered_cache = TTLCache(maxsize=SIGNATURE_CACHE_MAX_SIZE, ttl=SIGNATURE_CACHE_TTL)
+
+# Cache dos templates por ID (usado nas edições, previews e renderizações em lote)
+_template_cache = TTLCache(maxsize=256, ttl=SIGNATURE_CACHE_TTL)
+
+def invalidate_signature_cache(emails: Union[str, Iterable[str]]) -> int:
+    """
+    Remove do cache as assinaturas renderizadas dos e-mails informados.
+    
+    Args:
+        emails: E-mail ou lista de e-mails
+        
+    Returns:
+        Quantidade de entradas removidas
+    """
+    if isinstance(emails, str):
+        emails = [emails]
+    return _rendered_cache.delete_many(email.lower() for email in emails if email)
+
+def invalidate_template_cache(template_id: int, default_changed: bool = False) -> int:
+    """
+    Remove do cache o template e as assinaturas geradas a partir dele.
+    
+    Args:
+        template_id: ID do template alterado
+        default_changed: Se o template padrão mudou (invalida também quem usa o padrão)
+        
+    Returns:
+        Quantidade de assinaturas removidas
+    """
+    if default_changed:
+        # O is_default dos demais templates também pode ter mudado
+        _template_cache.clear()
+    else:
+        _template_cache.delete(template_id)
+    
+    return _rendered_cache.invalidate_where(
+        lambda _, entry: entry["template_id"] == template_id or (default_changed and entry["uses_default"])
+    )
+
+def clear_signature_cache() -> None:
+    """Remove todas as assinaturas do cache (ex.: após alterar campanhas)"""
+    _rendered_cache.clear()
+
+def get_signature_cache_stats() -> Dict[str, Any]:
+    """Retorna as estatísticas do cache de assinaturas renderizadas"""
+    return _rendered_cache.stats()
+
 def get_signature_by_email(email: str) -> Optional[Dict[str, Any]]:
     """
     Obtém a assinatura HTML para um determinado e-mail.
@@ -48,7 +107,7 @@ def get_user_data(email: str) -> Optional[Dict[str, Any]]:
     try:
         query = """
         SELECT u.* 
-        FROM [Microsoft365].[dbo].[users] u
+        FROM [dbo].[users] u
         WHERE u.email = ?
         """
         
@@ -63,88 +122,647 @@ def get_user_data(email: str) -> Optional[Dict[str, Any]]:
         logger.error(f"Erro ao buscar dados do usuário para o e-mail {email}: {str(e)}")
         return None
 
-def render_signature(template: str, user_data: Dict[str, Any]) -> str:
+def render_signature(template: str, user_data: Dict[str, Any], cache_key: Optional[Hashable] = None) -> str:
     """
     Renderiza a assinatura substituindo as variáveis pelo dados do usuário.
     
+    O template é compilado uma única vez (em trechos literais e variáveis) e
+    mantido em cache; cada renderização é apenas um join.
+    
     Args:
         template: Template HTML da assinatura com variáveis como {{NomeCompleto}}
         user_data: Dicionário com os dados do usuário
+        cache_key: Chave de versão do template, ver template_cache_key (opcional)
         
     Returns:
         HTML da assinatura com as variáveis substituídas
     """
-    # Começamos com o template
-    rendered = template
-    
-    # Lista de variáveis possíveis e seus mapeamentos para as colunas do banco
-    variable_mappings = {
-        "{{NomeCompleto}}": str(user_data.get("nome_completo", "")) if user_data.get("nome_completo") is not None else "",
-        "{{Cargo}}": str(user_data.get("cargo", "")) if user_data.get("cargo") is not None else "",
-        "{{Setor}}": str(user_data.get("setor", "")) if user_data.get("setor") is not None else "",
-        "{{Empresa}}": str(user_data.get("empresa", "")) if user_data.get("empresa") is not None else "",
-        "{{Telefone}}": str(user_data.get("telefone", "")) if user_data.get("telefone") is not None else "",
-        "{{Ramal}}": str(user_data.get("ramal", "")) if user_data.get("ramal") is not None else ""
+    return get_compiled_template(template, cache_key).render(user_data)
+
+def template_cache_key(template_id: int, version_id: Optional[int], updated_at: Any = None) -> Hashable:
+    """
+    Retorna a chave de cache do conteúdo de um template.
+    
+    As versões são imutáveis, então a chave por versão nunca precisa ser
+    invalidada; templates ainda sem versão usam o ID e a data de alteração.
+    
+    Args:
+        template_id: ID do template
+        version_id: ID da versão atual do template
+        updated_at: Data da última alteração do template
+        
+    Returns:
+        Chave para o cache de templates compilados
+    """
+    if version_id is not None:
+        return ("template-version", version_id)
+    return ("template", template_id, updated_at)
+
+# Resolve, em uma única ida ao banco, a assinatura atribuída (ou o template
+# padrão, quando não há atribuição) e os dados do usuário. {source} é a
+# consulta que fornece os e-mails (um único e-mail ou uma lista via OPENJSON).
+_SIGNATURE_INPUTS_TEMPLATE = """
+SELECT
+    req.email AS request_email,
+    s.[id] AS signature_id,
+    s.[signature_html],
+    s.[template_id] AS assigned_template_id,
+    a.[template_html] AS assigned_template_html,
+    a.[current_version_id] AS assigned_template_version_id,
+    a.[updated_at] AS assigned_template_updated_at,
+    d.[id] AS default_template_id,
+    d.[template_html] AS default_template_html,
+    d.[current_version_id] AS default_template_version_id,
+    d.[updated_at] AS default_template_updated_at,
+    u.[email],
+    u.[nome_completo],
+    u.[cargo],
+    u.[setor],
+    u.[empresa],
+    u.[telefone],
+    u.[ramal]
+FROM ({source}) AS req
+LEFT JOIN [dbo].[signatures] s ON s.[user_email] = req.email
+LEFT JOIN [dbo].[signature_templates] a ON a.[id] = s.[template_id]
+LEFT JOIN [dbo].[users] u ON u.[email] = req.email
+OUTER APPLY (
+    SELECT TOP 1 t.[id], t.[template_html], t.[current_version_id], t.[updated_at]
+    FROM [dbo].[signature_templates] t
+    WHERE s.[id] IS NULL AND t.[is_default] = 1
+    ORDER BY t.[id]
+) d
+"""
+
+_SIGNATURE_INPUTS_SQL = _SIGNATURE_INPUTS_TEMPLATE.format(
+    source="SELECT CAST(? AS NVARCHAR(255)) AS email"
+)
+
+_SIGNATURE_INPUTS_MANY_SQL = _SIGNATURE_INPUTS_TEMPLATE.format(
+    source="SELECT DISTINCT CAST([value] AS NVARCHAR(255)) AS email FROM OPENJSON(?)"
+)
+
+# Leitura do add-in: uma busca pela chave primária
+_RENDERED_LOOKUP_SQL = """
+SELECT signature_html, content_hash, template_id, uses_default, setor, empresa
+FROM [dbo].[rendered_signatures]
+WHERE user_email = ?
+"""
+
+# Linhas renderizadas enviadas como um único parâmetro JSON
+_RENDERED_SOURCE = """(
+    SELECT * FROM OPENJSON(?) WITH (
+        [user_email] NVARCHAR(255) '$.email',
+        [signature_html] NVARCHAR(MAX) '$.html',
+        [content_hash] CHAR(64) '$.hash',
+        [template_id] INT '$.template_id',
+        [uses_default] BIT '$.uses_default',
+        [setor] NVARCHAR(100) '$.setor',
+        [empresa] NVARCHAR(100) '$.empresa'
+    )
+) AS source"""
+
+# Materialização: grava o que mudou e remove quem ficou sem assinatura (html nulo)
+_MERGE_RENDERED_SQL = f"""
+MERGE [dbo].[rendered_signatures] AS target
+USING {_RENDERED_SOURCE}
+ON target.[user_email] = source.[user_email]
+WHEN MATCHED AND source.[signature_html] IS NULL THEN
+    DELETE
+WHEN MATCHED AND (
+    target.[content_hash] <> source.[content_hash]
+    OR EXISTS (
+        SELECT target.[template_id], target.[uses_default], target.[setor], target.[empresa]
+        EXCEPT
+        SELECT source.[template_id], source.[uses_default], source.[setor], source.[empresa]
+    )
+) THEN
+    UPDATE SET
+        signature_html = source.[signature_html],
+        content_hash = source.[content_hash],
+        template_id = source.[template_id],
+        uses_default = source.[uses_default],
+        setor = source.[setor],
+        empresa = source.[empresa],
+        updated_at = GETDATE()
+WHEN NOT MATCHED BY TARGET AND source.[signature_html] IS NOT NULL THEN
+    INSERT (user_email, signature_html, content_hash, template_id, uses_default, setor, empresa, updated_at)
+    VALUES (source.[user_email], source.[signature_html], source.[content_hash], source.[template_id],
+            source.[uses_default], source.[setor], source.[empresa], GETDATE());
+"""
+
+# Gravação na leitura (cache miss): apenas insere, para nunca sobrescrever
+# uma materialização mais recente feita por uma escrita concorrente
+_INSERT_RENDERED_SQL = f"""
+MERGE [dbo].[rendered_signatures] WITH (HOLDLOCK) AS target
+USING {_RENDERED_SOURCE}
+ON target.[user_email] = source.[user_email]
+WHEN NOT MATCHED BY TARGET AND source.[signature_html] IS NOT NULL THEN
+    INSERT (user_email, signature_html, content_hash, template_id, uses_default, setor, empresa, updated_at)
+    VALUES (source.[user_email], source.[signature_html], source.[content_hash], source.[template_id],
+            source.[uses_default], source.[setor], source.[empresa], GETDATE());
+"""
+
+# Quantidade máxima de e-mails resolvidos e gravados por rodada de materialização
+MATERIALIZE_BATCH_SIZE = 500
+
+def _inputs_from_row(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Converte uma linha de _SIGNATURE_INPUTS_TEMPLATE no template e nos dados do usuário.
+    
+    A ordem de resolução é: assinatura atribuída explicitamente, regra de
+    atribuição (avaliada em memória) e, por fim, o template padrão.
+    
+    Returns:
+        Dicionário com o template e os dados do usuário, ou None se não houver
+        assinatura atribuída, regra aplicável nem template padrão
+    """
+    if row["email"] is not None:
+        user_data = {
+            "email": row["email"],
+            "nome_completo": row["nome_completo"],
+            "cargo": row["cargo"],
+            "setor": row["setor"],
+            "empresa": row["empresa"],
+            "telefone": row["telefone"],
+            "ramal": row["ramal"]
+        }
+    else:
+        user_data = None
+    
+    # Regras só valem para quem não tem assinatura atribuída
+    matched = None
+    if row["signature_id"] is None:
+        matched = template_rules.match_template(row["request_email"], user_data)
+    
+    if row["signature_id"] is not None and row["signature_html"] is not None:
+        # HTML personalizado do usuário: o próprio conteúdo serve de chave de compilação
+        template = {
+            "template_html": row["signature_html"],
+            "template_id": row["assigned_template_id"],
+            "cache_key": None,
+            "uses_default": False
+        }
+    elif row["signature_id"] is not None:
+        # Assinatura que referencia o template: sempre a versão atual dele
+        template = {
+            "template_html": row["assigned_template_html"],
+            "template_id": row["assigned_template_id"],
+            "cache_key": template_cache_key(
+                row["assigned_template_id"],
+                row["assigned_template_version_id"],
+                row["assigned_template_updated_at"]
+            ),
+            "uses_default": False
+        }
+    elif matched is not None:
+        template = {
+            "template_html": matched["template_html"],
+            "template_id": matched["id"],
+            "cache_key": template_cache_key(matched["id"], matched["current_version_id"], matched["updated_at"]),
+            "uses_default": False
+        }
+    elif row["default_template_id"] is not None:
+        template = {
+            "template_html": row["default_template_html"],
+            "template_id": row["default_template_id"],
+            "cache_key": template_cache_key(
+                row["default_template_id"],
+                row["default_template_version_id"],
+                row["default_template_updated_at"]
+            ),
+            "uses_default": True
+        }
+    else:
+        return None
+    
+    return {**template, "user_data": user_data}
+
+def resolve_signature_inputs(email: str) -> Optional[Dict[str, Any]]:
+    """
+    Obtém o template a ser usado e os dados do usuário com uma única consulta.
+    
+    Args:
+        email: E-mail do usuário
+        
+    Returns:
+        Dicionário com o template (atribuído ou padrão) e os dados do usuário,
+        ou None se não houver assinatura atribuída nem template padrão
+    """
+    results = db.execute_query(_SIGNATURE_INPUTS_SQL, (email,))
+    return _inputs_from_row(results[0]) if results else None
+
+def _render_inputs(email: str, inputs: Dict[str, Any]) -> str:
+    """
+    Renderiza a assinatura a partir do resultado de resolve_signature_inputs.
+    
+    Args:
+        email: E-mail do usuário
+        inputs: Template e dados do usuário
+        
+    Returns:
+        HTML da assinatura renderizada
+    """
+    user_data = inputs["user_data"]
+    if not user_data:
+        logger.warning(f"Dados do usuário não encontrados para o e-mail: {email}")
+        # Podemos retornar um template com dados vazios ou um fallback
+        user_data = {
+            "email": email,
+            "nome_completo": email.split('@')[0],
+            "cargo": "",
+            "setor": "",
+            "empresa": email.split('@')[1],
+            "telefone": "",
+            "ramal": ""
+        }
+    
+    return render_signature(inputs["template_html"], user_data, inputs["cache_key"])
+
+def content_hash(html: str) -> str:
+    """Retorna o SHA-256 (hexadecimal) do HTML renderizado"""
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+def _etag_for(hash_hex: str) -> str:
+    """ETag forte derivado do hash do conteúdo"""
+    return f'"{hash_hex[:32]}"'
+
+def _rendered_row(email: str, inputs: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Monta a linha de rendered_signatures de um e-mail (html nulo = sem assinatura).
+    """
+    if inputs is None:
+        return {
+            "email": email,
+            "html": None,
+            "hash": None,
+            "template_id": None,
+            "uses_default": False,
+            "setor": None,
+            "empresa": None
+        }
+    
+    html = _render_inputs(email, inputs)
+    user_data = inputs["user_data"] or {}
+    return {
+        "email": email,
+        "html": html,
+        "hash": content_hash(html),
+        "template_id": inputs["template_id"],
+        "uses_default": inputs["uses_default"],
+        "setor": user_data.get("setor"),
+        "empresa": user_data.get("empresa")
+    }
+
+def _cache_entry(email: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Aplica os banners das campanhas ativas, guarda a assinatura no cache em
+    memória e devolve a entrada.
+    
+    O ETag é o content_hash da linha materializada; com banners ativos, é o
+    hash de "content_hash|versões das campanhas" (cada versão combina o ID e
+    o hash do banner).
+    
+    A entrada expira no próximo início ou fim de campanha, de modo que os
+    banners mudam na hora certa sem consultas ao banco a cada requisição.
+    """
+    now = datetime.now()
+    html = row["html"]
+    etag = _etag_for(row["hash"])
+    
+    active = campaigns.active_campaigns(email, row, now)
+    if active:
+        html += "".join(campaign.banner_html for campaign in active)
+        versions = "|".join(campaign.version for campaign in active)
+        etag = _etag_for(content_hash(f"{row['hash']}|{versions}"))
+    
+    entry = {
+        "html": html,
+        "etag": etag,
+        "template_id": row["template_id"],
+        "uses_default": bool(row["uses_default"])
     }
     
-    # Substitui cada variável pelo valor correspondente
-    for var, value in variable_mappings.items():
-        rendered = rendered.replace(var, value)
+    ttl = SIGNATURE_CACHE_TTL
+    until_boundary = campaigns.seconds_until_next_boundary(now)
+    if until_boundary is not None:
+        ttl = min(ttl, until_boundary)
+    _rendered_cache.set(email.lower(), entry, ttl=ttl)
+    return entry
+
+def _affected_emails(template_id: Optional[int], default_changed: bool, rules_changed: bool, all_users: bool) -> List[str]:
+    """
+    Lista os e-mails cuja assinatura materializada depende do que foi alterado.
+    """
+    queries = []
+    params: List[Any] = []
+    
+    if all_users:
+        queries.append("SELECT email AS user_email FROM [dbo].[users]")
+        queries.append("SELECT user_email FROM [dbo].[signatures]")
+        queries.append("SELECT user_email FROM [dbo].[rendered_signatures]")
+    else:
+        if template_id is not None:
+            queries.append("SELECT user_email FROM [dbo].[signatures] WHERE template_id = ?")
+            queries.append("SELECT user_email FROM [dbo].[rendered_signatures] WHERE template_id = ?")
+            params.extend([template_id, template_id])
+        if default_changed:
+            queries.append("SELECT user_email FROM [dbo].[rendered_signatures] WHERE uses_default = 1")
+        if rules_changed:
+            # Usuários sem assinatura atribuída (os únicos afetados pelas regras)
+            queries.append("""SELECT u.email AS user_email FROM [dbo].[users] u
+WHERE NOT EXISTS (SELECT 1 FROM [dbo].[signatures] s WHERE s.user_email = u.email)""")
+            queries.append("""SELECT r.user_email FROM [dbo].[rendered_signatures] r
+WHERE NOT EXISTS (SELECT 1 FROM [dbo].[signatures] s WHERE s.user_email = r.user_email)""")
+    
+    if not queries:
+        return []
     
-    return rendered
+    results = db.execute_query("\nUNION\n".join(queries), tuple(params))
+    return [row["user_email"] for row in results]
 
-def get_rendered_signature(email: str) -> Optional[str]:
+def refresh_rendered_signatures(
+    emails: Optional[Iterable[str]] = None,
+    template_id: Optional[int] = None,
+    default_changed: bool = False,
+    rules_changed: bool = False,
+    all_users: bool = False
+) -> int:
     """
-    Obtém a assinatura renderizada com os dados do usuário.
+    Rematerializa as assinaturas renderizadas na tabela rendered_signatures.
+    
+    Deve ser chamada após cada escrita que altere o resultado (atribuição,
+    alteração de template ou de regras, alteração ou sincronização de usuários). Os e-mails
+    são processados em lotes: uma consulta resolve as entradas do lote, os
+    templates compilados são reaproveitados e um único MERGE grava o resultado.
+    
+    Args:
+        emails: E-mails afetados
+        template_id: Template alterado (reprocessa quem o utiliza)
+        default_changed: Se o template padrão mudou (reprocessa quem usa o padrão)
+        rules_changed: Se as regras de atribuição mudaram (reprocessa quem não tem assinatura atribuída)
+        all_users: Reprocessa todos os usuários e assinaturas
+        
+    Returns:
+        Quantidade de assinaturas gravadas ou removidas
+    """
+    if isinstance(emails, str):
+        emails = [emails]
+    
+    # Sem distinção de maiúsculas, como na collation do banco
+    targets: Dict[str, str] = {}
+    for email in list(emails or []) + _affected_emails(template_id, default_changed, rules_changed, all_users):
+        if email:
+            targets.setdefault(email.lower(), email)
+    
+    pending = list(targets.values())
+    if pending:
+        # Outro processo pode ter alterado as regras desde a última recarga
+        # (uma verificação por chamada, antes de todos os lotes)
+        template_rules.reload_if_changed()
+    written = 0
+    for start in range(0, len(pending), MATERIALIZE_BATCH_SIZE):
+        batch = pending[start:start + MATERIALIZE_BATCH_SIZE]
+        rows = db.execute_query(_SIGNATURE_INPUTS_MANY_SQL, (json.dumps(batch),))
+        rendered = [_rendered_row(row["request_email"], _inputs_from_row(row)) for row in rows]
+        
+        written += max(db.execute_non_query(_MERGE_RENDERED_SQL, (json.dumps(rendered),)), 0)
+        
+        invalidate_signature_cache(batch)
+    
+    if pending:
+        logger.info(f"{len(pending)} assinaturas reprocessadas, {written} alteradas")
+    return written
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Verifica se o cabeçalho If-None-Match corresponde ao ETag atual.
+    
+    Args:
+        if_none_match: Valor do cabeçalho If-None-Match (pode conter vários ETags)
+        etag: ETag atual
+        
+    Returns:
+        True se o cliente já possui a versão atual
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def get_signature_entry(email: str, if_none_match: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Obtém a assinatura renderizada e seu ETag, respeitando o If-None-Match do cliente.
+    
+    A assinatura vem pronta da tabela rendered_signatures (uma busca pela chave
+    primária). Somente quando ainda não foi materializada ela é resolvida e
+    renderizada aqui, e o resultado é gravado para as próximas leituras.
+    
+    O ETag é derivado do conteúdo, não da versão do template nem do updated_at
+    do usuário: é o content_hash do HTML materializado (SHA-256) ou, com
+    banners de campanha, o hash desse content_hash com as versões das
+    campanhas ativas (ver _cache_entry). Qualquer mudança que altere o HTML
+    entregue muda o ETag, e rematerializações que produzem o mesmo HTML o
+    preservam.
     
     Args:
         email: E-mail do usuário
+        if_none_match: Valor do cabeçalho If-None-Match (opcional)
         
     Returns:
-        HTML da assinatura renderizada ou None se ocorrer algum erro
+        Dicionário com "html" (None quando não modificada), "etag" e
+        "not_modified", ou None se ocorrer algum erro
     """
+    entry = _rendered_cache.get(email.lower())
+    
     try:
-        # Obtém a assinatura do banco
-        signature_data = get_signature_by_email(email)
-        if not signature_data:
-            # Se não encontrar assinatura específica, busca o template padrão
-            query = """
-            SELECT * FROM [dbo].[signature_templates]
-            WHERE is_default = 1
-            """
-            templates = db.execute_query(query)
-            if not templates or len(templates) == 0:
+        if entry is None:
+            results = db.execute_query(_RENDERED_LOOKUP_SQL, (email,))
+            if results:
+                stored = results[0]
+                entry = _cache_entry(email, {
+                    "html": stored["signature_html"],
+                    "hash": stored["content_hash"],
+                    "template_id": stored["template_id"],
+                    "uses_default": stored["uses_default"],
+                    "setor": stored["setor"],
+                    "empresa": stored["empresa"]
+                })
+        
+        if entry is None:
+            # Ainda não materializada: resolve, renderiza e grava (as regras em memória
+            # são mantidas atualizadas por run_rules_refresher)
+            inputs = resolve_signature_inputs(email)
+            if not inputs:
                 logger.error("Nenhum template padrão encontrado")
                 return None
             
-            template_html = templates[0]["template_html"]
-        else:
-            template_html = signature_data["signature_html"]
-        
-        # Obtém os dados do usuário
-        user_data = get_user_data(email)
-        if not user_data:
-            logger.warning(f"Dados do usuário não encontrados para o e-mail: {email}")
-            # Podemos retornar um template com dados vazios ou um fallback
-            user_data = {
-                "nome_completo": email.split('@')[0],
-                "cargo": "",
-                "setor": "",
-                "empresa": email.split('@')[1],
-                "telefone": "",
-                "ramal": ""
-            }
-        
-        # Renderiza a assinatura com os dados do usuário
-        return render_signature(template_html, user_data)
+            row = _rendered_row(email, inputs)
+            db.execute_non_query(_INSERT_RENDERED_SQL, (json.dumps([row]),))
+            entry = _cache_entry(email, row)
     except Exception as e:
         logger.error(f"Erro ao gerar assinatura renderizada para {email}: {str(e)}")
         return None
+    
+    not_modified = etag_matches(if_none_match, entry["etag"])
+    return {
+        "html": None if not_modified else entry["html"],
+        "etag": entry["etag"],
+        "not_modified": not_modified
+    }
+
+def get_rendered_signature(email: str) -> Optional[str]:
+    """
+    Obtém a assinatura renderizada com os dados do usuário.
+    
+    Args:
+        email: E-mail do usuário
+        
+    Returns:
+        HTML da assinatura renderizada ou None se ocorrer algum erro
+    """
+    entry = get_signature_entry(email)
+    return entry["html"] if entry else None
+
+# Colunas de users usadas na renderização
+_RENDER_USER_COLUMNS = """
+    u.[email],
+    u.[nome_completo],
+    u.[cargo],
+    u.[setor],
+    u.[empresa],
+    u.[telefone],
+    u.[ramal]"""
+
+_RENDER_USERS_BY_EMAIL_SQL = f"""
+SELECT req.email AS request_email,{_RENDER_USER_COLUMNS}
+FROM (SELECT DISTINCT CAST([value] AS NVARCHAR(255)) AS email FROM OPENJSON(?)) AS req
+LEFT JOIN [dbo].[users] u ON u.[email] = req.email
+ORDER BY req.email
+"""
+
+_RENDER_USERS_BY_SETOR_SQL = f"""
+SELECT u.[email] AS request_email,{_RENDER_USER_COLUMNS}
+FROM [dbo].[users] u
+WHERE u.[setor] = ?
+ORDER BY u.[email]
+"""
+
+def get_users_for_render(emails: Optional[List[str]] = None, setor: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Carrega, em uma única consulta, os dados dos usuários a renderizar.
+    
+    Args:
+        emails: Lista de e-mails (e-mails sem usuário retornam com "email" nulo)
+        setor: Setor cujos usuários devem ser renderizados
+        
+    Returns:
+        Linhas com "request_email" e as colunas do usuário
+    """
+    if emails is not None:
+        return db.execute_query(_RENDER_USERS_BY_EMAIL_SQL, (json.dumps(emails),))
+    return db.execute_query(_RENDER_USERS_BY_SETOR_SQL, (setor,))
+
+def iter_rendered_batch(template: Dict[str, Any], users: List[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Renderiza um template para vários usuários, gerando uma linha NDJSON por usuário.
+    
+    O template é compilado uma única vez; cada linha é gerada sob demanda,
+    de modo que a resposta pode ser enviada enquanto é produzida.
+    
+    Args:
+        template: Template de assinatura (com id, template_html e updated_at)
+        users: Linhas retornadas por get_users_for_render
+        
+    Returns:
+        Iterador de linhas JSON terminadas em quebra de linha
+    """
+    compiled = get_compiled_template(
+        template["template_html"],
+        template_cache_key(template["id"], template.get("current_version_id"), template["updated_at"])
+    )
+    
+    for user in users:
+        if user["email"] is None:
+            item = {"email": user["request_email"], "html": None, "error": "Usuário não encontrado"}
+        else:
+            item = {"email": user["email"], "html": compiled.render(user)}
+        yield json.dumps(item, ensure_ascii=False) + "\n"
+
+# Salva um template como nova versão imutável (ou reaproveita a versão de mesmo
+# conteúdo) e move o ponteiro do template, tudo em uma única transação
+_SAVE_TEMPLATE_SQL = """
+SET NOCOUNT ON;
+DECLARE @name NVARCHAR(100) = ?;
+DECLARE @html NVARCHAR(MAX) = ?;
+DECLARE @is_default BIT = ?;
+DECLARE @hash CHAR(64) = ?;
+DECLARE @template_id INT, @version_id INT, @current_version_id INT, @current_default BIT;
+
+SELECT @template_id = [id], @current_version_id = [current_version_id], @current_default = [is_default]
+FROM [dbo].[signature_templates] WITH (UPDLOCK, HOLDLOCK)
+WHERE [name] = @name;
+
+IF @template_id IS NULL
+BEGIN
+    INSERT INTO [dbo].[signature_templates] ([name], [template_html], [is_default], [created_at], [updated_at])
+    VALUES (@name, @html, 0, GETDATE(), GETDATE());
+    SET @template_id = SCOPE_IDENTITY();
+END
+
+SELECT @version_id = [id]
+FROM [dbo].[signature_template_versions]
+WHERE [template_id] = @template_id AND [content_hash] = @hash;
+
+IF @version_id IS NULL
+BEGIN
+    INSERT INTO [dbo].[signature_template_versions] ([template_id], [content_hash], [template_html], [created_at])
+    VALUES (@template_id, @hash, @html, GETDATE());
+    SET @version_id = SCOPE_IDENTITY();
+END
+
+IF @version_id = @current_version_id AND @current_default = @is_default
+BEGIN
+    -- Nada mudou: mesmo conteúdo e mesmo status de padrão
+    SELECT @template_id AS template_id, CAST(0 AS BIT) AS changed;
+    RETURN;
+END
+
+IF @is_default = 1
+    UPDATE [dbo].[signature_templates] SET [is_default] = 0 WHERE [is_default] = 1 AND [id] <> @template_id;
+
+UPDATE [dbo].[signature_templates]
+SET [template_html] = @html,
+    [is_default] = @is_default,
+    [current_version_id] = @version_id,
+    [updated_at] = GETDATE()
+WHERE [id] = @template_id;
+
+SELECT @template_id AS template_id, CAST(1 AS BIT) AS changed;
+"""
+
+def template_content_hash(html: str) -> str:
+    """
+    Retorna o hash que identifica uma versão de template.
+    
+    É o SHA-256 do HTML em UTF-16LE, o mesmo valor calculado pelo SQL Server
+    com HASHBYTES('SHA2_256', CAST(html AS VARBINARY(MAX))).
+    """
+    return hashlib.sha256(html.encode("utf-16-le")).hexdigest()
 
 def save_signature_template(name: str, html: str, is_default: bool = False) -> int:
     """
     Salva um template de assinatura no banco de dados.
     
+    Cada conteúdo diferente vira uma versão imutável do template; salvar
+    apenas move o ponteiro do template para a versão correspondente.
+    
     Args:
         name: Nome do template
         html: HTML do template
@@ -153,47 +771,94 @@ def save_signature_template(name: str, html: str, is_default: bool = False) -> i
     Returns:
         ID do template salvo
     """
+    unknown = find_unknown_placeholders(html)
+    if unknown:
+        logger.warning(f"Template '{name}' contém variáveis desconhecidas: {', '.join(unknown)}")
+    
     try:
-        # Se for padrão, remove o padrão atual
-        if is_default:
-            db.execute_non_query("""
-            UPDATE [dbo].[signature_templates]
-            SET is_default = 0
-            WHERE is_default = 1
-            """)
-        
-        # Verifica se o template já existe
-        existing = db.execute_query("""
-        SELECT id FROM [dbo].[signature_templates]
-        WHERE name = ?
-        """, (name,))
+        with db.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(_SAVE_TEMPLATE_SQL, (name, html, 1 if is_default else 0, template_content_hash(html)))
+            template_id, changed = cursor.fetchone()
+            conn.commit()
         
-        if existing and len(existing) > 0:
-            # Atualiza o template existente
-            db.execute_non_query("""
-            UPDATE [dbo].[signature_templates]
-            SET template_html = ?, is_default = ?, updated_at = GETDATE()
-            WHERE name = ?
-            """, (html, 1 if is_default else 0, name))
-            return existing[0]["id"]
-        else:
-            # Insere novo template
-            db.execute_non_query("""
-            INSERT INTO [dbo].[signature_templates] (name, template_html, is_default, created_at, updated_at)
-            VALUES (?, ?, ?, GETDATE(), GETDATE())
-            """, (name, html, 1 if is_default else 0))
-            
-            # Obtém o ID do template inserido
-            result = db.execute_query("""
-            SELECT id FROM [dbo].[signature_templates]
-            WHERE name = ?
-            """, (name,))
-            
-            return result[0]["id"]
+        if changed:
+            invalidate_template_cache(template_id, default_changed=is_default)
+            template_rules.reload_if_references(template_id)
+            refresh_rendered_signatures(template_id=template_id, default_changed=is_default)
+        return template_id
     except Exception as e:
         logger.error(f"Erro ao salvar template de assinatura: {str(e)}")
         raise
 
+def get_template_versions(template_id: int) -> List[Dict[str, Any]]:
+    """
+    Obtém o histórico de versões de um template (sem o HTML), da mais recente para a mais antiga.
+    
+    Args:
+        template_id: ID do template
+        
+    Returns:
+        Lista de versões com id, hash, tamanho, data e se é a versão atual
+    """
+    return db.execute_query("""
+    SELECT v.id, v.template_id, v.content_hash, v.created_at,
+           ISNULL(DATALENGTH(v.template_html), 0) AS size,
+           CAST(CASE WHEN t.current_version_id = v.id THEN 1 ELSE 0 END AS BIT) AS is_current
+    FROM [dbo].[signature_template_versions] v
+    JOIN [dbo].[signature_templates] t ON t.id = v.template_id
+    WHERE v.template_id = ?
+    ORDER BY v.id DESC
+    """, (template_id,))
+
+def get_template_version(template_id: int, version_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Obtém uma versão de template com o HTML.
+    
+    Args:
+        template_id: ID do template
+        version_id: ID da versão
+        
+    Returns:
+        Versão ou None se não encontrada
+    """
+    results = db.execute_query("""
+    SELECT id, template_id, content_hash, template_html, created_at
+    FROM [dbo].[signature_template_versions]
+    WHERE id = ? AND template_id = ?
+    """, (version_id, template_id))
+    return results[0] if results else None
+
+def rollback_template(template_id: int, version_id: int) -> bool:
+    """
+    Volta um template para uma versão anterior, movendo o ponteiro da versão atual.
+    
+    Args:
+        template_id: ID do template
+        version_id: ID da versão a restaurar
+        
+    Returns:
+        True se bem sucedido, False se a versão não pertencer ao template
+    """
+    updated = db.execute_non_query("""
+    UPDATE t
+    SET t.template_html = v.template_html,
+        t.current_version_id = v.id,
+        t.updated_at = GETDATE()
+    FROM [dbo].[signature_templates] t
+    JOIN [dbo].[signature_template_versions] v ON v.template_id = t.id
+    WHERE t.id = ? AND v.id = ?
+    """, (template_id, version_id))
+    
+    if not updated:
+        return False
+    
+    invalidate_template_cache(template_id)
+    template_rules.reload_if_references(template_id)
+    refresh_rendered_signatures(template_id=template_id)
+    logger.info(f"Template {template_id} restaurado para a versão {version_id}")
+    return True
+
 def get_all_templates() -> List[Dict[str, Any]]:
     """
     Obtém todos os templates de assinatura.
@@ -210,6 +875,87 @@ def get_all_templates() -> List[Dict[str, Any]]:
         logger.error(f"Erro ao obter templates de assinatura: {str(e)}")
         return []
 
+def get_template_by_id(template_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Obtém um template de assinatura pelo ID, com cache em memória.
+    
+    Args:
+        template_id: ID do template
+        
+    Returns:
+        Template ou None se não encontrado
+    """
+    template = _template_cache.get(template_id)
+    if template is not None:
+        return template
+    
+    results = db.execute_query("""
+    SELECT * FROM [dbo].[signature_templates]
+    WHERE id = ?
+    """, (template_id,))
+    
+    if not results:
+        return None
+    
+    _template_cache.set(template_id, results[0])
+    return results[0]
+
+def _encode_template_cursor(template: Dict[str, Any]) -> str:
+    """Codifica a posição de um template na ordenação da listagem"""
+    key = [1 if template["is_default"] else 0, template["name"], template["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+def _decode_template_cursor(cursor: str) -> tuple:
+    """
+    Decodifica um cursor gerado por _encode_template_cursor.
+    
+    Raises:
+        ValueError: Se o cursor for inválido
+    """
+    try:
+        is_default, name, template_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return int(is_default), str(name), int(template_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
+
+def list_template_summaries(limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Lista os templates sem o HTML, com paginação por chave (keyset).
+    
+    A ordem é a mesma de get_all_templates (padrão primeiro, depois por nome);
+    cada página continua a partir da última linha da anterior, sem OFFSET.
+    
+    Args:
+        limit: Quantidade máxima de templates na página
+        cursor: Cursor retornado pela página anterior (opcional)
+        
+    Returns:
+        Dicionário com "items" (id, name, is_default, created_at, updated_at, size)
+        e "next_cursor" (None na última página)
+        
+    Raises:
+        ValueError: Se o cursor for inválido
+    """
+    where = ""
+    params: List[Any] = [limit + 1]
+    if cursor:
+        is_default, name, template_id = _decode_template_cursor(cursor)
+        where = """
+    WHERE is_default < ?
+       OR (is_default = ? AND (name > ? OR (name = ? AND id > ?)))"""
+        params.extend([is_default, is_default, name, name, template_id])
+    
+    rows = db.execute_query(f"""
+    SELECT TOP (?) id, name, is_default, created_at, updated_at,
+           ISNULL(DATALENGTH(template_html), 0) AS size
+    FROM [dbo].[signature_templates]{where}
+    ORDER BY is_default DESC, name ASC, id ASC
+    """, tuple(params))
+    
+    items = rows[:limit]
+    next_cursor = _encode_template_cursor(items[-1]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
 def assign_signature_to_user(user_email: str, template_id: int, custom_html: Optional[str] = None) -> bool:
     """
     Atribui uma assinatura a um usuário.
@@ -217,7 +963,7 @@ def assign_signature_to_user(user_email: str, template_id: int, custom_html: Opt
     Args:
         user_email: E-mail do usuário
         template_id: ID do template de assinatura
-        custom_html: HTML personalizado (opcional)
+        custom_html: HTML personalizado (opcional; substitui o HTML do template)
         
     Returns:
         True se bem sucedido, False caso contrário
@@ -229,20 +975,13 @@ def assign_signature_to_user(user_email: str, template_id: int, custom_html: Opt
         WHERE user_email = ?
         """, (user_email,))
         
-        if custom_html is None:
-            # Obtém o HTML do template
-            template = db.execute_query("""
-            SELECT template_html FROM [dbo].[signature_templates]
-            WHERE id = ?
-            """, (template_id,))
-            
-            if not template or len(template) == 0:
-                logger.error(f"Template ID {template_id} não encontrado")
-                return False
-            
-            signature_html = template[0]["template_html"]
-        else:
-            signature_html = custom_html
+        if get_template_by_id(template_id) is None:
+            logger.error(f"Template ID {template_id} não encontrado")
+            return False
+        
+        # Sem HTML personalizado a assinatura apenas referencia o template,
+        # de modo que alterações no template valem imediatamente para o usuário
+        signature_html = custom_html if custom_html and custom_html.strip() else None
         
         if existing and len(existing) > 0:
             # Atualiza a assinatura existente
@@ -258,7 +997,108 @@ def assign_signature_to_user(user_email: str, template_id: int, custom_html: Opt
             VALUES (?, ?, ?, GETDATE(), GETDATE())
             """, (user_email, signature_html, template_id))
         
+        refresh_rendered_signatures([user_email])
         return True
     except Exception as e:
         logger.error(f"Erro ao atribuir assinatura ao usuário {user_email}: {str(e)}")
         return False
+
+# Atribuição em massa: os e-mails de {source} passam a referenciar o template
+# (sem HTML personalizado) em um único MERGE
+_BULK_ASSIGN_SQL = """
+SET NOCOUNT ON;
+DECLARE @targets TABLE (email NVARCHAR(255) PRIMARY KEY);
+DECLARE @changes TABLE ([action] NVARCHAR(10), email NVARCHAR(255));
+
+INSERT INTO @targets (email)
+{source};
+
+MERGE [dbo].[signatures] WITH (HOLDLOCK) AS target
+USING (
+    SELECT tg.email, t.[id] AS template_id
+    FROM @targets tg
+    CROSS JOIN [dbo].[signature_templates] t
+    WHERE t.[id] = ?
+) AS source
+ON target.[user_email] = source.email
+WHEN MATCHED AND (target.[template_id] <> source.template_id OR target.[signature_html] IS NOT NULL) THEN
+    UPDATE SET
+        [signature_html] = NULL,
+        [template_id] = source.template_id,
+        [updated_at] = GETDATE()
+WHEN NOT MATCHED BY TARGET THEN
+    INSERT ([user_email], [signature_html], [template_id], [created_at], [updated_at])
+    VALUES (source.email, NULL, source.template_id, GETDATE(), GETDATE())
+OUTPUT $action, inserted.[user_email] INTO @changes;
+
+SELECT
+    ISNULL(SUM(CASE WHEN [action] = 'INSERT' THEN 1 ELSE 0 END), 0) AS inserted,
+    ISNULL(SUM(CASE WHEN [action] = 'UPDATE' THEN 1 ELSE 0 END), 0) AS updated,
+    (SELECT COUNT(*) FROM @targets) AS total;
+
+SELECT email FROM @changes;
+"""
+
+def bulk_assign_signatures(
+    template_id: int,
+    emails: Optional[List[str]] = None,
+    setor: Optional[str] = None,
+    empresa: Optional[str] = None,
+    all_users: bool = False
+) -> Optional[Dict[str, int]]:
+    """
+    Atribui um template a vários usuários com uma única instrução, em uma transação.
+    
+    Os usuários são selecionados por lista de e-mails, por setor e/ou empresa
+    ou, com all_users, todos os usuários cadastrados.
+    
+    Args:
+        template_id: ID do template de assinatura
+        emails: Lista de e-mails
+        setor: Setor dos usuários
+        empresa: Empresa dos usuários
+        all_users: Atribui a todos os usuários
+        
+    Returns:
+        Contagens de assinaturas inseridas, atualizadas e inalteradas,
+        ou None se o template não existir
+    """
+    if emails is not None:
+        source = "SELECT DISTINCT CAST([value] AS NVARCHAR(255)) FROM OPENJSON(?)"
+        params: List[Any] = [json.dumps(emails)]
+    else:
+        conditions = []
+        params = []
+        if setor is not None:
+            conditions.append("[setor] = ?")
+            params.append(setor)
+        if empresa is not None:
+            conditions.append("[empresa] = ?")
+            params.append(empresa)
+        if not conditions and not all_users:
+            raise ValueError("Nenhum filtro de usuários informado")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        source = f"SELECT DISTINCT [email] FROM [dbo].[users]{where}"
+    
+    if get_template_by_id(template_id) is None:
+        logger.error(f"Template ID {template_id} não encontrado")
+        return None
+    
+    with db.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(_BULK_ASSIGN_SQL.format(source=source), (*params, template_id))
+        inserted, updated, total = cursor.fetchone()
+        cursor.nextset()
+        changed_emails = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+    
+    refresh_rendered_signatures(changed_emails)
+    
+    stats = {
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": total - inserted - updated,
+        "total": total
+    }
+    logger.info(f"Template {template_id} atribuído em massa: {stats}")
+    return stats
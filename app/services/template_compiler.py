@@ -0,0 +1,141 @@
+"""
+Compilação de templates de assinatura em segmentos literais e variáveis
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Hashable, Optional
+
+# Variáveis aceitas nos templates e suas colunas na tabela users
+VARIABLE_COLUMNS = {
+    "NomeCompleto": "nome_completo",
+    "Cargo": "cargo",
+    "Setor": "setor",
+    "Empresa": "empresa",
+    "Telefone": "telefone",
+    "Ramal": "ramal",
+    "Email": "email"
+}
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+
+# Quantidade máxima de templates compilados mantidos em memória
+COMPILED_CACHE_SIZE = 256
+
+
+class CompiledTemplate:
+    """
+    Template pré-processado: uma lista de trechos literais intercalados com as
+    colunas que devem ser inseridas entre eles.
+
+    Há sempre um literal a mais que o número de variáveis, de modo que a
+    renderização é um único join sobre o resultado.
+    """
+
+    __slots__ = ("literals", "slots", "columns")
+
+    def __init__(self, literals: List[str], slots: List[str]):
+        self.literals = literals
+        self.slots = slots
+        self.columns = tuple(dict.fromkeys(slots))
+
+    def render(self, user_data: Dict[str, Any]) -> str:
+        """
+        Renderiza o template com os dados do usuário.
+
+        Args:
+            user_data: Dicionário com os dados do usuário (colunas da tabela users)
+
+        Returns:
+            HTML com as variáveis substituídas
+        """
+        if not self.slots:
+            return self.literals[0]
+
+        values = {}
+        for column in self.columns:
+            value = user_data.get(column)
+            values[column] = str(value) if value is not None else ""
+
+        parts = [None] * (len(self.literals) + len(self.slots))
+        parts[0::2] = self.literals
+        parts[1::2] = [values[column] for column in self.slots]
+        return "".join(parts)
+
+
+def compile_template(template_html: str) -> CompiledTemplate:
+    """
+    Compila um template HTML em segmentos literais e variáveis.
+
+    Placeholders desconhecidos são mantidos como texto literal.
+
+    Args:
+        template_html: Template HTML com variáveis como {{NomeCompleto}}
+
+    Returns:
+        Template compilado
+    """
+    literals = []
+    slots = []
+    position = 0
+
+    for match in PLACEHOLDER_PATTERN.finditer(template_html):
+        column = VARIABLE_COLUMNS.get(match.group(1))
+        if column is None:
+            # Desconhecido: permanece dentro do trecho literal atual
+            continue
+        literals.append(template_html[position:match.start()])
+        slots.append(column)
+        position = match.end()
+
+    literals.append(template_html[position:])
+    return CompiledTemplate(literals, slots)
+
+
+def find_unknown_placeholders(template_html: str) -> List[str]:
+    """
+    Lista os placeholders {{...}} do template que não correspondem a nenhuma variável conhecida.
+
+    Args:
+        template_html: Template HTML
+
+    Returns:
+        Nomes dos placeholders desconhecidos, sem repetição
+    """
+    names = dict.fromkeys(match.group(1) for match in PLACEHOLDER_PATTERN.finditer(template_html))
+    return [name for name in names if name not in VARIABLE_COLUMNS]
+
+
+_compiled_cache: "OrderedDict[Hashable, CompiledTemplate]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_compiled_template(template_html: str, cache_key: Optional[Hashable] = None) -> CompiledTemplate:
+    """
+    Obtém o template compilado, compilando-o apenas na primeira vez.
+
+    Args:
+        template_html: Template HTML
+        cache_key: Chave de versão do template (ex.: id + updated_at). Sem chave,
+                   o próprio conteúdo do template é usado como chave.
+
+    Returns:
+        Template compilado
+    """
+    key = cache_key if cache_key is not None else template_html
+
+    with _cache_lock:
+        compiled = _compiled_cache.get(key)
+        if compiled is not None:
+            _compiled_cache.move_to_end(key)
+            return compiled
+
+    compiled = compile_template(template_html)
+
+    with _cache_lock:
+        _compiled_cache[key] = compiled
+        _compiled_cache.move_to_end(key)
+        while len(_compiled_cache) > COMPILED_CACHE_SIZE:
+            _compiled_cache.popitem(last=False)
+
+    return compiled
@@ -0,0 +1,336 @@
+"""
+Regras de atribuição de templates (por domínio do e-mail, empresa, setor e cargo)
+avaliadas em memória
+"""
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from .. import db
+from ..config import TEMPLATE_RULES_REFRESH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Critérios aceitos nas regras, na ordem usada para escolher a chave de indexação
+RULE_CRITERIA = ("email_domain", "empresa", "setor", "cargo")
+
+_RULES_SQL = """
+SELECT
+    r.[id],
+    r.[priority],
+    r.[email_domain],
+    r.[empresa],
+    r.[setor],
+    r.[cargo],
+    r.[template_id],
+    t.[template_html],
+    t.[current_version_id],
+    t.[updated_at] AS template_updated_at
+FROM [dbo].[signature_template_rules] r
+JOIN [dbo].[signature_templates] t ON t.[id] = r.[template_id]
+WHERE r.[is_active] = 1
+ORDER BY r.[priority] ASC, r.[id] ASC
+"""
+
+# Versão das regras ativas e dos templates que elas referenciam: qualquer
+# inclusão, remoção ou alteração muda a contagem ou uma das datas
+_RULES_VERSION_SQL = """
+SELECT
+    COUNT(*) AS rule_count,
+    MAX(r.[updated_at]) AS rules_updated_at,
+    MAX(t.[updated_at]) AS templates_updated_at
+FROM [dbo].[signature_template_rules] r
+JOIN [dbo].[signature_templates] t ON t.[id] = r.[template_id]
+WHERE r.[is_active] = 1
+"""
+
+
+def normalize_value(value: Any) -> Optional[str]:
+    """Normaliza um valor para comparação (sem espaços nas pontas e sem distinção de maiúsculas)"""
+    if value is None:
+        return None
+    value = str(value).strip().casefold()
+    return value or None
+
+
+def user_criteria(email: str, user_data: Optional[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+    """
+    Extrai os valores usados na avaliação das regras.
+
+    Args:
+        email: E-mail do usuário
+        user_data: Dados do usuário (colunas da tabela users) ou None
+
+    Returns:
+        Dicionário critério -> valor normalizado
+    """
+    user_data = user_data or {}
+    return {
+        "email_domain": normalize_value(email.rsplit("@", 1)[1]) if "@" in email else None,
+        "empresa": normalize_value(user_data.get("empresa")),
+        "setor": normalize_value(user_data.get("setor")),
+        "cargo": normalize_value(user_data.get("cargo"))
+    }
+
+
+class TemplateRule:
+    """Regra compilada: todos os critérios preenchidos precisam coincidir"""
+
+    __slots__ = ("id", "position", "conditions", "template")
+
+    def __init__(self, row: Dict[str, Any], position: int):
+        self.id = row["id"]
+        self.position = position
+        self.conditions = {
+            name: normalize_value(row[name]) for name in RULE_CRITERIA if normalize_value(row[name]) is not None
+        }
+        self.template = {
+            "id": row["template_id"],
+            "template_html": row["template_html"],
+            "current_version_id": row["current_version_id"],
+            "updated_at": row["template_updated_at"]
+        }
+
+    def matches(self, criteria: Dict[str, Optional[str]]) -> bool:
+        return all(criteria.get(name) == value for name, value in self.conditions.items())
+
+
+class RuleIndex:
+    """
+    Índice de decisão das regras.
+
+    Cada regra é indexada pelo primeiro critério que define; a busca consulta
+    apenas as regras cujo critério de indexação coincide com o usuário (mais as
+    regras sem critério) e devolve a de menor posição que coincide por inteiro.
+    """
+
+    def __init__(self, rules: List[TemplateRule], version: Optional[Tuple] = None):
+        self.rules = rules
+        self.version = version
+        self.template_ids = {rule.template["id"] for rule in rules}
+        self._by_criterion: Dict[str, Dict[str, List[TemplateRule]]] = {name: {} for name in RULE_CRITERIA}
+        self._catch_all: List[TemplateRule] = []
+
+        for rule in rules:
+            key = next((name for name in RULE_CRITERIA if name in rule.conditions), None)
+            if key is None:
+                self._catch_all.append(rule)
+            else:
+                self._by_criterion[key].setdefault(rule.conditions[key], []).append(rule)
+
+    def match(self, criteria: Dict[str, Optional[str]]) -> Optional[TemplateRule]:
+        """
+        Encontra a primeira regra (por prioridade) que se aplica ao usuário.
+
+        Args:
+            criteria: Valores retornados por user_criteria
+
+        Returns:
+            Regra encontrada ou None
+        """
+        best = None
+        candidates = [self._catch_all]
+        for name in RULE_CRITERIA:
+            value = criteria.get(name)
+            if value is not None:
+                candidates.append(self._by_criterion[name].get(value, ()))
+
+        for bucket in candidates:
+            # As listas estão em ordem de prioridade: basta a primeira que coincide
+            for rule in bucket:
+                if best is not None and rule.position >= best.position:
+                    break
+                if rule.matches(criteria):
+                    best = rule
+                    break
+        return best
+
+
+_index: Optional[RuleIndex] = None
+_index_lock = threading.Lock()
+
+
+def _rules_version() -> Tuple:
+    """Lê a versão atual das regras ativas no banco"""
+    row = db.execute_query(_RULES_VERSION_SQL)[0]
+    return (row["rule_count"], row["rules_updated_at"], row["templates_updated_at"])
+
+
+def load_rules(version: Optional[Tuple] = None) -> RuleIndex:
+    """
+    Carrega as regras ativas do banco e recompila o índice em memória.
+
+    Deve ser chamada na inicialização e após qualquer alteração nas regras
+    ou nos templates que elas referenciam.
+
+    Args:
+        version: Versão já lida com _rules_version (lida aqui se omitida)
+
+    Returns:
+        Índice compilado
+    """
+    global _index
+    # A versão é lida antes das regras: uma alteração entre as duas leituras
+    # apenas provoca mais uma recarga na próxima verificação
+    if version is None:
+        version = _rules_version()
+    rows = db.execute_query(_RULES_SQL)
+    index = RuleIndex([TemplateRule(row, position) for position, row in enumerate(rows)], version)
+    with _index_lock:
+        _index = index
+    logger.info(f"{len(index.rules)} regras de template carregadas")
+    return index
+
+
+def get_rule_index() -> RuleIndex:
+    """Retorna o índice atual, carregando-o na primeira chamada"""
+    index = _index
+    if index is None:
+        with _index_lock:
+            index = _index
+        if index is None:
+            index = load_rules()
+    return index
+
+
+def reload_if_changed() -> bool:
+    """
+    Recompila o índice se as regras ou os templates referenciados mudaram
+    (inclusive por outro processo) desde o último carregamento.
+
+    Chamada uma vez por rematerialização (antes de todos os lotes), para que um
+    processo com o índice desatualizado não regrave as assinaturas com o template
+    errado, e periodicamente por run_rules_refresher. A leitura de uma assinatura
+    ainda não materializada não faz a verificação: usa o índice atual.
+
+    Returns:
+        True se o índice foi recarregado
+    """
+    version = _rules_version()
+    index = _index
+    if index is not None and index.version == version:
+        return False
+    load_rules(version)
+    return True
+
+
+async def run_rules_refresher(interval: float = TEMPLATE_RULES_REFRESH_INTERVAL) -> None:
+    """
+    Laço de verificação periódica das regras (iniciado no lifespan).
+
+    Uma alteração feita em outro processo passa a valer aqui em até `interval`
+    segundos; em caso de erro, o último índice carregado continua em uso.
+
+    Args:
+        interval: Segundos entre duas verificações
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await db.run_in_db_executor(reload_if_changed)
+        except Exception as e:
+            logger.error(f"Erro ao recarregar as regras de template: {str(e)}")
+
+
+def reload_if_references(template_id: int) -> None:
+    """Recompila o índice se alguma regra usar o template alterado"""
+    index = _index
+    if index is not None and template_id in index.template_ids:
+        load_rules()
+
+
+def match_template(email: str, user_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Resolve, sem consultar o banco, o template definido pelas regras para um usuário.
+
+    Args:
+        email: E-mail do usuário
+        user_data: Dados do usuário ou None
+
+    Returns:
+        Template (id, template_html, current_version_id, updated_at) com
+        "rule_id", ou None se nenhuma regra se aplicar
+    """
+    rule = get_rule_index().match(user_criteria(email, user_data))
+    if rule is None:
+        return None
+    return {**rule.template, "rule_id": rule.id}
+
+
+def get_rules() -> List[Dict[str, Any]]:
+    """
+    Obtém todas as regras cadastradas, na ordem de avaliação.
+
+    Returns:
+        Lista de regras
+    """
+    return db.execute_query("""
+    SELECT * FROM [dbo].[signature_template_rules]
+    ORDER BY priority ASC, id ASC
+    """)
+
+
+def save_rule(rule: Dict[str, Any], rule_id: Optional[int] = None) -> Optional[int]:
+    """
+    Cria ou atualiza uma regra e recompila o índice.
+
+    Args:
+        rule: Campos da regra (priority, template_id, email_domain, empresa, setor, cargo, is_active)
+        rule_id: ID da regra a atualizar (None para criar)
+
+    Returns:
+        ID da regra, ou None se a regra a atualizar não existir
+    """
+    params = (
+        rule["priority"],
+        rule["template_id"],
+        rule.get("email_domain"),
+        rule.get("empresa"),
+        rule.get("setor"),
+        rule.get("cargo"),
+        1 if rule.get("is_active", True) else 0
+    )
+
+    if rule_id is None:
+        with db.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+            INSERT INTO [dbo].[signature_template_rules]
+                (priority, template_id, email_domain, empresa, setor, cargo, is_active, created_at, updated_at)
+            OUTPUT inserted.id
+            VALUES (?, ?, ?, ?, ?, ?, ?, GETDATE(), GETDATE())
+            """, params)
+            rule_id = cursor.fetchone()[0]
+            conn.commit()
+    else:
+        updated = db.execute_non_query("""
+        UPDATE [dbo].[signature_template_rules]
+        SET priority = ?, template_id = ?, email_domain = ?, empresa = ?, setor = ?, cargo = ?,
+            is_active = ?, updated_at = GETDATE()
+        WHERE id = ?
+        """, (*params, rule_id))
+        if not updated:
+            return None
+
+    load_rules()
+    return rule_id
+
+
+def delete_rule(rule_id: int) -> bool:
+    """
+    Remove uma regra e recompila o índice.
+
+    Args:
+        rule_id: ID da regra
+
+    Returns:
+        True se a regra existia
+    """
+    deleted = db.execute_non_query("""
+    DELETE FROM [dbo].[signature_template_rules]
+    WHERE id = ?
+    """, (rule_id,))
+    if deleted:
+        load_rules()
+    return bool(deleted)
@@ -0,0 +1,39 @@
+/*
+ * Busca da assinatura do add-in com revalidação por ETag.
+ * Compartilhado por addin/index.html e addin/functions.html.
+ */
+
+// Busca a assinatura enviando o ETag da cópia local; em 304 a cópia é reaproveitada
+function fetchSignature(baseUrl, userEmail) {
+    const storageKey = `signature:${userEmail.toLowerCase()}`;
+    let stored = null;
+    try {
+        stored = JSON.parse(localStorage.getItem(storageKey));
+    } catch (e) {
+        stored = null;
+    }
+
+    const headers = {};
+    if (stored && stored.etag) {
+        headers['If-None-Match'] = stored.etag;
+    }
+
+    return fetch(`${baseUrl}/api/signature?email=${encodeURIComponent(userEmail)}`, { headers: headers, cache: 'no-store' })
+        .then(response => {
+            if (response.status === 304 && stored) {
+                return stored.html;
+            }
+
+            const etag = response.headers.get('ETag');
+            return response.text().then(signatureHtml => {
+                if (response.ok && etag) {
+                    try {
+                        localStorage.setItem(storageKey, JSON.stringify({ etag: etag, html: signatureHtml }));
+                    } catch (e) {
+                        // Armazenamento indisponível: segue sem cópia local
+                    }
+                }
+                return signatureHtml;
+            });
+        });
+}
@@ -0,0 +1,40 @@
+/*
+ * Carregamento paginado do resumo dos templates (sem o HTML).
+ * Compartilhado por admin/users.html e admin/signatures.html.
+ */
+
+// Carrega o resumo de todos os templates, página por página; retorna null se a sessão expirou
+async function fetchTemplateSummaries(baseUrl) {
+    const templates = [];
+    let cursor = null;
+
+    do {
+        const params = new URLSearchParams({ limit: '200' });
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+
+        const response = await fetch(`${baseUrl}/api/templates/summary?${params}`, {
+            method: 'GET',
+            credentials: 'include',
+            headers: {
+                'Accept': 'application/json'
+            }
+        });
+
+        if (response.status === 401) {
+            console.error('Não autorizado, redirecionando para login');
+            window.location.href = "/admin/login";
+            return null;
+        }
+        if (!response.ok) {
+            throw new Error(`Erro ${response.status}: ${response.statusText}`);
+        }
+
+        const page = await response.json();
+        templates.push(...page.items);
+        cursor = page.next_cursor;
+    } while (cursor);
+
+    return templates;
+}
@@ -175,7 +175,7 @@ BEGIN
     CREATE TABLE [dbo].[signatures] (
         [id] INT IDENTITY(1,1) NOT NULL,
         [user_email] NVARCHAR(255) NOT NULL, -- Chave lógica para a tabela users
-        [signature_html] NVARCHAR(MAX) NOT NULL, -- HTML final (renderizado ou personalizado)
+        [signature_html] NVARCHAR(MAX) NULL, -- HTML personalizado (NULL = usa o template referenciado)
         [template_id] INT NOT NULL, -- FK para signature_templates
         [created_at] DATETIME NOT NULL DEFAULT GETDATE(),
         [updated_at] DATETIME NOT NULL DEFAULT GETDATE(),
@@ -260,6 +260,242 @@ BEGIN
 END
 GO
 
+-- Tabela de estado da sincronização com o Microsoft Graph (ex.: deltaLink de users/delta)
+IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[graph_sync_state]') AND type in (N'U'))
+BEGIN
+    CREATE TABLE [dbo].[graph_sync_state] (
+        [name] NVARCHAR(50) NOT NULL, -- Identificador da sincronização (ex: users_delta)
+        [delta_link] NVARCHAR(MAX) NULL, -- @odata.deltaLink retornado na última rodada
+        [updated_at] DATETIME NOT NULL DEFAULT GETDATE(),
+
+        CONSTRAINT [PK_graph_sync_state] PRIMARY KEY CLUSTERED ([name] ASC)
+    );
+
+    PRINT 'Tabela [dbo].[graph_sync_state] criada com sucesso.';
+END
+ELSE
+BEGIN
+    PRINT 'Tabela [dbo].[graph_sync_state] já existe.';
+END
+GO
+
+-- Tabela de assinaturas já renderizadas (materializadas a cada escrita que altera o resultado)
+IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[rendered_signatures]') AND type in (N'U'))
+BEGIN
+    CREATE TABLE [dbo].[rendered_signatures] (
+        [user_email] NVARCHAR(255) NOT NULL, -- E-mail do usuário (chave de leitura do add-in)
+        [signature_html] NVARCHAR(MAX) NOT NULL, -- HTML final, pronto para envio
+        [content_hash] CHAR(64) NOT NULL, -- SHA-256 do HTML (base do ETag)
+        [template_id] INT NULL, -- Template de origem
+        [uses_default] BIT NOT NULL DEFAULT 0, -- 1 se renderizada a partir do template padrão
+        [setor] NVARCHAR(100) NULL, -- Setor do usuário (público das campanhas)
+        [empresa] NVARCHAR(100) NULL, -- Empresa do usuário (público das campanhas)
+        [updated_at] DATETIME NOT NULL DEFAULT GETDATE(),
+
+        CONSTRAINT [PK_rendered_signatures] PRIMARY KEY CLUSTERED ([user_email] ASC)
+    );
+
+    -- Criar índices
+    CREATE NONCLUSTERED INDEX [IDX_rendered_signatures_template_id] ON [dbo].[rendered_signatures] ([template_id]);
+
+    PRINT 'Tabela [dbo].[rendered_signatures] criada com sucesso.';
+END
+ELSE
+BEGIN
+    PRINT 'Tabela [dbo].[rendered_signatures] já existe.';
+END
+GO
+
+-- Migração: assinaturas passam a referenciar o template (signature_html só para HTML personalizado)
+IF EXISTS (
+    SELECT * FROM sys.columns
+    WHERE object_id = OBJECT_ID(N'[dbo].[signatures]') AND name = N'signature_html' AND is_nullable = 0
+)
+BEGIN
+    ALTER TABLE [dbo].[signatures] ALTER COLUMN [signature_html] NVARCHAR(MAX) NULL;
+    PRINT 'Coluna [dbo].[signatures].[signature_html] alterada para aceitar NULL.';
+END
+GO
+
+-- Remove as cópias idênticas ao template atual (as demais são mantidas como HTML personalizado)
+UPDATE s
+SET s.[signature_html] = NULL
+FROM [dbo].[signatures] s
+JOIN [dbo].[signature_templates] t ON t.[id] = s.[template_id]
+WHERE s.[signature_html] = t.[template_html];
+PRINT CAST(@@ROWCOUNT AS NVARCHAR(20)) + ' cópias de template removidas de [dbo].[signatures].';
+GO
+
+-- Tabela de versões imutáveis dos templates (identificadas pelo hash do conteúdo)
+IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[signature_template_versions]') AND type in (N'U'))
+BEGIN
+    CREATE TABLE [dbo].[signature_template_versions] (
+        [id] INT IDENTITY(1,1) NOT NULL,
+        [template_id] INT NOT NULL, -- FK para signature_templates
+        [content_hash] CHAR(64) NOT NULL, -- SHA-256 (hexadecimal) do HTML em UTF-16LE, como no HASHBYTES
+        [template_html] NVARCHAR(MAX) NOT NULL, -- Conteúdo da versão (nunca alterado)
+        [created_at] DATETIME NOT NULL DEFAULT GETDATE(),
+
+        CONSTRAINT [PK_signature_template_versions] PRIMARY KEY CLUSTERED ([id] ASC),
+        CONSTRAINT [UQ_signature_template_versions_hash] UNIQUE NONCLUSTERED ([template_id] ASC, [content_hash] ASC),
+        CONSTRAINT [FK_signature_template_versions_template_id] FOREIGN KEY ([template_id]) REFERENCES [dbo].[signature_templates] ([id]) ON DELETE CASCADE
+    );
+
+    PRINT 'Tabela [dbo].[signature_template_versions] criada com sucesso.';
+END
+ELSE
+BEGIN
+    PRINT 'Tabela [dbo].[signature_template_versions] já existe.';
+END
+GO
+
+-- Migração: templates passam a apontar para a versão atual (template_html é mantido como cópia dela)
+IF NOT EXISTS (
+    SELECT * FROM sys.columns
+    WHERE object_id = OBJECT_ID(N'[dbo].[signature_templates]') AND name = N'current_version_id'
+)
+BEGIN
+    ALTER TABLE [dbo].[signature_templates] ADD [current_version_id] INT NULL;
+    PRINT 'Coluna [dbo].[signature_templates].[current_version_id] criada.';
+END
+GO
+
+-- Cria a versão inicial dos templates que ainda não têm versão
+INSERT INTO [dbo].[signature_template_versions] ([template_id], [content_hash], [template_html], [created_at])
+SELECT t.[id], LOWER(CONVERT(CHAR(64), HASHBYTES('SHA2_256', CAST(t.[template_html] AS VARBINARY(MAX))), 2)), t.[template_html], t.[updated_at]
+FROM [dbo].[signature_templates] t
+WHERE t.[current_version_id] IS NULL
+  AND NOT EXISTS (
+      SELECT 1 FROM [dbo].[signature_template_versions] v
+      WHERE v.[template_id] = t.[id]
+        AND v.[content_hash] = LOWER(CONVERT(CHAR(64), HASHBYTES('SHA2_256', CAST(t.[template_html] AS VARBINARY(MAX))), 2))
+  );
+
+UPDATE t
+SET t.[current_version_id] = v.[id]
+FROM [dbo].[signature_templates] t
+JOIN [dbo].[signature_template_versions] v
+  ON v.[template_id] = t.[id]
+ AND v.[content_hash] = LOWER(CONVERT(CHAR(64), HASHBYTES('SHA2_256', CAST(t.[template_html] AS VARBINARY(MAX))), 2))
+WHERE t.[current_version_id] IS NULL;
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.foreign_keys WHERE name = N'FK_signature_templates_current_version_id')
+BEGIN
+    ALTER TABLE [dbo].[signature_templates] ADD CONSTRAINT [FK_signature_templates_current_version_id]
+        FOREIGN KEY ([current_version_id]) REFERENCES [dbo].[signature_template_versions] ([id]);
+    PRINT 'FK [FK_signature_templates_current_version_id] criada.';
+END
+GO
+
+-- Tabela de regras de atribuição de templates (avaliadas por prioridade; critérios nulos não restringem)
+IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[signature_template_rules]') AND type in (N'U'))
+BEGIN
+    CREATE TABLE [dbo].[signature_template_rules] (
+        [id] INT IDENTITY(1,1) NOT NULL,
+        [priority] INT NOT NULL DEFAULT 100, -- Menor valor = avaliada primeiro
+        [template_id] INT NOT NULL, -- FK para signature_templates
+        [email_domain] NVARCHAR(255) NULL, -- Ex: hoffmanndh.com
+        [empresa] NVARCHAR(100) NULL,
+        [setor] NVARCHAR(100) NULL,
+        [cargo] NVARCHAR(100) NULL,
+        [is_active] BIT NOT NULL DEFAULT 1,
+        [created_at] DATETIME NOT NULL DEFAULT GETDATE(),
+        [updated_at] DATETIME NOT NULL DEFAULT GETDATE(),
+
+        CONSTRAINT [PK_signature_template_rules] PRIMARY KEY CLUSTERED ([id] ASC),
+        CONSTRAINT [FK_signature_template_rules_template_id] FOREIGN KEY ([template_id]) REFERENCES [dbo].[signature_templates] ([id]) ON DELETE CASCADE
+    );
+
+    -- Criar índices
+    CREATE NONCLUSTERED INDEX [IDX_signature_template_rules_priority] ON [dbo].[signature_template_rules] ([priority], [id]);
+
+    PRINT 'Tabela [dbo].[signature_template_rules] criada com sucesso.';
+END
+ELSE
+BEGIN
+    PRINT 'Tabela [dbo].[signature_template_rules] já existe.';
+END
+GO
+
+-- Migração: setor e empresa nas assinaturas materializadas (avaliação do público das campanhas sem consultas extras)
+IF NOT EXISTS (
+    SELECT * FROM sys.columns
+    WHERE object_id = OBJECT_ID(N'[dbo].[rendered_signatures]') AND name = N'setor'
+)
+BEGIN
+    ALTER TABLE [dbo].[rendered_signatures] ADD [setor] NVARCHAR(100) NULL, [empresa] NVARCHAR(100) NULL;
+    PRINT 'Colunas [setor] e [empresa] criadas em [dbo].[rendered_signatures].';
+END
+GO
+
+-- Tabela de campanhas (banners anexados às assinaturas durante um período)
+IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[signature_campaigns]') AND type in (N'U'))
+BEGIN
+    CREATE TABLE [dbo].[signature_campaigns] (
+        [id] INT IDENTITY(1,1) NOT NULL,
+        [name] NVARCHAR(100) NOT NULL,
+        [banner_html] NVARCHAR(MAX) NOT NULL, -- HTML anexado ao final da assinatura
+        [starts_at] DATETIME NOT NULL, -- Início da exibição (inclusive)
+        [ends_at] DATETIME NOT NULL, -- Fim da exibição (exclusive)
+        [email_domain] NVARCHAR(255) NULL, -- Público: domínio do e-mail (NULL = todos)
+        [empresa] NVARCHAR(100) NULL, -- Público: empresa (NULL = todas)
+        [setor] NVARCHAR(100) NULL, -- Público: setor (NULL = todos)
+        [priority] INT NOT NULL DEFAULT 100, -- Ordem dos banners (menor valor primeiro)
+        [is_active] BIT NOT NULL DEFAULT 1,
+        [created_at] DATETIME NOT NULL DEFAULT GETDATE(),
+        [updated_at] DATETIME NOT NULL DEFAULT GETDATE(),
+
+        CONSTRAINT [PK_signature_campaigns] PRIMARY KEY CLUSTERED ([id] ASC),
+        CONSTRAINT [CK_signature_campaigns_window] CHECK ([ends_at] > [starts_at])
+    );
+
+    -- Criar índices
+    CREATE NONCLUSTERED INDEX [IDX_signature_campaigns_ends_at] ON [dbo].[signature_campaigns] ([ends_at]);
+
+    PRINT 'Tabela [dbo].[signature_campaigns] criada com sucesso.';
+END
+ELSE
+BEGIN
+    PRINT 'Tabela [dbo].[signature_campaigns] já existe.';
+END
+GO
+
+-- Migração: época de revogação das sessões assinadas (incrementada para revogar todas as sessões do usuário)
+IF NOT EXISTS (
+    SELECT * FROM sys.columns
+    WHERE object_id = OBJECT_ID(N'[dbo].[admin_users]') AND name = N'session_epoch'
+)
+BEGIN
+    ALTER TABLE [dbo].[admin_users] ADD [session_epoch] INT NOT NULL CONSTRAINT [DF_admin_users_session_epoch] DEFAULT 0;
+    PRINT 'Coluna [dbo].[admin_users].[session_epoch] criada.';
+END
+GO
+
+-- Tabela de tokens de sessão assinados revogados (logout), mantidos até expirarem
+IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[admin_revoked_tokens]') AND type in (N'U'))
+BEGIN
+    CREATE TABLE [dbo].[admin_revoked_tokens] (
+        [token_id] NVARCHAR(64) NOT NULL, -- Identificador (jti) do token revogado
+        [user_id] INT NOT NULL, -- FK para admin_users
+        [expires_at] DATETIME NOT NULL, -- Expiração original do token
+        [created_at] DATETIME NOT NULL DEFAULT GETDATE(),
+
+        CONSTRAINT [PK_admin_revoked_tokens] PRIMARY KEY CLUSTERED ([token_id] ASC),
+        CONSTRAINT [FK_admin_revoked_tokens_user_id] FOREIGN KEY ([user_id]) REFERENCES [dbo].[admin_users] ([id]) ON DELETE CASCADE
+    );
+
+    -- Criar índices
+    CREATE NONCLUSTERED INDEX [IDX_admin_revoked_tokens_expires_at] ON [dbo].[admin_revoked_tokens] ([expires_at]);
+
+    PRINT 'Tabela [dbo].[admin_revoked_tokens] criada com sucesso.';
+END
+ELSE
+BEGIN
+    PRINT 'Tabela [dbo].[admin_revoked_tokens] já existe.';
+END
+GO
+
 /*
 ========================
 CRIAÇÃO DAS PROCEDURES E FUNCTIONS
@@ -344,7 +580,7 @@ GO
 CREATE PROCEDURE [dbo].[AssignSignature]
     @user_email NVARCHAR(255),
     @template_id INT,
-    @signature_html NVARCHAR(MAX) = NULL -- Opcional: HTML personalizado, senão usa o do template
+    @signature_html NVARCHAR(MAX) = NULL -- Opcional: HTML personalizado, senão referencia o template
 AS
 BEGIN
     SET NOCOUNT ON;
@@ -369,11 +605,11 @@ BEGIN
         RETURN;
     END
 
-    -- Determinar o HTML final a ser salvo
+    -- Determinar o HTML a ser salvo
     IF @signature_html IS NULL OR LTRIM(RTRIM(@signature_html)) = ''
     BEGIN
-        -- Usar o HTML do template se nenhum HTML personalizado foi fornecido
-        SELECT @final_html = [template_html] FROM [dbo].[signature_templates] WHERE [id] = @template_id;
+        -- Sem HTML personalizado: a assinatura apenas referencia o template
+        SET @final_html = NULL;
     END
     ELSE
     BEGIN
@@ -431,9 +667,10 @@ BEGIN
     DECLARE @user_telefone NVARCHAR(50);
     DECLARE @user_ramal NVARCHAR(20);
 
-    -- 1. Obter o HTML base da assinatura atribuída ao usuário
-    SELECT @signature_html_template = s.[signature_html]
+    -- 1. Obter o HTML base da assinatura atribuída ao usuário (personalizado ou do template referenciado)
+    SELECT @signature_html_template = COALESCE(s.[signature_html], t.[template_html])
     FROM [dbo].[signatures] s
+    JOIN [dbo].[signature_templates] t ON t.[id] = s.[template_id]
     WHERE s.[user_email] = @user_email;
 
     -- 2. Se não houver assinatura atribuída, usar o template padrão
@@ -0,0 +1,44 @@
+"""
+Testes do índice de intervalos das campanhas
+"""
+from datetime import datetime
+
+from app.services.campaigns import Campaign, CampaignIndex
+
+
+def make_campaign(campaign_id: int, starts_at: datetime, ends_at: datetime) -> Campaign:
+    return Campaign({
+        "id": campaign_id,
+        "name": f"Campanha {campaign_id}",
+        "banner_html": f"<p>{campaign_id}</p>",
+        "starts_at": starts_at,
+        "ends_at": ends_at,
+        "email_domain": None,
+        "empresa": None,
+        "setor": None,
+        "priority": campaign_id
+    })
+
+
+def test_active_at_respects_half_open_windows():
+    index = CampaignIndex([
+        make_campaign(1, datetime(2026, 1, 1), datetime(2026, 1, 10)),
+        make_campaign(2, datetime(2026, 1, 5), datetime(2026, 1, 15))
+    ])
+
+    def ids(now):
+        return [campaign.id for campaign in index.active_at(now)]
+
+    assert ids(datetime(2025, 12, 31)) == []
+    assert ids(datetime(2026, 1, 1)) == [1]
+    assert ids(datetime(2026, 1, 7)) == [1, 2]
+    assert ids(datetime(2026, 1, 10)) == [2]
+    assert ids(datetime(2026, 1, 15)) == []
+
+
+def test_next_boundary():
+    index = CampaignIndex([make_campaign(1, datetime(2026, 1, 1), datetime(2026, 1, 10))])
+
+    assert index.next_boundary(datetime(2025, 12, 31)) == datetime(2026, 1, 1)
+    assert index.next_boundary(datetime(2026, 1, 1)) == datetime(2026, 1, 10)
+    assert index.next_boundary(datetime(2026, 1, 10)) is None
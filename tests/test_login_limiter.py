@@ -0,0 +1,113 @@
+"""
+Testes do limitador de tentativas de login
+"""
+import pytest
+
+from app.services import login_limiter
+from app.services.login_limiter import LoginLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Relógio controlado pelo teste (substitui time.monotonic do limitador)"""
+    now = [1000.0]
+    monkeypatch.setattr(login_limiter.time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_limiter(**overrides) -> LoginLimiter:
+    options = dict(
+        user_rate=0.1,
+        user_burst=5,
+        ip_rate=0.5,
+        ip_burst=20,
+        user_lockout_threshold=5,
+        ip_lockout_threshold=20,
+        lockout_base=30,
+        lockout_max=900,
+        user_lockout_max=120,
+        failure_window=900,
+        max_keys=10000
+    )
+    options.update(overrides)
+    return LoginLimiter(**options)
+
+
+def test_user_lockout_doubles_up_to_user_cap(clock):
+    limiter = make_limiter()
+    for attempt in range(4):
+        limiter.record_failure("admin", f"10.0.0.{attempt}")
+    assert limiter.acquire("admin", "10.0.1.1") is None
+
+    limiter.record_failure("admin", "10.0.0.4")
+    assert limiter.acquire("admin", "10.0.1.1") == pytest.approx(30)
+
+    for attempt in range(10):
+        limiter.record_failure("admin", f"10.0.2.{attempt}")
+    assert limiter.acquire("admin", "10.0.1.1") == pytest.approx(120)
+
+
+def test_ip_lockout_uses_global_cap(clock):
+    limiter = make_limiter()
+    for attempt in range(30):
+        limiter.record_failure(f"user{attempt}", "192.0.2.1")
+    assert limiter.acquire("someone", "192.0.2.1") == pytest.approx(900)
+
+
+def test_failures_expire_after_quiet_window(clock):
+    limiter = make_limiter()
+    for _ in range(4):
+        limiter.record_failure("admin", "192.0.2.1")
+
+    clock[0] += 901
+    limiter.record_failure("admin", "192.0.2.1")
+    assert limiter.acquire("admin", "192.0.2.1") is None
+
+
+def test_success_resets_user_but_not_ip(clock):
+    limiter = make_limiter()
+    for attempt in range(20):
+        limiter.record_failure(f"victim{attempt}", "192.0.2.1")
+    limiter.record_failure("mine", "192.0.2.1")
+
+    limiter.record_success("mine", "192.0.2.1")
+
+    assert limiter.acquire("victim0", "192.0.2.1") is not None
+    assert limiter._buckets["user"][("user", "mine")].failures == 0
+
+
+def test_rotating_usernames_does_not_evict_lockouts(clock):
+    limiter = make_limiter(max_keys=10)
+    for attempt in range(5):
+        limiter.record_failure("admin", f"198.51.100.{attempt}")
+    attacker = "192.0.2.1"
+    for attempt in range(20):
+        limiter.record_failure(f"random{attempt}", attacker)
+
+    # Muitos usuários (e IPs) novos além de max_keys
+    for attempt in range(50):
+        limiter.acquire(f"filler{attempt}", f"203.0.113.{attempt}")
+        limiter.record_failure(f"filler{attempt}", f"203.0.113.{attempt}")
+
+    assert limiter.acquire("admin", "203.0.113.200") is not None
+    assert limiter.acquire("anyone", attacker) is not None
+    assert limiter.stats()["overflows"] > 0
+
+
+def test_idle_keys_are_evicted_first(clock):
+    limiter = make_limiter(max_keys=3)
+    for _ in range(5):
+        limiter.acquire("busy", "192.0.2.1")
+    clock[0] += 1
+    limiter.acquire("idle", "192.0.2.1")
+    clock[0] += 10
+    limiter.record_failure("failing", "192.0.2.1")
+
+    # "busy" é a mais antiga, mas ainda não repôs as fichas; "idle" já está cheia
+    limiter.acquire("new", "192.0.2.1")
+
+    users = limiter._buckets["user"]
+    assert ("user", "idle") not in users
+    assert ("user", "busy") in users
+    assert ("user", "failing") in users
+    assert len(users) == 3
@@ -0,0 +1,65 @@
+"""
+Testes da resolução de regras de template por prioridade
+"""
+from app.services.template_rules import RuleIndex, TemplateRule, user_criteria
+
+
+def make_index(*rules) -> RuleIndex:
+    """Monta o índice a partir de (id, template_id, critérios), já em ordem de prioridade"""
+    rows = []
+    for rule_id, template_id, conditions in rules:
+        row = {name: None for name in ("email_domain", "empresa", "setor", "cargo")}
+        row.update(conditions)
+        row.update({
+            "id": rule_id,
+            "template_id": template_id,
+            "template_html": f"<p>{template_id}</p>",
+            "current_version_id": 1,
+            "template_updated_at": None
+        })
+        rows.append(row)
+    return RuleIndex([TemplateRule(row, position) for position, row in enumerate(rows)])
+
+
+def match(index: RuleIndex, email: str, **user_data):
+    rule = index.match(user_criteria(email, user_data))
+    return rule.id if rule else None
+
+
+def test_first_matching_rule_wins_across_criteria():
+    index = make_index(
+        (1, 10, {"setor": "Financeiro"}),
+        (2, 20, {"email_domain": "empresa.com"}),
+        (3, 30, {})
+    )
+    assert match(index, "ana@empresa.com", setor="Financeiro") == 1
+    assert match(index, "ana@empresa.com", setor="TI") == 2
+    assert match(index, "ana@outra.com", setor="TI") == 3
+
+
+def test_catch_all_before_specific_rule_takes_precedence():
+    index = make_index(
+        (1, 10, {}),
+        (2, 20, {"email_domain": "empresa.com"})
+    )
+    assert match(index, "ana@empresa.com") == 1
+
+
+def test_all_conditions_must_match():
+    index = make_index(
+        (1, 10, {"email_domain": "empresa.com", "cargo": "Diretor"}),
+        (2, 20, {"email_domain": "empresa.com"})
+    )
+    assert match(index, "ana@empresa.com", cargo="Diretor") == 1
+    assert match(index, "ana@empresa.com", cargo="Analista") == 2
+
+
+def test_values_are_compared_without_case_or_surrounding_spaces():
+    index = make_index((1, 10, {"empresa": " ACME ", "email_domain": "Empresa.COM"}))
+    assert match(index, "Ana@empresa.com", empresa="acme") == 1
+
+
+def test_no_matching_rule():
+    index = make_index((1, 10, {"setor": "Financeiro"}))
+    assert match(index, "ana@empresa.com", setor="TI") is None
+    assert match(index, "sem-dominio") is None